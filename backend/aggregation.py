@@ -0,0 +1,131 @@
+from array import array
+from typing import Sequence
+
+import numpy as np
+
+from backend.constants import HistoryColumn
+from backend.results import ScoreIndex
+from backend.simulation import RandomSource, get_rng
+
+
+class ReservoirQuantileSketch:
+    def __init__(self, capacity: int, n_months: int, n_columns: int, rng: RandomSource = None):
+        """
+        Per month quantile sketch of many histories.
+
+        Keeps a uniform random sample (reservoir sampling) of at most ``capacity`` whole
+        histories. Quantiles are read from the sample, so they are exact as long as no more
+        than ``capacity`` histories were added. The memory does not depend on the number of
+        added histories.
+
+        :param capacity: Maximum number of stored histories.
+        :param n_months: Number of simulated months.
+        :param n_columns: Number of history columns.
+        :param rng: Generator or seed sequence deciding which histories are kept.
+        """
+        self.capacity = capacity
+        self.sample = np.empty((capacity, n_months + 1, n_columns), dtype="float64")
+        self.count = 0
+        self.rng = get_rng(rng)
+
+    @property
+    def size(self) -> int:
+        return min(self.count, self.capacity)
+
+    def add(self, histories: np.ndarray):
+        """
+        :param histories: Histories of shape (paths, months + 1, columns).
+        """
+        n_new = len(histories)
+        n_free = max(self.capacity - self.count, 0)
+        n_fill = min(n_free, n_new)
+        self.sample[self.count:self.count + n_fill] = histories[:n_fill]
+        # Algorithm R: the i-th history (0-based) replaces a random slot with probability capacity / (i + 1)
+        positions = np.arange(self.count + n_fill, self.count + n_new)
+        slots = np.floor(self.rng.random(len(positions)) * (positions + 1)).astype("int64")
+        for idx in np.flatnonzero(slots < self.capacity):
+            self.sample[slots[idx]] = histories[n_fill + idx]
+        self.count += n_new
+
+    def quantiles(self, q: Sequence[float] | float) -> np.ndarray:
+        """
+        :param q: Quantile(s) between 0 and 1.
+        :return: Quantiles of shape (len(q), months + 1, columns), or (months + 1, columns)
+            for a single quantile.
+        """
+        return np.quantile(self.sample[:self.size], q, axis=0)
+
+
+class StreamingAggregator:
+    def __init__(self, columns: Sequence[str], n_months: int, sketch_capacity: int = 1000, rng: RandomSource = None):
+        """
+        Aggregates simulated histories while they are produced, without keeping them.
+
+        Per month and column it keeps the running mean and variance (merged batch-wise with the
+        update of Chan et al.) and a :class:`ReservoirQuantileSketch`. Per path only the two
+        final values needed to rank the paths are stored.
+
+        :param columns: Names of the history columns.
+        :param n_months: Number of simulated months.
+        :param sketch_capacity: Number of histories kept for the quantiles.
+        :param rng: Generator or seed sequence for the quantile sketch.
+        """
+        self.columns = [str(column) for column in columns]
+        self.n_months = n_months
+        self.count = 0
+        self.mean = np.zeros((n_months + 1, len(self.columns)), dtype="float64")
+        self._sum_squared_deviations = np.zeros((n_months + 1, len(self.columns)), dtype="float64")
+        self.sketch = ReservoirQuantileSketch(capacity=sketch_capacity, n_months=n_months,
+                                              n_columns=len(self.columns), rng=rng)
+        self.returned_money_totals = array("d")
+        self.remaining_values = array("d")
+        self._returned_column = self.columns.index(HistoryColumn.RETURNED_CUMULATIVE)
+        self._value_column = self.columns.index(HistoryColumn.TOTAL_VALUE)
+
+    def add(self, histories: np.ndarray):
+        """
+        Adds the histories of finished paths.
+
+        :param histories: Histories of shape (paths, months + 1, columns) or a single
+            history of shape (months + 1, columns).
+        """
+        if histories.ndim == 2:
+            histories = histories[np.newaxis]
+        n_new = len(histories)
+        if n_new == 0:
+            return
+        batch_mean = histories.mean(axis=0)
+        batch_sum_squared_deviations = ((histories - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n_new
+        delta = batch_mean - self.mean
+        self.mean += delta * n_new / total
+        self._sum_squared_deviations += batch_sum_squared_deviations + delta ** 2 * self.count * n_new / total
+        self.count = total
+        self.sketch.add(histories)
+        self.returned_money_totals.extend(histories[:, -1, self._returned_column])
+        self.remaining_values.extend(histories[:, -1, self._value_column])
+
+    @property
+    def variance(self) -> np.ndarray:
+        """
+        Sample variance per month and column.
+        """
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return self._sum_squared_deviations / (self.count - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def quantiles(self, q: Sequence[float] | float) -> np.ndarray:
+        return self.sketch.quantiles(q)
+
+    @property
+    def score_index(self) -> ScoreIndex:
+        """
+        Final values of all paths, to rank the paths (see ``get_percentile_strategy``). The
+        values are copied: a view would keep the buffers from growing in :meth:`add`.
+        """
+        return ScoreIndex(returned_money_totals=np.array(self.returned_money_totals, dtype="float64"),
+                          remaining_values=np.array(self.remaining_values, dtype="float64"))
@@ -0,0 +1,447 @@
+import numpy as np
+
+from backend.constants import HistoryColumn
+from backend.indicators import AbstractIndicator, RollingMean
+from backend.instrumentation import instrumentation, timed
+from backend.utils import convert_yearly_interest_to_monthly, flo_investment_formula_vectorized
+
+
+class FifoLotBook:
+    """
+    FIFO lots of many paths stored as (paths, lots) arrays.
+
+    Lot ``k`` of a path is the ``k``-th buy of that path, ``tail`` counts the lots bought per
+    path. Sales are tracked by the cumulative number of sold units per path and a head
+    pointer on the first lot that is not yet completely sold. The cost basis of the sold
+    units follows from the prefix sums of units and purchase values.
+    """
+
+    def __init__(self, n_paths: int, max_lots: int):
+        self.units = np.zeros((n_paths, max_lots), dtype="float64")
+        self.purchasing_prices = np.zeros((n_paths, max_lots), dtype="float64")
+        self.cumulative_units = np.zeros((n_paths, max_lots), dtype="float64")
+        self.cumulative_costs = np.zeros((n_paths, max_lots), dtype="float64")
+        self.total_units = np.zeros(n_paths, dtype="float64")
+        self.sold_units = np.zeros(n_paths, dtype="float64")
+        self.sold_costs = np.zeros(n_paths, dtype="float64")
+        self.head = np.zeros(n_paths, dtype="int64")
+        self.tail = np.zeros(n_paths, dtype="int64")
+        self._rows = np.arange(n_paths)
+
+    @property
+    def remaining_units(self) -> np.ndarray:
+        return self.total_units - self.sold_units
+
+    @property
+    def open_lots(self) -> np.ndarray:
+        """
+        Number of lots per path that are not sold completely, like ``len`` of
+        :class:`backend.portfolio.LotLedger`.
+        """
+        return self.tail - self.head
+
+    @timed("buy")
+    def buy(self, money: np.ndarray | float, cost_buy: float, prices: np.ndarray, active: np.ndarray | None = None):
+        """
+        Buys a new lot in every active path (all paths by default). Mirrors
+        :meth:`backend.portfolio.Portfolio.buy`: no lot is created if the money does not
+        cover the costs.
+        """
+        money = np.broadcast_to(np.asarray(money, dtype="float64") - cost_buy, prices.shape)
+        buying = money >= 0
+        if active is not None:
+            buying &= active
+        rows = self._rows[buying]
+        lot = self.tail[buying]
+        units = money[buying] / prices[buying]
+        previous_units = np.where(lot > 0, self.cumulative_units[rows, lot - 1], 0.0)
+        previous_costs = np.where(lot > 0, self.cumulative_costs[rows, lot - 1], 0.0)
+        self.units[rows, lot] = units
+        self.purchasing_prices[rows, lot] = prices[buying]
+        self.cumulative_units[rows, lot] = previous_units + units
+        self.cumulative_costs[rows, lot] = previous_costs + units * prices[buying]
+        self.total_units[rows] = self.cumulative_units[rows, lot]
+        self.tail[rows] += 1
+        if instrumentation.enabled:
+            instrumentation.count("lots_created", len(rows))
+
+    def _cost_basis_until(self, units_sold: np.ndarray) -> np.ndarray:
+        # Cumulative purchasing value of the first ``units_sold`` units, given the head already points at the lot
+        # containing the cut-off.
+        head = np.minimum(self.head, np.maximum(self.tail - 1, 0))
+        previous_units = np.where(head > 0, self.cumulative_units[self._rows, head - 1], 0.0)
+        previous_costs = np.where(head > 0, self.cumulative_costs[self._rows, head - 1], 0.0)
+        return previous_costs + (units_sold - previous_units) * self.purchasing_prices[self._rows, head]
+
+    @timed("sell")
+    def sell_units(self, units: np.ndarray | float, active: np.ndarray) -> np.ndarray:
+        """
+        Removes ``units`` from the front of the FIFO queue of every active path. Passing
+        ``np.inf`` sells everything.
+
+        :return: Purchasing value (cost basis) of the removed units per path.
+        """
+        target = np.where(active, np.minimum(self.sold_units + units, self.total_units), self.sold_units)
+        last_lot = np.maximum(self.tail - 1, 0)
+        initial_head = self.head.copy() if instrumentation.enabled else None
+        # Advance the head over all lots that are sold completely
+        while True:
+            lots_done = (self.head < self.tail) & (
+                    self.cumulative_units[self._rows, np.minimum(self.head, last_lot)] <= target)
+            if not lots_done.any():
+                break
+            self.head += lots_done
+        cost_basis = np.where(self.head >= self.tail,
+                              self.cumulative_costs[self._rows, last_lot],
+                              self._cost_basis_until(target))
+        sold_cost = np.where(active, cost_basis - self.sold_costs, 0.0)
+        if instrumentation.enabled:
+            # Like LotLedger.sell_units: the lots sold completely plus the lot with the cut-off
+            instrumentation.count("sells", np.count_nonzero(active))
+            instrumentation.count("lots_scanned", np.sum((self.head - initial_head + (self.head < self.tail))[active]))
+        self.sold_units = target
+        self.sold_costs = np.where(active, cost_basis, self.sold_costs)
+        return sold_cost
+
+
+def tax_on_profit(profit: np.ndarray,
+                  loss_pot: np.ndarray,
+                  remaining_tax_free_allowance: np.ndarray,
+                  capital_yields_tax_percentage: float) -> np.ndarray:
+    """
+    Vectorized tax rules of :meth:`backend.portfolio.Portfolio.sell`. Updates the loss pot
+    and the remaining allowance in place. Paths without a sale pass a profit of 0.
+    """
+    loss = profit < 0
+    gain = np.where(loss, 0.0, profit)
+    used_loss_pot = np.minimum(loss_pot, gain)
+    profit_minus_loss_pot = gain - used_loss_pot
+    loss_pot += np.where(loss, -profit, -used_loss_pot)
+    profit_part_in_tax_free_allowance = np.minimum(remaining_tax_free_allowance, profit_minus_loss_pot)
+    remaining_tax_free_allowance -= profit_part_in_tax_free_allowance
+    profit_part_outside_tax_free_allowance = profit_minus_loss_pot - profit_part_in_tax_free_allowance
+    return profit_part_outside_tax_free_allowance * capital_yields_tax_percentage / 100.0
+
+
+class SavingPlanBatchSimulation:
+    def __init__(self,
+                 monthly_savings: int,
+                 initial_savings: int,
+                 reserves: float,
+                 monthly_savings_reserves: int,
+                 yearly_interest_rate_on_reserves: float,
+                 yearly_tax_free_allowance: int,
+                 capital_yields_tax_percentage: int,
+                 duration_accumulation_phase_in_years: int,
+                 extract_all_at_once: bool,
+                 monthly_payoff: float,
+                 duration_simulation: int,
+                 costs_buy_absolute: float,
+                 costs_sell_absolute: float
+                 ):
+        """
+        Vectorized counterpart of :class:`backend.strategy.SavingPlanInvestmentStrategy`.
+
+        Instead of one strategy object per path, all paths are simulated at once. The loop
+        runs over the months only, every month is processed for all paths with array
+        operations. The rules (reserve interest, monthly buys, FIFO sells in the payoff
+        phase, yearly tax-free allowance and loss pot) are the same as in the scalar strategy.
+        """
+        self.monthly_savings = monthly_savings
+        self.initial_savings = initial_savings
+        self.reserves = reserves
+        self.monthly_savings_reserves = monthly_savings_reserves
+        self.yearly_interest_rate_on_reserves = yearly_interest_rate_on_reserves
+        self.yearly_tax_free_allowance = yearly_tax_free_allowance
+        self.capital_yields_tax_percentage = capital_yields_tax_percentage
+        self.duration_accumulation_phase_in_years = duration_accumulation_phase_in_years
+        self.extract_all_at_once = extract_all_at_once
+        self.monthly_payoff = monthly_payoff
+        self.duration_simulation = duration_simulation
+        self.costs_buy_absolute = costs_buy_absolute
+        self.costs_sell_absolute = costs_sell_absolute
+
+    @property
+    def n_months(self) -> int:
+        return self.duration_simulation * 12
+
+    def simulate(self, prices: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Simulates all paths given by the rows of ``prices``.
+
+        :param prices: Price matrix of shape (paths, months + 1), see
+            :meth:`backend.simulation.AbstractSimulationModel.sample_paths`.
+        :return: The columns of ``history`` as arrays of shape (paths, months + 1).
+        :rtype: dict[str, np.ndarray]
+        """
+        n_paths = prices.shape[0]
+        n_months = self.n_months
+        if prices.shape[1] != n_months + 1:
+            raise ValueError(f"Expected {n_months + 1} prices per path, got {prices.shape[1]}")
+        n_months_accumulation = min(self.duration_accumulation_phase_in_years * 12, n_months)
+
+        # Per month flows, accumulated at the end
+        payed = np.zeros((n_paths, n_months + 1), dtype="float64")
+        returned = np.zeros((n_paths, n_months + 1), dtype="float64")
+        taxes = np.zeros((n_paths, n_months + 1), dtype="float64")
+        costs = np.zeros((n_paths, n_months + 1), dtype="float64")
+        values = np.zeros((n_paths, n_months + 1), dtype="float64")
+        values[:, 0] = self.reserves
+
+        reserves = np.full(n_paths, self.reserves, dtype="float64")
+        lots = FifoLotBook(n_paths=n_paths, max_lots=n_months_accumulation + 1)
+        remaining_tax_free_allowance = np.full(n_paths, float(self.yearly_tax_free_allowance))
+        loss_pot = np.zeros(n_paths, dtype="float64")  # Verlusttopf
+
+        monthly_interest_rate_on_reserves = convert_yearly_interest_to_monthly(self.yearly_interest_rate_on_reserves)
+        for month_idx in range(1, n_months + 1):
+            price = prices[:, month_idx - 1]
+            if month_idx > 1 and (month_idx - 1) % 12 == 0:
+                remaining_tax_free_allowance[:] = self.yearly_tax_free_allowance
+            initial_reserves = reserves.copy()
+            # Update reserve
+            taxes[:, month_idx] = reserves * monthly_interest_rate_on_reserves / 100 * self.capital_yields_tax_percentage / 100
+            reserves *= 1 + (monthly_interest_rate_on_reserves / 100) * (1 - self.capital_yields_tax_percentage / 100)
+            if month_idx <= n_months_accumulation:
+                # Sparphase
+                if month_idx == 1:
+                    payed[:, month_idx] += initial_reserves
+                    lots.buy(money=self.initial_savings, cost_buy=self.costs_buy_absolute, prices=price)
+                    costs[:, month_idx] += self.costs_buy_absolute
+                    payed[:, month_idx] += self.initial_savings
+                reserves += self.monthly_savings_reserves
+                payed[:, month_idx] += self.monthly_savings + self.monthly_savings_reserves
+                lots.buy(money=self.monthly_savings, cost_buy=self.costs_buy_absolute, prices=price)
+                costs[:, month_idx] += self.costs_buy_absolute
+            else:
+                # Auszahlphase
+                has_shares = lots.remaining_units * price > 0
+                if self.monthly_payoff >= self.costs_sell_absolute:
+                    selling = has_shares & (lots.open_lots > 0)
+                    sold_value = np.minimum(self.monthly_payoff, lots.remaining_units * price)
+                    sold_cost = lots.sell_units(units=self.monthly_payoff / price, active=selling)
+                    profit = np.where(selling, sold_value - sold_cost, 0.0)
+                    tax = tax_on_profit(profit=profit,
+                                        loss_pot=loss_pot,
+                                        remaining_tax_free_allowance=remaining_tax_free_allowance,
+                                        capital_yields_tax_percentage=self.capital_yields_tax_percentage)
+                    returned[:, month_idx] = np.where(selling, sold_value - self.costs_sell_absolute - tax, 0.0)
+                    taxes[:, month_idx] += tax
+                    costs[:, month_idx] += np.where(selling, self.costs_sell_absolute, 0.0)
+                from_reserves = np.where(has_shares, 0.0, np.minimum(reserves, self.monthly_payoff))
+                returned[:, month_idx] += from_reserves
+                reserves -= from_reserves
+            with instrumentation.timer("valuation"):
+                values[:, month_idx] = reserves + lots.remaining_units * prices[:, month_idx]
+
+        instrumentation.count("history_writes", n_paths * n_months)
+        return {HistoryColumn.TOTAL_VALUE: values,
+                HistoryColumn.PAYED_CUMULATIVE: np.cumsum(payed, axis=1),
+                HistoryColumn.RETURNED_CUMULATIVE: np.cumsum(returned, axis=1),
+                HistoryColumn.TAX_CUMULATIVE: np.cumsum(taxes, axis=1),
+                HistoryColumn.COSTS_CUMULATIVE: np.cumsum(costs, axis=1)}
+
+
+class FloBatchSimulation:
+    def __init__(self,
+                 monthly_savings: int,
+                 initial_savings: int,
+                 reserves: float,
+                 monthly_savings_reserves: int,
+                 yearly_interest_rate_on_reserves: float,
+                 yearly_tax_free_allowance: int,
+                 capital_yields_tax_percentage: int,
+                 duration_accumulation_phase_in_years: int,
+                 extract_all_at_once: bool,
+                 monthly_payoff: float,
+                 duration_simulation: int,
+                 costs_buy_absolute: float,
+                 costs_sell_absolute: float,
+                 flo_target_number_of_stocks: int,
+                 flo_duration_months_for_rolling_average_stock_prize: int,
+                 flo_step_size: int,
+                 flo_prize_step_size: int,
+                 flo_reference_price_indicator: AbstractIndicator | None = None
+                 ):
+        """
+        Vectorized counterpart of :class:`backend.strategy.FloInvestmentStrategy`.
+
+        All paths are simulated at once, the loop runs over the months only. The reference
+        price (by default the rolling mean of the stock price) is computed up front for the
+        whole price matrix with the ``batch`` form of the indicator. The buy/sell decision is
+        :func:`backend.utils.flo_investment_formula_vectorized`. ETF and stock are two
+        :class:`FifoLotBook` with their own tax-free allowance and loss pot.
+        """
+        self.monthly_savings = monthly_savings
+        self.initial_savings = initial_savings
+        self.reserves = reserves
+        self.monthly_savings_reserves = monthly_savings_reserves
+        self.yearly_interest_rate_on_reserves = yearly_interest_rate_on_reserves
+        self.yearly_tax_free_allowance = yearly_tax_free_allowance
+        self.capital_yields_tax_percentage = capital_yields_tax_percentage
+        self.duration_accumulation_phase_in_years = duration_accumulation_phase_in_years
+        self.extract_all_at_once = extract_all_at_once
+        self.monthly_payoff = monthly_payoff
+        self.duration_simulation = duration_simulation
+        self.costs_buy_absolute = costs_buy_absolute
+        self.costs_sell_absolute = costs_sell_absolute
+        self.flo_target_number_of_stocks = flo_target_number_of_stocks
+        self.flo_duration_months_for_rolling_average_stock_prize = flo_duration_months_for_rolling_average_stock_prize
+        self.flo_step_size = flo_step_size
+        self.flo_prize_step_size = flo_prize_step_size
+        if flo_reference_price_indicator is None:
+            flo_reference_price_indicator = RollingMean(window=flo_duration_months_for_rolling_average_stock_prize)
+        self.flo_reference_price_indicator = flo_reference_price_indicator
+
+    @property
+    def n_months(self) -> int:
+        return self.duration_simulation * 12
+
+    def _sell(self,
+              lots: FifoLotBook,
+              target_money_sell: np.ndarray | float,
+              price: np.ndarray,
+              active: np.ndarray,
+              loss_pot: np.ndarray,
+              remaining_tax_free_allowance: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized :meth:`backend.portfolio.Portfolio.sell` for the active paths.
+
+        :return: Returned money, taxes and transaction costs per path (0 for paths without a sale).
+        """
+        selling = active & (target_money_sell >= self.costs_sell_absolute) & (lots.open_lots > 0)
+        current_total_value = lots.remaining_units * price
+        sell_all = current_total_value <= target_money_sell
+        sold_value = np.where(sell_all, current_total_value, target_money_sell)
+        sold_cost = lots.sell_units(units=np.where(sell_all, np.inf, target_money_sell / price), active=selling)
+        profit = np.where(selling, sold_value - sold_cost, 0.0)
+        tax = tax_on_profit(profit=profit,
+                            loss_pot=loss_pot,
+                            remaining_tax_free_allowance=remaining_tax_free_allowance,
+                            capital_yields_tax_percentage=self.capital_yields_tax_percentage)
+        costs = np.where(selling, self.costs_sell_absolute, 0.0)
+        return np.where(selling, sold_value - costs - tax, 0.0), tax, costs
+
+    def simulate(self, etf_prices: np.ndarray, stock_prices: np.ndarray) -> dict[str, np.ndarray]:
+        """
+        Simulates all paths given by the rows of the price matrices.
+
+        :param etf_prices: ETF prices of shape (paths, months + 1).
+        :param stock_prices: Stock prices of shape (paths, months + 1), column 0 is the
+            initial stock price.
+        :return: The columns of ``history`` as arrays of shape (paths, months + 1).
+        :rtype: dict[str, np.ndarray]
+        """
+        n_paths = etf_prices.shape[0]
+        n_months = self.n_months
+        if etf_prices.shape[1] != n_months + 1 or stock_prices.shape != etf_prices.shape:
+            raise ValueError(f"Expected {n_months + 1} prices per path for ETF and stock, "
+                             f"got {etf_prices.shape} and {stock_prices.shape}")
+        n_months_accumulation = min(self.duration_accumulation_phase_in_years * 12, n_months)
+        # Column m - 1 is the reference price the strategy sees in month m
+        average_stock_prices = self.flo_reference_price_indicator.batch(stock_prices)
+
+        # Per month flows, accumulated at the end
+        payed = np.zeros((n_paths, n_months + 1), dtype="float64")
+        returned = np.zeros((n_paths, n_months + 1), dtype="float64")
+        taxes = np.zeros((n_paths, n_months + 1), dtype="float64")
+        costs = np.zeros((n_paths, n_months + 1), dtype="float64")
+        values_reserves = np.zeros((n_paths, n_months + 1), dtype="float64")
+        values_etfs = np.zeros((n_paths, n_months + 1), dtype="float64")
+        values_stocks = np.zeros((n_paths, n_months + 1), dtype="float64")
+        values_reserves[:, 0] = self.reserves
+
+        reserves = np.full(n_paths, self.reserves, dtype="float64")
+        etfs = FifoLotBook(n_paths=n_paths, max_lots=n_months_accumulation + 1)
+        stocks = FifoLotBook(n_paths=n_paths, max_lots=max(n_months_accumulation, 1))
+        # Both portfolios get half of the allowance and have their own loss pot
+        yearly_tax_free_allowance = self.yearly_tax_free_allowance // 2
+        remaining_tax_free_allowance_etfs = np.full(n_paths, float(yearly_tax_free_allowance))
+        remaining_tax_free_allowance_stocks = np.full(n_paths, float(yearly_tax_free_allowance))
+        loss_pot_etfs = np.zeros(n_paths, dtype="float64")  # Verlusttopf
+        loss_pot_stocks = np.zeros(n_paths, dtype="float64")
+
+        monthly_interest_rate_on_reserves = convert_yearly_interest_to_monthly(self.yearly_interest_rate_on_reserves)
+        for month_idx in range(1, n_months + 1):
+            etf_price = etf_prices[:, month_idx - 1]
+            stock_price = stock_prices[:, month_idx - 1]
+            if month_idx > 1 and (month_idx - 1) % 12 == 0:
+                remaining_tax_free_allowance_etfs[:] = yearly_tax_free_allowance
+                remaining_tax_free_allowance_stocks[:] = yearly_tax_free_allowance
+            initial_reserves = reserves.copy()
+            # Update reserve
+            taxes[:, month_idx] = reserves * monthly_interest_rate_on_reserves / 100 * self.capital_yields_tax_percentage / 100
+            reserves *= 1 + (monthly_interest_rate_on_reserves / 100) * (1 - self.capital_yields_tax_percentage / 100)
+            if month_idx <= n_months_accumulation:
+                # Sparphase
+                if month_idx == 1:
+                    payed[:, month_idx] += initial_reserves
+                    etfs.buy(money=self.initial_savings, cost_buy=self.costs_buy_absolute, prices=etf_price)
+                    costs[:, month_idx] += self.costs_buy_absolute
+                    payed[:, month_idx] += self.initial_savings
+                reserves += self.monthly_savings_reserves
+                payed[:, month_idx] += self.monthly_savings + self.monthly_savings_reserves
+                etfs.buy(money=self.monthly_savings, cost_buy=self.costs_buy_absolute, prices=etf_price)
+                costs[:, month_idx] += self.costs_buy_absolute
+                # Aktie
+                how_many_stocks_to_buy = flo_investment_formula_vectorized(
+                    current_stock_prices=stock_price,
+                    n_shares_hold=stocks.open_lots,
+                    target_number_of_shares=self.flo_target_number_of_stocks,
+                    average_stock_prices=average_stock_prices[:, month_idx - 1],
+                    step_size_shares=self.flo_step_size,
+                    price_steps=self.flo_prize_step_size)
+                buying = how_many_stocks_to_buy > 0
+                money_needed = np.minimum(how_many_stocks_to_buy * stock_price + self.costs_buy_absolute, reserves)
+                stocks.buy(money=money_needed, cost_buy=self.costs_buy_absolute, prices=stock_price, active=buying)
+                reserves -= np.where(buying, money_needed, 0.0)
+                costs[:, month_idx] += np.where(buying, self.costs_buy_absolute, 0.0)
+                # The money of sold stocks goes into the reserves
+                returned_money, tax_sell, costs_sell = self._sell(
+                    lots=stocks,
+                    target_money_sell=-how_many_stocks_to_buy * stock_price + self.costs_sell_absolute,
+                    price=stock_price,
+                    active=how_many_stocks_to_buy < 0,
+                    loss_pot=loss_pot_stocks,
+                    remaining_tax_free_allowance=remaining_tax_free_allowance_stocks)
+                reserves += returned_money
+                taxes[:, month_idx] += tax_sell
+                costs[:, month_idx] += costs_sell
+            else:
+                # Auszahlphase: first the stocks, then the ETFs, then the reserves
+                has_stocks = stocks.remaining_units * stock_price > 0
+                has_etfs = ~has_stocks & (etfs.remaining_units * etf_price > 0)
+                returned_stocks, tax_stocks, costs_stocks = self._sell(
+                    lots=stocks,
+                    target_money_sell=self.monthly_payoff,
+                    price=stock_price,
+                    active=has_stocks,
+                    loss_pot=loss_pot_stocks,
+                    remaining_tax_free_allowance=remaining_tax_free_allowance_stocks)
+                returned_etfs, tax_etfs, costs_etfs = self._sell(
+                    lots=etfs,
+                    target_money_sell=self.monthly_payoff,
+                    price=etf_price,
+                    active=has_etfs,
+                    loss_pot=loss_pot_etfs,
+                    remaining_tax_free_allowance=remaining_tax_free_allowance_etfs)
+                from_reserves = np.where(has_stocks | has_etfs, 0.0, np.minimum(reserves, self.monthly_payoff))
+                reserves -= from_reserves
+                returned[:, month_idx] = returned_stocks + returned_etfs + from_reserves
+                taxes[:, month_idx] += tax_stocks + tax_etfs
+                costs[:, month_idx] += costs_stocks + costs_etfs
+            with instrumentation.timer("valuation"):
+                values_reserves[:, month_idx] = reserves
+                values_etfs[:, month_idx] = etfs.remaining_units * etf_prices[:, month_idx]
+                values_stocks[:, month_idx] = stocks.remaining_units * stock_prices[:, month_idx]
+
+        instrumentation.count("history_writes", n_paths * n_months)
+        return {HistoryColumn.TOTAL_VALUE: values_reserves + values_etfs + values_stocks,
+                HistoryColumn.PAYED_CUMULATIVE: np.cumsum(payed, axis=1),
+                HistoryColumn.RETURNED_CUMULATIVE: np.cumsum(returned, axis=1),
+                HistoryColumn.TAX_CUMULATIVE: np.cumsum(taxes, axis=1),
+                HistoryColumn.COSTS_CUMULATIVE: np.cumsum(costs, axis=1),
+                HistoryColumn.VALUE_RESERVES: values_reserves,
+                HistoryColumn.VALUE_ETFS: values_etfs,
+                HistoryColumn.VALUE_STOCKS: values_stocks}
+
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from backend.constants import SimulationModel, Strategy
+from backend.convergence import ConvergenceReport
+from backend.results import ScoreIndex, SimulationResults
+
+CACHE_KEY_SIGNIFICANT_DIGITS = 12  # Zahlen, die sich erst danach unterscheiden, ergeben denselben Schlüssel
+
+
+def make_cache_key(parameters: Any) -> str:
+    """
+    Hashes JSON-serializable parameters (nested dicts, lists, numbers, strings) to a key.
+    The keys of dicts are sorted, so equal parameters always give the same key.
+    """
+    canonical = json.dumps(parameters, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+_COMMON_PARAMETERS = ("strategy", "simulation_model", "monthly_savings", "initial_savings", "reserves",
+                      "monthly_savings_reserves", "yearly_interest_rate_on_reserves", "costs_buy_absolute",
+                      "costs_sell_absolute", "duration_accumulation_phase_in_years", "monthly_payoff",
+                      "yearly_tax_free_allowance", "capital_yields_tax_percentage", "duration_simulation")
+
+
+def _normalize(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(f"{float(value):.{CACHE_KEY_SIGNIFICANT_DIGITS}g}")
+    if isinstance(value, str):
+        return str(value)  # Enums as their plain value
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return str(value)
+
+
+def canonical_parameters(sidebar_results) -> dict:
+    """
+    The parameters a simulation of ``sidebar_results`` actually reads, in a canonical form:
+    numbers are floats rounded to ``CACHE_KEY_SIGNIFICANT_DIGITS`` digits (so ``100`` and
+    ``100.0`` are equal) and enums their values. Left out are the parameters of the other
+    simulation models and strategies, the execution (workers, chunk size, engine, streaming),
+    which does not change the results, and inflation and the one-time payoff, which no
+    simulation reads yet. The seed, the number of simulations and the adaptive stopping only
+    count for the random models. For the historical bootstrap, size and modification time of
+    the returns file are included, so changed data is simulated again.
+
+    :param sidebar_results: User-defined parameters of the run.
+    :type sidebar_results: SidebarResults
+    :return: JSON-serializable parameters, see :func:`make_cache_key`.
+    :rtype: dict
+    """
+    parameters = {name: getattr(sidebar_results, name) for name in _COMMON_PARAMETERS}
+    simulation_model = sidebar_results.simulation_model
+    execution_parameters = sidebar_results.execution_parameters
+    seed = None if execution_parameters is None or execution_parameters.seed is None else str(execution_parameters.seed)
+    if simulation_model == SimulationModel.DETERMINISTIC:
+        parameters["model"] = asdict(sidebar_results.deterministic_simulation_parameters)
+    elif simulation_model == SimulationModel.SIMPLE_NORMAL_DISTRIBUTION:
+        parameters["model"] = asdict(sidebar_results.simple_normal_distribution_simulation_parameters)
+        parameters["seed"] = seed
+    elif simulation_model == SimulationModel.HISTORICAL_BOOTSTRAP:
+        historical_bootstrap_simulation_parameters = sidebar_results.historical_bootstrap_simulation_parameters
+        parameters["model"] = asdict(historical_bootstrap_simulation_parameters)
+        parameters["seed"] = seed
+        try:
+            returns_file = Path(historical_bootstrap_simulation_parameters.returns_file).stat()
+            parameters["returns_file_version"] = f"{returns_file.st_size}:{returns_file.st_mtime_ns}"
+        except OSError:
+            parameters["returns_file_version"] = None
+    if simulation_model != SimulationModel.DETERMINISTIC and sidebar_results.adaptive_parameters is not None:
+        parameters["adaptive"] = asdict(sidebar_results.adaptive_parameters)
+    if sidebar_results.strategy == Strategy.FLO:
+        flo_strategy_parameters = asdict(sidebar_results.flo_strategy_parameters)
+        if simulation_model == SimulationModel.DETERMINISTIC:
+            flo_strategy_parameters.pop("sigma")
+        if simulation_model != SimulationModel.SIMPLE_NORMAL_DISTRIBUTION:
+            flo_strategy_parameters.pop("correlation")
+        parameters["flo"] = flo_strategy_parameters
+    return _normalize(parameters)
+
+
+def canonical_cache_key(sidebar_results) -> str:
+    """
+    Key of a run: equal for all ``sidebar_results`` that give the same results, see
+    :func:`canonical_parameters`. Used by the in-memory and the disk cache.
+    """
+    return make_cache_key(canonical_parameters(sidebar_results))
+
+
+class CacheStatistics:
+    def __init__(self):
+        """
+        Thread-safe counters of the lookups and misses of named caches. A lookup that is not a
+        miss is a hit.
+        """
+        self._lock = threading.Lock()
+        self._lookups = Counter()
+        self._misses = Counter()
+
+    def lookup(self, name: str):
+        with self._lock:
+            self._lookups[name] += 1
+
+    def miss(self, name: str):
+        with self._lock:
+            self._misses[name] += 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        """
+        :return: Hits and misses per cache, since the start of the process.
+        """
+        with self._lock:
+            return {name: {"hits": lookups - self._misses[name], "misses": self._misses[name]}
+                    for name, lookups in sorted(self._lookups.items())}
+
+    def reset(self):
+        with self._lock:
+            self._lookups.clear()
+            self._misses.clear()
+
+
+cache_statistics = CacheStatistics()
+
+
+class DiskResultCache:
+    _HISTORIES_FILE = "histories.npy"
+    _RETURNED_MONEY_TOTALS_FILE = "returned_money_totals.npy"
+    _REMAINING_VALUES_FILE = "remaining_values.npy"
+    _META_FILE = "meta.json"
+
+    def __init__(self, directory: Path | str, max_size_bytes: int):
+        """
+        Persistent cache for :class:`SimulationResults` with a size bound.
+
+        Every entry is a directory with the arrays as ``.npy`` files. Loaded entries are
+        memory-mapped read-only, so even large runs load in milliseconds. Entries are written
+        to a temporary directory and renamed, so several processes can share the cache. When
+        the total size exceeds ``max_size_bytes``, the least recently used entries are deleted.
+
+        :param directory: Directory of the cache. Created if it does not exist.
+        :param max_size_bytes: Maximum total size of all entries.
+        """
+        self.directory = Path(directory)
+        self.max_size_bytes = max_size_bytes
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / key
+
+    def get(self, key: str) -> SimulationResults | None:
+        """
+        Counted as lookup of the cache ``"disk"`` in :data:`cache_statistics`.
+
+        :return: The cached results, memory-mapped, or ``None`` if there are none.
+        """
+        cache_statistics.lookup("disk")
+        entry = self._entry(key)
+        try:
+            meta = json.loads((entry / self._META_FILE).read_text(encoding="utf-8"))
+            histories = np.load(entry / self._HISTORIES_FILE, mmap_mode="r")
+            score_index = ScoreIndex(
+                returned_money_totals=np.load(entry / self._RETURNED_MONEY_TOTALS_FILE, mmap_mode="r"),
+                remaining_values=np.load(entry / self._REMAINING_VALUES_FILE, mmap_mode="r"))
+            convergence = meta.get("convergence")
+            if convergence is not None:
+                convergence = ConvergenceReport.from_dict(convergence)
+            os.utime(entry)  # Mark as recently used
+        except (OSError, ValueError, KeyError):
+            # Missing, incomplete or concurrently evicted entry
+            cache_statistics.miss("disk")
+            return None
+        return SimulationResults(columns=meta["columns"], histories=histories, score_index=score_index,
+                                 convergence=convergence)
+
+    def put(self, key: str, results: SimulationResults):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self._entry(key)
+        if entry.exists():
+            os.utime(entry)
+            return
+        temporary = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.directory))
+        try:
+            np.save(temporary / self._HISTORIES_FILE, results.histories)
+            np.save(temporary / self._RETURNED_MONEY_TOTALS_FILE, results.score_index.returned_money_totals)
+            np.save(temporary / self._REMAINING_VALUES_FILE, results.score_index.remaining_values)
+            meta = {"columns": results.columns,
+                    "convergence": None if results.convergence is None else results.convergence.as_dict()}
+            (temporary / self._META_FILE).write_text(json.dumps(meta), encoding="utf-8")
+            temporary.rename(entry)
+        except OSError:
+            # Another process stored the same entry in the meantime
+            shutil.rmtree(temporary, ignore_errors=True)
+            if not entry.exists():
+                raise
+        self.evict()
+
+    def size_bytes(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self) -> list[tuple[float, Path, int]]:
+        entries = []
+        if not self.directory.exists():
+            return entries
+        for entry in self.directory.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            try:
+                size = sum(file.stat().st_size for file in entry.iterdir())
+                entries.append((entry.stat().st_mtime, entry, size))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits into ``max_size_bytes``.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[0])
+        total_size = sum(size for _, _, size in entries)
+        for _, entry, size in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -1,12 +1,55 @@
 from enum import StrEnum
 
+DEFAULT_CHUNK_SIZE = 250  # Anzahl Simulationen pro Arbeitspaket
+ENGINE_VERSION = 2  # Erhöhen, wenn sich Simulationsergebnisse ändern (macht gespeicherte Ergebnisse ungültig)
+
 
 class SimulationModel(StrEnum):
     DETERMINISTIC = "Deterministisch"
     SIMPLE_NORMAL_DISTRIBUTION = "Einfache Normalverteilung"
+    HISTORICAL_BOOTSTRAP = "Historischer Bootstrap"
 
 
 class Strategy(StrEnum):
     SAVINGS_PLAN = "Sparplan"
     FLO = "Flo"
 
+
+class Engine(StrEnum):
+    NUMPY = "NumPy (vektorisiert)"
+    NUMBA = "Numba (kompiliert)"
+
+
+class SamplingScheme(StrEnum):
+    PSEUDO_RANDOM = "Pseudozufall"
+    ANTITHETIC = "Antithetische Paare"
+    SOBOL = "Sobol (quasi-zufällig)"
+
+
+class ExportFormat(StrEnum):
+    PARQUET = "Parquet"
+    ARROW = "Arrow IPC"
+
+
+class StopReason(StrEnum):
+    PRECISION = "Genauigkeit erreicht"
+    TIME_BUDGET = "Zeitbudget aufgebraucht"
+    MAXIMUM = "Maximale Anzahl Simulationen erreicht"
+
+
+class ReferencePrice(StrEnum):
+    ROLLING_MEAN = "Gleitender Durchschnitt"
+    EXPONENTIAL_MOVING_AVERAGE = "Exponentieller gleitender Durchschnitt"
+    ROLLING_MIN = "Gleitendes Minimum"
+    ROLLING_MAX = "Gleitendes Maximum"
+
+
+class HistoryColumn(StrEnum):
+    TOTAL_VALUE = "Wert Tagesgeld + ETF"
+    PAYED_CUMULATIVE = "Eingezahlt (kumulativ)"
+    RETURNED_CUMULATIVE = "Ausgezahlt (kumulativ)"
+    TAX_CUMULATIVE = "Steuern (kumulativ)"
+    COSTS_CUMULATIVE = "Kosten (kumulativ)"
+    VALUE_RESERVES = "Wert Tagesgeld"
+    VALUE_ETFS = "Wert ETFs"
+    VALUE_STOCKS = "Wert Aktien"
@@ -0,0 +1,119 @@
+from dataclasses import dataclass, asdict
+from math import ceil, floor, sqrt
+from statistics import NormalDist
+
+import numpy as np
+
+from backend.constants import StopReason
+
+
+@dataclass
+class ConfidenceInterval:
+    estimate: float  # Schätzwert aus den bisherigen Simulationen
+    lower: float  # Untere Grenze
+    upper: float  # Obere Grenze
+
+    @property
+    def relative_half_width(self) -> float:
+        """
+        Half the width of the interval relative to the estimate, e.g. 0.01 for ±1 %.
+        """
+        half_width = (self.upper - self.lower) / 2
+        if half_width == 0:
+            return 0.0
+        return half_width / abs(self.estimate) if self.estimate != 0 else float("inf")
+
+
+def mean_confidence_interval(values: np.ndarray, z: float) -> ConfidenceInterval:
+    """
+    Confidence interval of the mean from the normal approximation, ``mean ± z * std / sqrt(n)``.
+    """
+    mean = float(np.mean(values))
+    half_width = z * float(np.std(values, ddof=1)) / sqrt(len(values)) if len(values) > 1 else float("inf")
+    return ConfidenceInterval(estimate=mean, lower=mean - half_width, upper=mean + half_width)
+
+
+def quantile_confidence_interval(values: np.ndarray, quantile: float, z: float) -> ConfidenceInterval:
+    """
+    Distribution-free confidence interval of a quantile from order statistics: the number of
+    values below the true quantile is binomial, its normal approximation gives the ranks of
+    the lower and upper bound. Only the three ranks are partitioned, the values are not sorted.
+
+    :param values: The sample, not modified.
+    :param quantile: Quantile between 0 and 1.
+    :param z: Quantile of the standard normal distribution for the confidence level.
+    """
+    n = len(values)
+    spread = z * sqrt(n * quantile * (1 - quantile))
+    rank_lower = min(max(floor(n * quantile - spread), 0), n - 1)
+    rank_upper = min(max(ceil(n * quantile + spread), 0), n - 1)
+    rank_estimate = min(floor(n * quantile), n - 1)
+    ordered = np.partition(values, sorted({rank_lower, rank_estimate, rank_upper}))
+    return ConfidenceInterval(estimate=float(ordered[rank_estimate]),
+                              lower=float(ordered[rank_lower]),
+                              upper=float(ordered[rank_upper]))
+
+
+@dataclass
+class ConvergenceReport:
+    number_of_simulations: int  # Tatsächlich simulierte Pfade
+    elapsed_seconds: float  # Laufzeit der Simulation
+    stop_reason: StopReason  # Warum die Simulation beendet wurde
+    mean: ConfidenceInterval  # Konfidenzintervall des mittleren Scores
+    median: ConfidenceInterval  # Konfidenzintervall des Medians des Scores
+    percentile: ConfidenceInterval  # Konfidenzintervall des gewählten Perzentils des Scores
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "ConvergenceReport":
+        return cls(number_of_simulations=values["number_of_simulations"],
+                   elapsed_seconds=values["elapsed_seconds"],
+                   stop_reason=StopReason(values["stop_reason"]),
+                   mean=ConfidenceInterval(**values["mean"]),
+                   median=ConfidenceInterval(**values["median"]),
+                   percentile=ConfidenceInterval(**values["percentile"]))
+
+
+@dataclass(frozen=True)
+class ConvergenceCriterion:
+    """
+    When an adaptive Monte Carlo run stops. The monitored statistics are the mean, the median
+    and ``percentile`` of the score ``returned_money_total * weight_return_value +
+    remaining_value * (1 - weight_return_value)``, the same score that ranks the paths for the
+    displayed percentile. The run has converged when the confidence intervals of all three are
+    narrower than ``relative_precision``.
+    """
+    relative_precision: float  # Ziel: halbe Breite der Konfidenzintervalle relativ zum Schätzwert
+    percentile: float = 5.0  # Zusätzlich überwachtes Perzentil des Scores (0 bis 100)
+    weight_return_value: float = 0.9  # Gewichtung des ausgezahlten Betrags im Score
+    time_budget_seconds: float | None = None  # Abbruch nach dieser Laufzeit, auch ohne Konvergenz
+    confidence: float = 0.95  # Konfidenzniveau der Intervalle
+    min_number_of_simulations: int = 100  # Vorher wird nicht auf Konvergenz geprüft
+
+    def evaluate(self, returned_money_totals: np.ndarray, remaining_values: np.ndarray, elapsed_seconds: float,
+                 maximum_reached: bool) -> tuple[ConvergenceReport, bool]:
+        """
+        :param returned_money_totals: Paid out money of every path simulated so far.
+        :param remaining_values: Remaining value of every path simulated so far.
+        :param elapsed_seconds: Runtime so far.
+        :param maximum_reached: Whether no further paths can be simulated.
+        :return: The current confidence intervals and whether the run should stop.
+        :rtype: tuple[ConvergenceReport, bool]
+        """
+        scores = returned_money_totals * self.weight_return_value + remaining_values * (1 - self.weight_return_value)
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        intervals = dict(mean=mean_confidence_interval(scores, z),
+                         median=quantile_confidence_interval(scores, 0.5, z),
+                         percentile=quantile_confidence_interval(scores, self.percentile / 100, z))
+        if (len(scores) >= self.min_number_of_simulations
+                and all(interval.relative_half_width <= self.relative_precision for interval in intervals.values())):
+            stop_reason = StopReason.PRECISION
+        elif self.time_budget_seconds is not None and elapsed_seconds >= self.time_budget_seconds:
+            stop_reason = StopReason.TIME_BUDGET
+        else:
+            stop_reason = StopReason.MAXIMUM
+        report = ConvergenceReport(number_of_simulations=len(scores), elapsed_seconds=elapsed_seconds,
+                                   stop_reason=stop_reason, **intervals)
+        return report, maximum_reached or stop_reason != StopReason.MAXIMUM
@@ -0,0 +1,282 @@
+import functools
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterator, TypeVar
+
+import numpy as np
+
+from backend.aggregation import StreamingAggregator
+from backend.constants import DEFAULT_CHUNK_SIZE, HistoryColumn
+from backend.convergence import ConvergenceCriterion, ConvergenceReport
+from backend.instrumentation import PerformanceReport, instrumentation
+from backend.strategy import AbstractStrategy, StrategyFactory, PrecomputedStrategy
+from frontend.data_interface import SidebarResults
+
+ChunkResult = TypeVar("ChunkResult")
+
+
+def spawn_seed_sequences(seed: int | None, number_of_simulations: int) -> list[np.random.SeedSequence]:
+    """
+    Spawns one independent random stream per simulation from a single root seed. Simulation
+    ``i`` always gets stream ``i``, independent of how the simulations are distributed.
+    """
+    return np.random.SeedSequence(seed).spawn(number_of_simulations)
+
+
+def simulate_chunk(sidebar_results: SidebarResults,
+                   seed_sequences: list[np.random.SeedSequence]) -> list[AbstractStrategy]:
+    """
+    Simulates one strategy per seed sequence. Runs in the worker processes, so it must
+    stay a module level function.
+
+    :param sidebar_results: User-defined parameters for the simulation process.
+    :param seed_sequences: Random stream of every simulation in the chunk.
+    :return: The simulated strategies, in the order of the seed sequences.
+    :rtype: list[AbstractStrategy]
+    """
+    return StrategyFactory(sidebar_results=sidebar_results).get_batch_strategies(rngs=seed_sequences)
+
+
+def simulate_chunk_histories(sidebar_results: SidebarResults,
+                             seed_sequences: list[np.random.SeedSequence]) -> np.ndarray:
+    """
+    Like :func:`simulate_chunk`, but only returns the histories.
+
+    :return: Histories of shape (len(seed_sequences), months + 1, columns), with the columns
+        in the order of ``StrategyFactory.get_history_columns``.
+    :rtype: np.ndarray
+    """
+    return StrategyFactory(sidebar_results=sidebar_results).simulate_batch(rngs=seed_sequences)
+
+
+def _run_instrumented(function: Callable[[SidebarResults, list[np.random.SeedSequence]], ChunkResult],
+                     sidebar_results: SidebarResults,
+                     seed_sequences: list[np.random.SeedSequence]) -> tuple[ChunkResult, PerformanceReport]:
+    # Runs in a worker process, which has its own instrumentation: collect the report of this chunk and send it back
+    instrumentation.enabled = True
+    instrumentation.reset()
+    return function(sidebar_results, seed_sequences), instrumentation.snapshot()
+
+
+def _map_chunks(function: Callable[[SidebarResults, list[np.random.SeedSequence]], ChunkResult],
+                sidebar_results: SidebarResults,
+                chunks: list[list[np.random.SeedSequence]],
+                number_of_workers: int | None) -> Iterator[ChunkResult]:
+    """
+    Applies ``function`` to every chunk and yields the results in the order of the chunks.
+
+    With more than one worker and more than one chunk, the chunks run in a
+    :class:`ProcessPoolExecutor`. At most two chunks per worker are in flight, so finished
+    results do not pile up while waiting for an earlier chunk. If the instrumentation is
+    enabled, the reports of the workers are merged into the one of this process. Closing the
+    iterator early cancels the chunks that have not started yet.
+    """
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count() or 1
+    if number_of_workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield function(sidebar_results, chunk)
+        return
+    instrumented = instrumentation.enabled
+    task = functools.partial(_run_instrumented, function) if instrumented else function
+    # Spawn instead of fork: the calling process may run threads (e.g. the Streamlit server)
+    with ProcessPoolExecutor(max_workers=min(number_of_workers, len(chunks)),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        remaining_chunks = iter(chunks)
+        pending = deque(executor.submit(task, sidebar_results, chunk)
+                        for chunk in islice(remaining_chunks, 2 * number_of_workers))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                next_chunk = next(remaining_chunks, None)
+                if next_chunk is not None:
+                    pending.append(executor.submit(task, sidebar_results, next_chunk))
+                if instrumented:
+                    result, report = result
+                    instrumentation.report.merge(report)
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _split_into_chunks(seed: int | None, number_of_simulations: int,
+                       chunk_size: int) -> list[list[np.random.SeedSequence]]:
+    seed_sequences = spawn_seed_sequences(seed, number_of_simulations)
+    return [seed_sequences[start:start + chunk_size] for start in range(0, number_of_simulations, chunk_size)]
+
+
+def simulate_strategies(sidebar_results: SidebarResults,
+                        number_of_simulations: int,
+                        seed: int | None = None,
+                        number_of_workers: int | None = 1,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        progress_callback: Callable[[int, int], None] | None = None) -> list[AbstractStrategy]:
+    """
+    Simulates ``number_of_simulations`` strategies, optionally spread over several processes.
+
+    The simulations are split into chunks of ``chunk_size``. With more than one worker and
+    more than one chunk, the chunks run in a :class:`ProcessPoolExecutor`, otherwise in the
+    current process. Every simulation draws from its own stream spawned from ``seed``, so for
+    a fixed seed the results do not depend on the number of workers or the chunk size.
+
+    :param sidebar_results: User-defined parameters for the simulation process.
+    :param number_of_simulations: Number of simulated strategies.
+    :param seed: Root seed. ``None`` draws fresh entropy from the operating system.
+    :param number_of_workers: Number of processes. ``None`` uses all available cores.
+    :param chunk_size: Number of simulations per task.
+    :param progress_callback: Called with the number of finished and the total number of
+        simulations after every chunk.
+    :return: The simulated strategies, in the order of their random streams.
+    :rtype: list[AbstractStrategy]
+    """
+    strategies = []
+    for chunk_result in _map_chunks(simulate_chunk, sidebar_results,
+                                    _split_into_chunks(seed, number_of_simulations, chunk_size), number_of_workers):
+        strategies.extend(chunk_result)
+        if progress_callback is not None:
+            progress_callback(len(strategies), number_of_simulations)
+    return strategies
+
+
+def simulate_history_chunks(sidebar_results: SidebarResults,
+                            number_of_simulations: int,
+                            seed: int | None = None,
+                            number_of_workers: int | None = 1,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Simulates like :func:`simulate_strategies` and yields the histories chunk by chunk, in
+    the order of the random streams. Only a few chunks are in memory at a time.
+
+    :return: Iterator over histories of shape (paths in chunk, months + 1, columns), with the
+        columns in the order of ``StrategyFactory.get_history_columns``.
+    :rtype: Iterator[np.ndarray]
+    """
+    return _map_chunks(simulate_chunk_histories, sidebar_results,
+                       _split_into_chunks(seed, number_of_simulations, chunk_size), number_of_workers)
+
+
+def simulate_histories(sidebar_results: SidebarResults,
+                       number_of_simulations: int,
+                       seed: int | None = None,
+                       number_of_workers: int | None = 1,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       progress_callback: Callable[[int, int], None] | None = None) -> np.ndarray:
+    """
+    Simulates like :func:`simulate_strategies`, but only keeps the histories. Every chunk runs
+    through the batch engine of the strategy, see
+    :meth:`backend.strategy.StrategyFactory.simulate_batch`. The workers send back plain
+    arrays, which are written into one preallocated array.
+
+    :return: Histories of shape (number_of_simulations, months + 1, columns), with the columns
+        in the order of ``StrategyFactory.get_history_columns``.
+    :rtype: np.ndarray
+    """
+    factory = StrategyFactory(sidebar_results=sidebar_results)
+    histories = np.empty((number_of_simulations, sidebar_results.duration_simulation * 12 + 1,
+                          len(factory.get_history_columns())), dtype="float64")
+    done = 0
+    for chunk_histories in simulate_history_chunks(sidebar_results, number_of_simulations, seed=seed,
+                                                   number_of_workers=number_of_workers, chunk_size=chunk_size):
+        histories[done:done + len(chunk_histories)] = chunk_histories
+        done += len(chunk_histories)
+        if progress_callback is not None:
+            progress_callback(done, number_of_simulations)
+    return histories
+
+
+def simulate_adaptive(sidebar_results: SidebarResults,
+                      max_number_of_simulations: int,
+                      criterion: ConvergenceCriterion,
+                      seed: int | None = None,
+                      number_of_workers: int | None = 1,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      progress_callback: Callable[[int, int], None] | None = None
+                      ) -> tuple[np.ndarray, ConvergenceReport]:
+    """
+    Simulates like :func:`simulate_histories`, but checks ``criterion`` after every chunk and
+    stops as soon as the monitored statistics have converged or the time budget is used up,
+    at the latest after ``max_number_of_simulations``. Simulation ``i`` still uses stream
+    ``i``, so the result equals the first paths of a run with a fixed number of simulations.
+    The chunk size is the granularity of the check. The array for the maximum is allocated
+    up front, but only the pages of the simulated paths are touched.
+
+    :return: Histories of shape (simulated paths, months + 1, columns) and the final
+        confidence intervals with the reason for stopping.
+    :rtype: tuple[np.ndarray, ConvergenceReport]
+    """
+    if max_number_of_simulations < 1:
+        raise ValueError(f"At least one simulation is required, got {max_number_of_simulations}")
+    factory = StrategyFactory(sidebar_results=sidebar_results)
+    columns = factory.get_history_columns()
+    histories = np.empty((max_number_of_simulations, sidebar_results.duration_simulation * 12 + 1, len(columns)),
+                         dtype="float64")
+    returned_money = columns.index(HistoryColumn.RETURNED_CUMULATIVE)
+    total_value = columns.index(HistoryColumn.TOTAL_VALUE)
+    start = time.perf_counter()
+    done = 0
+    chunks = simulate_history_chunks(sidebar_results, max_number_of_simulations, seed=seed,
+                                     number_of_workers=number_of_workers, chunk_size=chunk_size)
+    try:
+        for chunk_histories in chunks:
+            histories[done:done + len(chunk_histories)] = chunk_histories
+            done += len(chunk_histories)
+            if progress_callback is not None:
+                progress_callback(done, max_number_of_simulations)
+            report, stop = criterion.evaluate(returned_money_totals=histories[:done, -1, returned_money],
+                                              remaining_values=histories[:done, -1, total_value],
+                                              elapsed_seconds=time.perf_counter() - start,
+                                              maximum_reached=done == max_number_of_simulations)
+            if stop:
+                break
+    finally:
+        chunks.close()
+    return histories[:done], report
+
+
+def simulate_streaming(sidebar_results: SidebarResults,
+                       number_of_simulations: int,
+                       seed: int | None = None,
+                       number_of_workers: int | None = 1,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       sketch_capacity: int = 1000,
+                       progress_callback: Callable[[int, int], None] | None = None) -> StreamingAggregator:
+    """
+    Simulates like :func:`simulate_strategies`, but feeds the histories of every chunk into a
+    :class:`StreamingAggregator` and drops them afterward. The peak memory is bounded by a few
+    chunks and does not depend on ``number_of_simulations``. Chunks are aggregated in order,
+    so the statistics are reproducible for a fixed seed. A single path can be recomputed with
+    :func:`simulate_single`.
+
+    :return: The aggregated statistics of all simulations.
+    :rtype: StreamingAggregator
+    """
+    factory = StrategyFactory(sidebar_results=sidebar_results)
+    aggregator = StreamingAggregator(columns=factory.get_history_columns(),
+                                     n_months=sidebar_results.duration_simulation * 12,
+                                     sketch_capacity=sketch_capacity,
+                                     rng=seed)  # The paths only use spawned children of the seed
+    for histories in simulate_history_chunks(sidebar_results, number_of_simulations, seed=seed,
+                                             number_of_workers=number_of_workers, chunk_size=chunk_size):
+        aggregator.add(histories)
+        if progress_callback is not None:
+            progress_callback(aggregator.count, number_of_simulations)
+    return aggregator
+
+
+def simulate_single(sidebar_results: SidebarResults,
+                    number_of_simulations: int,
+                    seed: int | None,
+                    index: int) -> AbstractStrategy:
+    """
+    Recomputes simulation ``index`` of a run with ``number_of_simulations`` simulations and
+    root seed ``seed``. The result equals the corresponding entry of
+    :func:`simulate_strategies`, but only holds the history.
+    """
+    histories = simulate_chunk_histories(sidebar_results, [spawn_seed_sequences(seed, number_of_simulations)[index]])
+    return PrecomputedStrategy(history_values=histories[0],
+                               columns=StrategyFactory(sidebar_results=sidebar_results).get_history_columns())
@@ -0,0 +1,129 @@
+import json
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Sequence
+
+import numpy as np
+
+from backend.constants import DEFAULT_CHUNK_SIZE, ENGINE_VERSION, ExportFormat
+from backend.execution import simulate_history_chunks
+from backend.strategy import StrategyFactory
+from frontend.data_interface import SidebarResults
+
+METADATA_KEY = b"flosinvestment"  # Schlüssel der Lauf-Metadaten im Schema der Datei
+PATH_COLUMN = "Pfad"
+MONTH_COLUMN = "Monat"
+FILE_SUFFIXES = {ExportFormat.PARQUET: ".parquet", ExportFormat.ARROW: ".arrow"}
+
+
+class HistoryFileWriter:
+    def __init__(self, path: Path | str, columns: Sequence[str], file_format: ExportFormat, metadata: dict):
+        """
+        Writes histories chunk by chunk to a Parquet or Arrow IPC file, in long format: one
+        row per path and month with the columns ``Pfad``, ``Monat`` and one column per
+        history column. Every chunk becomes its own row group (Parquet) or record batch
+        (Arrow), so only the current chunk is held in memory. The metadata is stored as JSON
+        in the schema.
+
+        Needs ``pyarrow``, which is only imported here.
+
+        :param path: Target file, overwritten if it exists.
+        :param columns: Names of the history columns.
+        :param file_format: Parquet or Arrow IPC.
+        :param metadata: JSON-serializable description of the run.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.columns = [str(column) for column in columns]
+        self.file_format = file_format
+        self.schema = pa.schema([pa.field(PATH_COLUMN, pa.int64()), pa.field(MONTH_COLUMN, pa.int32())]
+                                + [pa.field(column, pa.float64()) for column in self.columns],
+                                metadata={METADATA_KEY: json.dumps(metadata, default=str)})
+        self.number_of_paths = 0
+        if file_format == ExportFormat.PARQUET:
+            self._writer = pq.ParquetWriter(str(path), self.schema)
+        elif file_format == ExportFormat.ARROW:
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        else:
+            raise NotImplementedError(f"Unknown export format: {file_format}")
+
+    def write(self, histories: np.ndarray):
+        """
+        :param histories: Histories of the next paths, shape (paths, months + 1, columns).
+        """
+        import pyarrow as pa
+
+        n_paths, n_rows, _ = histories.shape
+        paths = np.arange(self.number_of_paths, self.number_of_paths + n_paths, dtype="int64")
+        arrays = [pa.array(np.repeat(paths, n_rows)), pa.array(np.tile(np.arange(n_rows, dtype="int32"), n_paths))]
+        arrays += [pa.array(np.ascontiguousarray(histories[:, :, column_idx]).ravel())
+                   for column_idx in range(len(self.columns))]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self._writer.write_batch(batch)
+        self.number_of_paths += n_paths
+
+    def close(self):
+        self._writer.close()
+        if self.file_format == ExportFormat.ARROW:
+            self._sink.close()
+
+    def __enter__(self) -> "HistoryFileWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_simulations(sidebar_results: SidebarResults,
+                       path: Path | str,
+                       number_of_simulations: int,
+                       seed: int | None = None,
+                       number_of_workers: int | None = 1,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       file_format: ExportFormat = ExportFormat.PARQUET,
+                       progress_callback: Callable[[int, int], None] | None = None) -> int:
+    """
+    Simulates like :func:`backend.execution.simulate_histories` and writes every chunk to
+    ``path`` as soon as it is finished, see :class:`HistoryFileWriter`. The memory does not
+    depend on ``number_of_simulations``. Parameters, seed and engine version are stored in
+    the metadata, see :func:`read_export_metadata`.
+
+    :param seed: Root seed. ``None`` draws a fresh one, which is stored in the metadata so the
+        run can be repeated.
+    :param progress_callback: Called with the number of written and the total number of
+        simulations after every chunk.
+    :return: The root seed of the exported run.
+    :rtype: int
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    columns = StrategyFactory(sidebar_results=sidebar_results).get_history_columns()
+    metadata = {"parameters": asdict(sidebar_results),
+                "seed": seed,
+                "number_of_simulations": number_of_simulations,
+                "engine_version": ENGINE_VERSION}
+    with HistoryFileWriter(path, columns=columns, file_format=file_format, metadata=metadata) as writer:
+        for histories in simulate_history_chunks(sidebar_results, number_of_simulations, seed=seed,
+                                                 number_of_workers=number_of_workers, chunk_size=chunk_size):
+            writer.write(histories)
+            if progress_callback is not None:
+                progress_callback(writer.number_of_paths, number_of_simulations)
+    return seed
+
+
+def read_export_metadata(path: Path | str) -> dict:
+    """
+    Reads the metadata of a file written by :func:`export_simulations` from its schema,
+    without reading the data. The format follows from the file suffix.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if Path(path).suffix == FILE_SUFFIXES[ExportFormat.ARROW]:
+        with pa.memory_map(str(path)) as source:
+            schema = pa.ipc.open_file(source).schema
+    else:
+        schema = pq.read_schema(str(path))
+    return json.loads(schema.metadata[METADATA_KEY])
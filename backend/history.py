@@ -0,0 +1,45 @@
+from typing import Sequence, TYPE_CHECKING
+
+import numpy as np
+
+from backend.instrumentation import instrumentation
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class HistoryRecorder:
+    def __init__(self, n_months: int, columns: Sequence[str], cumulative_columns: Sequence[str]):
+        """
+        Records the monthly history of a strategy in a preallocated NumPy buffer.
+
+        Every month one row is written. Cumulative columns receive the flow of the month
+        (e.g. the money paid in this month), all other columns the current level (e.g. the
+        value of the portfolio). The cumulative sums are only taken when the history is read,
+        with one ``cumsum`` per column.
+
+        :param n_months: Number of simulated months. Row 0 holds the initial state.
+        :param columns: Names of the columns, in the order of the recorded values.
+        :param cumulative_columns: Columns that are accumulated over the months.
+        """
+        self.columns = [str(column) for column in columns]
+        self.data = np.zeros((n_months + 1, len(self.columns)), dtype="float64")
+        self.cumulative = np.array([column in cumulative_columns for column in self.columns], dtype=bool)
+
+    def record(self, month: int, values: Sequence[float]):
+        self.data[month] = values
+        if instrumentation.enabled:
+            instrumentation.count("history_writes")
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        :return: The history with accumulated columns, shape (months + 1, columns).
+        :rtype: np.ndarray
+        """
+        history = self.data.copy()
+        history[:, self.cumulative] = np.cumsum(history[:, self.cumulative], axis=0)
+        return history
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        import pandas as pd  # Only needed for display, keeps the import of the simulation light
+        return pd.DataFrame(self.to_numpy(), columns=self.columns, index=range(len(self.data)), dtype="float64")
@@ -0,0 +1,222 @@
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+
+
+class AbstractIndicator(ABC):
+    """
+    Streaming indicator of a time series, e.g. the reference price of the Flo strategy.
+
+    ``update`` adds the next value in O(1) (amortized) and returns the new value of the
+    indicator. ``batch`` computes the indicator for many series at once: for a
+    (paths, months) matrix, column ``k`` equals the value after ``update`` was called with
+    the columns 0 to ``k`` of that path. Both use the same arithmetic, so they give the same
+    floats. The cost of both does not depend on the window length.
+    """
+
+    @abstractmethod
+    def reset(self):
+        pass
+
+    @abstractmethod
+    def update(self, value: float) -> float:
+        pass
+
+    @property
+    @abstractmethod
+    def value(self) -> float:
+        pass
+
+    @abstractmethod
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        pass
+
+
+class RollingMean(AbstractIndicator):
+    def __init__(self, window: int):
+        """
+        Mean of the last ``window`` values (of all values while there are fewer), kept as a
+        running sum.
+        """
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._values = deque()
+        self._sum = 0.0
+
+    def update(self, value: float) -> float:
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self.window:
+            self._sum -= self._values.popleft()
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self._sum / len(self._values)
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        means = np.empty(values.shape, dtype="float64")
+        sums = np.zeros(values.shape[0], dtype="float64")
+        for idx in range(values.shape[1]):
+            sums += values[:, idx]
+            if idx >= self.window:
+                sums -= values[:, idx - self.window]
+            means[:, idx] = sums / min(idx + 1, self.window)
+        return means
+
+
+class ExponentialMovingAverage(AbstractIndicator):
+    def __init__(self, span: int):
+        """
+        Exponential moving average with smoothing factor ``2 / (span + 1)``. It starts at the
+        first value.
+        """
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.reset()
+
+    def reset(self):
+        self._value = None
+
+    def update(self, value: float) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+        return self._value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        averages = np.empty(values.shape, dtype="float64")
+        if values.shape[1] == 0:
+            return averages
+        current = values[:, 0].astype("float64")
+        averages[:, 0] = current
+        for idx in range(1, values.shape[1]):
+            current = current + self.alpha * (values[:, idx] - current)
+            averages[:, idx] = current
+        return averages
+
+
+class _RollingExtremum(AbstractIndicator):
+    # Rolling minimum (``_sign`` 1) or maximum (``_sign`` -1) with a monotonic deque of (index, value)
+    _sign: int
+
+    def __init__(self, window: int):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._candidates = deque()
+        self._count = 0
+
+    def update(self, value: float) -> float:
+        candidates = self._candidates
+        while candidates and self._sign * candidates[-1][1] >= self._sign * value:
+            candidates.pop()
+        candidates.append((self._count, value))
+        if candidates[0][0] <= self._count - self.window:
+            candidates.popleft()
+        self._count += 1
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self._candidates[0][1]
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        """
+        Van Herk/Gil-Werman algorithm: within blocks of ``window`` months, the extremum of a
+        window is combined from a backward running extremum of one block and a forward running
+        extremum of the next, so every entry costs O(1).
+        """
+        accumulate = np.minimum.accumulate if self._sign == 1 else np.maximum.accumulate
+        combine = np.minimum if self._sign == 1 else np.maximum
+        n_paths, n_months = values.shape
+        window = min(self.window, max(n_months, 1))
+        n_blocks = -(-n_months // window)
+        padded = np.full((n_paths, n_blocks * window), self._sign * np.inf)
+        padded[:, :n_months] = values
+        blocks = padded.reshape(n_paths, n_blocks, window)
+        forward = accumulate(blocks, axis=2).reshape(n_paths, -1)
+        backward = accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n_paths, -1)
+        extrema = np.empty(values.shape, dtype="float64")
+        # The first windows start at month 0
+        extrema[:, :window - 1] = forward[:, :window - 1]
+        extrema[:, window - 1:] = combine(backward[:, :n_months - window + 1], forward[:, window - 1:n_months])
+        return extrema
+
+
+class RollingMin(_RollingExtremum):
+    """
+    Minimum of the last ``window`` values.
+    """
+    _sign = 1
+
+
+class RollingMax(_RollingExtremum):
+    """
+    Maximum of the last ``window`` values.
+    """
+    _sign = -1
+
+
+class RollingVolatility(AbstractIndicator):
+    def __init__(self, window: int):
+        """
+        Sample standard deviation of the last ``window`` relative changes
+        ``value / previous value - 1``, kept as running sums of the changes and their squares.
+        It is 0 while there are fewer than two changes.
+        """
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+        self._returns = deque()
+        self._sum = 0.0
+        self._sum_squares = 0.0
+
+    def update(self, value: float) -> float:
+        if self._previous is not None:
+            change = value / self._previous - 1
+            self._returns.append(change)
+            self._sum += change
+            self._sum_squares += change * change
+            if len(self._returns) > self.window:
+                old_change = self._returns.popleft()
+                self._sum -= old_change
+                self._sum_squares -= old_change * old_change
+        self._previous = value
+        return self.value
+
+    @property
+    def value(self) -> float:
+        n = len(self._returns)
+        if n < 2:
+            return 0.0
+        return (max(self._sum_squares - self._sum * self._sum / n, 0.0) / (n - 1)) ** 0.5
+
+    def batch(self, values: np.ndarray) -> np.ndarray:
+        volatilities = np.zeros(values.shape, dtype="float64")
+        sums = np.zeros(values.shape[0], dtype="float64")
+        sums_squares = np.zeros(values.shape[0], dtype="float64")
+        changes = values[:, 1:] / values[:, :-1] - 1
+        for idx in range(1, values.shape[1]):
+            change = changes[:, idx - 1]
+            sums += change
+            sums_squares += change * change
+            if idx > self.window:
+                old_change = changes[:, idx - 1 - self.window]
+                sums -= old_change
+                sums_squares -= old_change * old_change
+            n = min(idx, self.window)
+            if n >= 2:
+                volatilities[:, idx] = (np.maximum(sums_squares - sums * sums / n, 0.0) / (n - 1)) ** 0.5
+        return volatilities
@@ -0,0 +1,105 @@
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+ENABLED_BY_DEFAULT = os.environ.get("FLOSINVESTMENT_INSTRUMENTATION", "") == "1"  # Messung ohne Umschalter in der App
+
+
+@dataclass
+class PerformanceReport:
+    """
+    Timers and counters of one or more runs. Timers are inclusive: a phase that runs inside
+    another one (e.g. ``buy`` inside ``simulation``) counts for both.
+    """
+    timers: dict[str, float] = field(default_factory=dict)  # Gemessene Zeit je Phase in Sekunden
+    timer_calls: dict[str, int] = field(default_factory=dict)  # Anzahl Messungen je Phase
+    counters: dict[str, int] = field(default_factory=dict)  # Zähler, z.B. angelegte Lose
+
+    def merge(self, other: "PerformanceReport"):
+        for name, seconds in other.timers.items():
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+        for name, calls in other.timer_calls.items():
+            self.timer_calls[name] = self.timer_calls.get(name, 0) + calls
+        for name, count in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def as_dict(self) -> dict:
+        return {"timers": dict(self.timers), "timer_calls": dict(self.timer_calls), "counters": dict(self.counters)}
+
+
+class Instrumentation(threading.local):
+    def __init__(self):
+        """
+        Collects phase timers and counters of the simulation. It is off by default, then
+        every hook returns right after checking ``enabled``. The state is per thread, so
+        concurrent Streamlit sessions do not mix their numbers. Streamlit runs every rerun,
+        also of a fragment, on a new thread: the app keeps the report of a session itself and
+        hands it over with :meth:`bind`. Worker processes collect their own report, which is
+        merged by :mod:`backend.execution`.
+        """
+        self.enabled = ENABLED_BY_DEFAULT
+        self.report = PerformanceReport()
+
+    def reset(self):
+        self.report = PerformanceReport()
+
+    def bind(self, report: PerformanceReport | None):
+        """
+        Collects into ``report`` on this thread from now on, ``None`` disables the collection.
+        """
+        self.enabled = report is not None
+        self.report = report if report is not None else PerformanceReport()
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_time(name, time.perf_counter() - start)
+
+    def _add_time(self, name: str, seconds: float):
+        report = self.report
+        report.timers[name] = report.timers.get(name, 0.0) + seconds
+        report.timer_calls[name] = report.timer_calls.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.report.counters[name] = self.report.counters.get(name, 0) + int(n)
+
+    def snapshot(self) -> PerformanceReport:
+        report = PerformanceReport()
+        report.merge(self.report)
+        return report
+
+
+instrumentation = Instrumentation()
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator measuring every call of a function as phase ``name`` while the
+    instrumentation is enabled.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                instrumentation._add_time(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
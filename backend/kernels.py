@@ -0,0 +1,375 @@
+"""
+Compiled month loop of the strategies.
+
+The kernels simulate one path after the other with plain loops over NumPy arrays, without
+:class:`backend.portfolio.Portfolio` objects or pandas. A portfolio is a FIFO ledger like
+:class:`backend.portfolio.LotLedger`: prefix sums of the bought units and purchasing values,
+the units and purchasing value sold from the front, a head and a tail pointer. The rules
+(FIFO sells, loss pot, yearly tax-free allowance) are the ones of
+:meth:`backend.portfolio.Portfolio.sell`.
+
+With Numba installed the kernels are compiled on first use. Without it, ``NUMBA_AVAILABLE``
+is ``False`` and callers should use the vectorized NumPy engine in :mod:`backend.batch`
+instead; the kernels still run, but as slow pure Python.
+"""
+import numpy as np
+
+from backend.batch import SavingPlanBatchSimulation, FloBatchSimulation
+from backend.instrumentation import instrumentation
+from backend.utils import convert_yearly_interest_to_monthly
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+    def njit(*args, **kwargs):
+        def decorator(function):
+            return function
+
+        return decorator
+
+# Positions in the float state of a ledger
+_SOLD_UNITS = 0
+_SOLD_PURCHASING_VALUE = 1
+_LOSS_POT = 2
+_REMAINING_TAX_FREE_ALLOWANCE = 3
+# Positions in the integer state of a ledger
+_HEAD = 0
+_TAIL = 1
+
+
+@njit(cache=True)
+def _total_units(cumulative_units, float_state, int_state):
+    if int_state[_HEAD] == int_state[_TAIL]:
+        return 0.0
+    return cumulative_units[int_state[_TAIL] - 1] - float_state[_SOLD_UNITS]
+
+
+@njit(cache=True)
+def _buy(money, cost_buy, price, purchasing_prices, cumulative_units, cumulative_purchasing_values, int_state):
+    money = money - cost_buy
+    if money < 0:
+        return
+    units = money / price
+    tail = int_state[_TAIL]
+    previous_units = cumulative_units[tail - 1] if tail > 0 else 0.0
+    previous_purchasing_value = cumulative_purchasing_values[tail - 1] if tail > 0 else 0.0
+    purchasing_prices[tail] = price
+    cumulative_units[tail] = previous_units + units
+    cumulative_purchasing_values[tail] = previous_purchasing_value + units * price
+    int_state[_TAIL] = tail + 1
+
+
+@njit(cache=True)
+def _sell_units(units, purchasing_prices, cumulative_units, cumulative_purchasing_values, float_state, int_state):
+    head = int_state[_HEAD]
+    tail = int_state[_TAIL]
+    total_units = _total_units(cumulative_units, float_state, int_state)
+    if units >= total_units:
+        purchasing_value = 0.0
+        if head != tail:
+            purchasing_value = cumulative_purchasing_values[tail - 1] - float_state[_SOLD_PURCHASING_VALUE]
+            float_state[_SOLD_UNITS] = cumulative_units[tail - 1]
+            float_state[_SOLD_PURCHASING_VALUE] = cumulative_purchasing_values[tail - 1]
+        int_state[_HEAD] = tail
+        return purchasing_value
+    cut_off = float_state[_SOLD_UNITS] + units
+    # First lot that is not sold completely
+    lot = head + np.searchsorted(cumulative_units[head:tail], cut_off, side="right")
+    # Rounding in the cut-off can reach the end of the last lot although ``units`` is below the total
+    lot = min(lot, tail - 1)
+    remaining_units_in_lot = cumulative_units[lot] - cut_off
+    sold_purchasing_value = cumulative_purchasing_values[lot] - remaining_units_in_lot * purchasing_prices[lot]
+    purchasing_value = sold_purchasing_value - float_state[_SOLD_PURCHASING_VALUE]
+    int_state[_HEAD] = lot
+    float_state[_SOLD_UNITS] = cut_off
+    float_state[_SOLD_PURCHASING_VALUE] = sold_purchasing_value
+    return purchasing_value
+
+
+@njit(cache=True)
+def _sell(target_money_sell, transaction_costs, price, capital_yields_tax_percentage,
+          purchasing_prices, cumulative_units, cumulative_purchasing_values, float_state, int_state):
+    # Returns the returned money, the taxes and the transaction costs
+    if target_money_sell < transaction_costs or int_state[_HEAD] == int_state[_TAIL]:
+        return 0.0, 0.0, 0.0
+    total_units = _total_units(cumulative_units, float_state, int_state)
+    current_total_value = price * total_units
+    if current_total_value <= target_money_sell:
+        returned_money = current_total_value
+        purchasing_value = _sell_units(total_units, purchasing_prices, cumulative_units,
+                                       cumulative_purchasing_values, float_state, int_state)
+    else:
+        returned_money = target_money_sell
+        purchasing_value = _sell_units(target_money_sell / price, purchasing_prices, cumulative_units,
+                                       cumulative_purchasing_values, float_state, int_state)
+    profit = returned_money - purchasing_value
+    if profit < 0:
+        tax = 0.0
+        float_state[_LOSS_POT] += -profit
+    else:
+        used_loss_pot = min(float_state[_LOSS_POT], profit)
+        profit_minus_loss_pot = profit - used_loss_pot
+        float_state[_LOSS_POT] -= used_loss_pot
+        profit_part_in_tax_free_allowance = min(float_state[_REMAINING_TAX_FREE_ALLOWANCE], profit_minus_loss_pot)
+        profit_part_outside_tax_free_allowance = profit_minus_loss_pot - profit_part_in_tax_free_allowance
+        float_state[_REMAINING_TAX_FREE_ALLOWANCE] -= profit_part_in_tax_free_allowance
+        tax = profit_part_outside_tax_free_allowance * capital_yields_tax_percentage / 100.0
+    return returned_money - transaction_costs - tax, tax, transaction_costs
+
+
+@njit(cache=True)
+def _saving_plan_kernel(prices, histories, reserves_init, initial_savings, monthly_savings, monthly_savings_reserves,
+                        monthly_interest_rate_on_reserves, capital_yields_tax_percentage, yearly_tax_free_allowance,
+                        n_months_accumulation, monthly_payoff, costs_buy, costs_sell):
+    n_paths, n_columns = prices.shape
+    n_months = n_columns - 1
+    purchasing_prices = np.empty(n_months_accumulation + 1)
+    cumulative_units = np.empty(n_months_accumulation + 1)
+    cumulative_purchasing_values = np.empty(n_months_accumulation + 1)
+    float_state = np.empty(4)
+    int_state = np.empty(2, dtype=np.int64)
+    for path_idx in range(n_paths):
+        float_state[:] = 0.0
+        float_state[_REMAINING_TAX_FREE_ALLOWANCE] = yearly_tax_free_allowance
+        int_state[:] = 0
+        reserves = reserves_init
+        month = 1
+        payed_total = 0.0
+        returned_total = 0.0
+        tax_total = 0.0
+        costs_total = 0.0
+        histories[path_idx, 0, 0] = reserves
+        histories[path_idx, 0, 1:5] = 0.0
+        for month_idx in range(1, n_months + 1):
+            price = prices[path_idx, month_idx - 1]
+            returned_money = 0.0
+            payed_money = 0.0
+            transaction_costs = 0.0
+            initial_reserves = reserves
+            tax = reserves * monthly_interest_rate_on_reserves / 100 * capital_yields_tax_percentage / 100
+            reserves *= 1 + (monthly_interest_rate_on_reserves / 100) * (1 - capital_yields_tax_percentage / 100)
+            if month_idx <= n_months_accumulation:
+                # Sparphase
+                if month_idx == 1:
+                    payed_money += initial_reserves
+                    _buy(initial_savings, costs_buy, price, purchasing_prices, cumulative_units,
+                         cumulative_purchasing_values, int_state)
+                    transaction_costs += costs_buy
+                    payed_money += initial_savings
+                reserves += monthly_savings_reserves
+                payed_money += monthly_savings + monthly_savings_reserves
+                _buy(monthly_savings, costs_buy, price, purchasing_prices, cumulative_units,
+                     cumulative_purchasing_values, int_state)
+                transaction_costs += costs_buy
+            else:
+                # Auszahlphase
+                if price * _total_units(cumulative_units, float_state, int_state) > 0:
+                    returned_money, tax_sell, costs_sell_month = _sell(
+                        monthly_payoff, costs_sell, price, capital_yields_tax_percentage, purchasing_prices,
+                        cumulative_units, cumulative_purchasing_values, float_state, int_state)
+                    tax += tax_sell
+                    transaction_costs += costs_sell_month
+                else:
+                    returned_money = min(reserves, monthly_payoff)
+                    reserves -= returned_money
+            # Next month
+            if month < 12:
+                month += 1
+            else:
+                month = 1
+                float_state[_REMAINING_TAX_FREE_ALLOWANCE] = yearly_tax_free_allowance
+            payed_total += payed_money
+            returned_total += returned_money
+            tax_total += tax
+            costs_total += transaction_costs
+            histories[path_idx, month_idx, 0] = reserves + prices[path_idx, month_idx] * _total_units(
+                cumulative_units, float_state, int_state)
+            histories[path_idx, month_idx, 1] = payed_total
+            histories[path_idx, month_idx, 2] = returned_total
+            histories[path_idx, month_idx, 3] = tax_total
+            histories[path_idx, month_idx, 4] = costs_total
+
+
+@njit(cache=True)
+def _flo_kernel(etf_prices, stock_prices, reference_prices, histories, reserves_init, initial_savings,
+                monthly_savings, monthly_savings_reserves, monthly_interest_rate_on_reserves,
+                capital_yields_tax_percentage, yearly_tax_free_allowance, n_months_accumulation, monthly_payoff,
+                costs_buy, costs_sell, target_number_of_stocks, step_size, prize_step_size):
+    n_paths, n_columns = etf_prices.shape
+    n_months = n_columns - 1
+    etf_purchasing_prices = np.empty(n_months_accumulation + 1)
+    etf_cumulative_units = np.empty(n_months_accumulation + 1)
+    etf_cumulative_purchasing_values = np.empty(n_months_accumulation + 1)
+    etf_float_state = np.empty(4)
+    etf_int_state = np.empty(2, dtype=np.int64)
+    stock_purchasing_prices = np.empty(n_months_accumulation + 1)
+    stock_cumulative_units = np.empty(n_months_accumulation + 1)
+    stock_cumulative_purchasing_values = np.empty(n_months_accumulation + 1)
+    stock_float_state = np.empty(4)
+    stock_int_state = np.empty(2, dtype=np.int64)
+    for path_idx in range(n_paths):
+        etf_float_state[:] = 0.0
+        etf_float_state[_REMAINING_TAX_FREE_ALLOWANCE] = yearly_tax_free_allowance
+        etf_int_state[:] = 0
+        stock_float_state[:] = 0.0
+        stock_float_state[_REMAINING_TAX_FREE_ALLOWANCE] = yearly_tax_free_allowance
+        stock_int_state[:] = 0
+        reserves = reserves_init
+        month = 1
+        payed_total = 0.0
+        returned_total = 0.0
+        tax_total = 0.0
+        costs_total = 0.0
+        histories[path_idx, 0, :] = 0.0
+        histories[path_idx, 0, 0] = reserves
+        histories[path_idx, 0, 5] = reserves
+        for month_idx in range(1, n_months + 1):
+            etf_price = etf_prices[path_idx, month_idx - 1]
+            stock_price = stock_prices[path_idx, month_idx - 1]
+            returned_money = 0.0
+            payed_money = 0.0
+            transaction_costs = 0.0
+            initial_reserves = reserves
+            tax = reserves * monthly_interest_rate_on_reserves / 100 * capital_yields_tax_percentage / 100
+            reserves *= 1 + (monthly_interest_rate_on_reserves / 100) * (1 - capital_yields_tax_percentage / 100)
+            if month_idx <= n_months_accumulation:
+                # Sparphase
+                if month_idx == 1:
+                    payed_money += initial_reserves
+                    _buy(initial_savings, costs_buy, etf_price, etf_purchasing_prices, etf_cumulative_units,
+                         etf_cumulative_purchasing_values, etf_int_state)
+                    transaction_costs += costs_buy
+                    payed_money += initial_savings
+                reserves += monthly_savings_reserves
+                payed_money += monthly_savings + monthly_savings_reserves
+                _buy(monthly_savings, costs_buy, etf_price, etf_purchasing_prices, etf_cumulative_units,
+                     etf_cumulative_purchasing_values, etf_int_state)
+                transaction_costs += costs_buy
+                # Aktie: flo_investment_formula, rint rounds halves to even like round
+                n_shares_hold = stock_int_state[_TAIL] - stock_int_state[_HEAD]
+                n = np.rint((stock_price - reference_prices[path_idx, month_idx - 1]) / prize_step_size)
+                n = min(max(n, -3.0), 3.0)
+                how_many_stocks_to_buy = target_number_of_stocks - n * step_size - n_shares_hold
+                if how_many_stocks_to_buy > 0:
+                    money_needed = min(how_many_stocks_to_buy * stock_price + costs_buy, reserves)
+                    _buy(money_needed, costs_buy, stock_price, stock_purchasing_prices, stock_cumulative_units,
+                         stock_cumulative_purchasing_values, stock_int_state)
+                    reserves -= money_needed
+                    transaction_costs += costs_buy
+                elif how_many_stocks_to_buy < 0:
+                    target_money = -how_many_stocks_to_buy * stock_price + costs_sell
+                    returned_stocks, tax_sell, costs_sell_month = _sell(
+                        target_money, costs_sell, stock_price, capital_yields_tax_percentage, stock_purchasing_prices,
+                        stock_cumulative_units, stock_cumulative_purchasing_values, stock_float_state,
+                        stock_int_state)
+                    reserves += returned_stocks
+                    tax += tax_sell
+                    transaction_costs += costs_sell_month
+            else:
+                # Auszahlphase: first the stocks, then the ETFs, then the reserves
+                if stock_price * _total_units(stock_cumulative_units, stock_float_state, stock_int_state) > 0:
+                    returned_money, tax_sell, costs_sell_month = _sell(
+                        monthly_payoff, costs_sell, stock_price, capital_yields_tax_percentage,
+                        stock_purchasing_prices, stock_cumulative_units, stock_cumulative_purchasing_values,
+                        stock_float_state, stock_int_state)
+                    tax += tax_sell
+                    transaction_costs += costs_sell_month
+                elif etf_price * _total_units(etf_cumulative_units, etf_float_state, etf_int_state) > 0:
+                    returned_money, tax_sell, costs_sell_month = _sell(
+                        monthly_payoff, costs_sell, etf_price, capital_yields_tax_percentage, etf_purchasing_prices,
+                        etf_cumulative_units, etf_cumulative_purchasing_values, etf_float_state, etf_int_state)
+                    tax += tax_sell
+                    transaction_costs += costs_sell_month
+                else:
+                    returned_money = min(reserves, monthly_payoff)
+                    reserves -= returned_money
+            # Next month
+            if month < 12:
+                month += 1
+            else:
+                month = 1
+                etf_float_state[_REMAINING_TAX_FREE_ALLOWANCE] = yearly_tax_free_allowance
+                stock_float_state[_REMAINING_TAX_FREE_ALLOWANCE] = yearly_tax_free_allowance
+            payed_total += payed_money
+            returned_total += returned_money
+            tax_total += tax
+            costs_total += transaction_costs
+            value_etfs = etf_prices[path_idx, month_idx] * _total_units(etf_cumulative_units, etf_float_state,
+                                                                        etf_int_state)
+            value_stocks = stock_prices[path_idx, month_idx] * _total_units(stock_cumulative_units, stock_float_state,
+                                                                            stock_int_state)
+            histories[path_idx, month_idx, 0] = reserves + value_etfs + value_stocks
+            histories[path_idx, month_idx, 1] = payed_total
+            histories[path_idx, month_idx, 2] = returned_total
+            histories[path_idx, month_idx, 3] = tax_total
+            histories[path_idx, month_idx, 4] = costs_total
+            histories[path_idx, month_idx, 5] = reserves
+            histories[path_idx, month_idx, 6] = value_etfs
+            histories[path_idx, month_idx, 7] = value_stocks
+
+
+def simulate_saving_plan(batch_simulation: SavingPlanBatchSimulation, prices: np.ndarray) -> np.ndarray:
+    """
+    Runs the savings plan kernel with the parameters of ``batch_simulation``.
+
+    :param prices: Price matrix of shape (paths, months + 1).
+    :return: Histories of shape (paths, months + 1, 5), columns as in
+        ``backend.strategy.SAVING_PLAN_HISTORY_COLUMNS``.
+    :rtype: np.ndarray
+    """
+    prices = np.ascontiguousarray(prices, dtype="float64")
+    histories = np.empty((prices.shape[0], prices.shape[1], 5), dtype="float64")
+    _saving_plan_kernel(prices, histories,
+                        float(batch_simulation.reserves),
+                        float(batch_simulation.initial_savings),
+                        float(batch_simulation.monthly_savings),
+                        float(batch_simulation.monthly_savings_reserves),
+                        float(convert_yearly_interest_to_monthly(batch_simulation.yearly_interest_rate_on_reserves)),
+                        float(batch_simulation.capital_yields_tax_percentage),
+                        float(batch_simulation.yearly_tax_free_allowance),
+                        min(batch_simulation.duration_accumulation_phase_in_years * 12, batch_simulation.n_months),
+                        float(batch_simulation.monthly_payoff),
+                        float(batch_simulation.costs_buy_absolute),
+                        float(batch_simulation.costs_sell_absolute))
+    # The kernels do not count lots, only the written history rows
+    instrumentation.count("history_writes", prices.shape[0] * (prices.shape[1] - 1))
+    return histories
+
+
+def simulate_flo(batch_simulation: FloBatchSimulation, etf_prices: np.ndarray, stock_prices: np.ndarray) -> np.ndarray:
+    """
+    Runs the Flo kernel with the parameters of ``batch_simulation``. The reference prices are
+    computed up front with the ``batch`` form of its indicator.
+
+    :param etf_prices: ETF prices of shape (paths, months + 1).
+    :param stock_prices: Stock prices of shape (paths, months + 1).
+    :return: Histories of shape (paths, months + 1, 8), columns as in
+        ``backend.strategy.FLO_HISTORY_COLUMNS``.
+    :rtype: np.ndarray
+    """
+    etf_prices = np.ascontiguousarray(etf_prices, dtype="float64")
+    stock_prices = np.ascontiguousarray(stock_prices, dtype="float64")
+    reference_prices = np.ascontiguousarray(batch_simulation.flo_reference_price_indicator.batch(stock_prices))
+    histories = np.empty((etf_prices.shape[0], etf_prices.shape[1], 8), dtype="float64")
+    _flo_kernel(etf_prices, stock_prices, reference_prices, histories,
+                float(batch_simulation.reserves),
+                float(batch_simulation.initial_savings),
+                float(batch_simulation.monthly_savings),
+                float(batch_simulation.monthly_savings_reserves),
+                float(convert_yearly_interest_to_monthly(batch_simulation.yearly_interest_rate_on_reserves)),
+                float(batch_simulation.capital_yields_tax_percentage),
+                float(batch_simulation.yearly_tax_free_allowance // 2),
+                min(batch_simulation.duration_accumulation_phase_in_years * 12, batch_simulation.n_months),
+                float(batch_simulation.monthly_payoff),
+                float(batch_simulation.costs_buy_absolute),
+                float(batch_simulation.costs_sell_absolute),
+                float(batch_simulation.flo_target_number_of_stocks),
+                float(batch_simulation.flo_step_size),
+                float(batch_simulation.flo_prize_step_size))
+    instrumentation.count("history_writes", etf_prices.shape[0] * (etf_prices.shape[1] - 1))
+    return histories
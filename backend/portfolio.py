@@ -1,6 +1,10 @@
 from dataclasses import dataclass
 
-from typing import Callable
+from typing import Callable, Sequence
+
+import numpy as np
+
+from backend.instrumentation import instrumentation, timed
 
 
 class SharePrize:
@@ -39,14 +43,118 @@ class Share:
         return self.purchasing_prize_per_unit * self.units
 
 
+class LotLedger:
+    """
+    FIFO queue of lots stored as a struct of arrays.
+
+    Units, purchasing prizes and buy dates live in NumPy arrays that grow by doubling. The
+    queue starts at ``head``, lots before it are sold. Next to the lots the ledger keeps
+    prefix sums of the bought units and purchasing values and the cumulative units and
+    purchasing value sold from the front. Valuing the ledger is O(1) and a sale finds its
+    cut-off lot by binary search on the prefix sums, touching only that one lot.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.units = np.empty(capacity, dtype="float64")  # Remaining units per lot
+        self.purchasing_prizes_per_unit = np.empty(capacity, dtype="float64")
+        self.months_bought = np.empty(capacity, dtype="int64")
+        self.years_bought = np.empty(capacity, dtype="int64")
+        self.cumulative_units = np.empty(capacity, dtype="float64")
+        self.cumulative_purchasing_values = np.empty(capacity, dtype="float64")
+        self.head = 0  # First lot not sold completely
+        self.tail = 0  # Position of the next lot
+        self.sold_units = 0.0
+        self.sold_purchasing_value = 0.0
+
+    def __len__(self) -> int:
+        return self.tail - self.head
+
+    @property
+    def total_units(self) -> float:
+        if self.head == self.tail:
+            return 0.0
+        return float(self.cumulative_units[self.tail - 1]) - self.sold_units
+
+    @property
+    def total_purchasing_value(self) -> float:
+        if self.head == self.tail:
+            return 0.0
+        return float(self.cumulative_purchasing_values[self.tail - 1]) - self.sold_purchasing_value
+
+    def _grow(self):
+        # Drop the sold lots, rebase the prefix sums on the remaining ones and double the capacity
+        n_lots = len(self)
+        capacity = max(2 * n_lots, 64)
+        for name in ("units", "purchasing_prizes_per_unit", "months_bought", "years_bought",
+                     "cumulative_units", "cumulative_purchasing_values"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:n_lots] = old[self.head:self.tail]
+            setattr(self, name, new)
+        self.cumulative_units[:n_lots] -= self.sold_units
+        self.cumulative_purchasing_values[:n_lots] -= self.sold_purchasing_value
+        self.sold_units = 0.0
+        self.sold_purchasing_value = 0.0
+        self.head = 0
+        self.tail = n_lots
+
+    def append(self, units: float, purchasing_prize_per_unit: float, time_bought: tuple[int, int]):
+        if self.tail == len(self.units):
+            self._grow()
+        previous_units = self.cumulative_units[self.tail - 1] if self.tail else 0.0
+        previous_purchasing_value = self.cumulative_purchasing_values[self.tail - 1] if self.tail else 0.0
+        self.units[self.tail] = units
+        self.purchasing_prizes_per_unit[self.tail] = purchasing_prize_per_unit
+        self.months_bought[self.tail], self.years_bought[self.tail] = time_bought
+        self.cumulative_units[self.tail] = previous_units + units
+        self.cumulative_purchasing_values[self.tail] = previous_purchasing_value + units * purchasing_prize_per_unit
+        self.tail += 1
+
+    def sell_units(self, units: float) -> float:
+        """
+        Removes ``units`` from the front of the queue. Lots are sold completely as long as
+        they fit into ``units``, the remaining part is taken from the next lot. Selling at
+        least all units empties the ledger.
+
+        :param units: Number of units to sell.
+        :return: Purchasing value of the sold units.
+        :rtype: float
+        """
+        if units >= self.total_units:
+            if instrumentation.enabled:
+                instrumentation.count("lots_scanned", len(self))
+            purchasing_value = self.total_purchasing_value
+            self.sold_units = float(self.cumulative_units[self.tail - 1])
+            self.sold_purchasing_value = float(self.cumulative_purchasing_values[self.tail - 1])
+            self.head = self.tail
+            return purchasing_value
+        cut_off = self.sold_units + units
+        # First lot that is not sold completely
+        lot = int(np.searchsorted(self.cumulative_units[self.head:self.tail], cut_off, side="right")) + self.head
+        # Rounding in ``sold_units + units`` can reach the end of the last lot although ``units`` is below the total
+        lot = min(lot, self.tail - 1)
+        if instrumentation.enabled:
+            instrumentation.count("lots_scanned", lot - self.head + 1)
+        remaining_units_in_lot = float(self.cumulative_units[lot]) - cut_off
+        sold_purchasing_value = (float(self.cumulative_purchasing_values[lot])
+                                 - remaining_units_in_lot * float(self.purchasing_prizes_per_unit[lot]))
+        purchasing_value = sold_purchasing_value - self.sold_purchasing_value
+        self.units[lot] = remaining_units_in_lot
+        self.head = lot
+        self.sold_units = cut_off
+        self.sold_purchasing_value = sold_purchasing_value
+        return purchasing_value
+
+
 class Portfolio:
     def __init__(self,
-                 updater: Callable[[float], float],  # Updated den Aktienpreis für den nächsten Monat
+                 updater: Callable[[float], float] | None,  # Updated den Aktienpreis für den nächsten Monat
                  yearly_tax_free_allowance: float = 1000,  # Steuerfreibetrag
                  capital_yields_tax_percentage: int = 25,  # Kapitalertragssteuer
                  init_share_prize_per_unit: float = 1,  # Initialer Wert Aktie
                  init_month: int = 1,
-                 init_year: int = 2024):
+                 init_year: int = 2024,
+                 price_path: Sequence[float] | None = None):  # Vorberechneter Kursverlauf
         """
         This class simulates a etf of shares.
 
@@ -55,7 +163,8 @@ class Portfolio:
         capital yields tax percentage, and initializes various attributes to manage
         etf shares and losses.
 
-        :param updater: Callable to update the stock price for the next month.
+        :param updater: Callable to update the stock price for the next month. Not used if
+            a ``price_path`` is given.
         :param yearly_tax_free_allowance: The tax-free allowance provided
             annually for the investment. Default is set to 1000.
         :param capital_yields_tax_percentage: The percentage of tax applied
@@ -64,8 +173,13 @@ class Portfolio:
             Default is set to January (1).
         :param init_year: The initial year for the investment timeline.
             Default is set to 2024.
+        :param price_path: Precomputed prices, e.g. a row of
+            :meth:`backend.simulation.AbstractSimulationModel.sample_paths`. Entry ``k`` is the
+            price after ``k`` months, entry 0 replaces ``init_share_prize_per_unit``.
         """
-        self.shares: list[Share] = []
+        if updater is None and price_path is None:
+            raise ValueError("Either an updater or a price path is required")
+        self.lots = LotLedger()
         self.month = init_month
         self.year = init_year
         self.updater = updater
@@ -73,41 +187,59 @@ class Portfolio:
         self.remaining_yearly_tax_free_allowance = yearly_tax_free_allowance
         self.yearly_loss_pot = 0.0  # Verlusttopf
         self.capital_yields_tax_percentage = capital_yields_tax_percentage
+        self.price_path = price_path
+        self.months_passed = 0
+        if price_path is not None:
+            init_share_prize_per_unit = float(price_path[0])
         self.share_prize_per_unit = SharePrize(init_share_prize_per_unit)  # The initial current_value is not important
 
+    @property
+    def shares(self) -> list[Share]:
+        """
+        The lots of the ledger as :class:`Share` objects, oldest first. The list is built on
+        every access and changing it does not change the portfolio.
+
+        :return: The shares currently held.
+        :rtype: list[Share]
+        """
+        lots = self.lots
+        return [Share(current_prize_per_unit=self.share_prize_per_unit,
+                      purchasing_prize_per_unit=float(lots.purchasing_prizes_per_unit[idx]),
+                      units=float(lots.units[idx]),
+                      time_bought=(int(lots.months_bought[idx]), int(lots.years_bought[idx])))
+                for idx in range(lots.head, lots.tail)]
+
     @property
     def current_total_value(self) -> float:
         """
         Calculate the current total value of shares.
 
-        This property computes the total value by summing up the product of the
-        current prize per unit and the number of units for each share available
-        in the 'shares' list attribute.
+        All shares have the same current prize per unit, so the value is the product of
+        the prize and the running total of units in the ledger.
 
         :return: Total value of the shares.
         :rtype: float
         """
-        return sum(share.current_prize_per_unit.value * share.units for share in self.shares)
+        return self.share_prize_per_unit.value * self.lots.total_units
 
     @property
     def invested_money(self) -> float:
         """
-        Computes the total invested money calculated by summing the product of
-        purchasing price per unit and number of units for each share in the
-        'shares' collection.
+        Computes the total invested money, the sum of purchasing price per unit times the
+        number of units over all lots. It is kept as a running total in the ledger.
 
         :return: The total invested money as a float calculated from share
                  purchasing prices and units.
         :rtype: float
         """
-        return sum(share.purchasing_prize_per_unit * share.units for share in self.shares)
+        return self.lots.total_purchasing_value
 
+    @timed("buy")
     def buy(self, money: float, cost_buy: float):
         """
         Executes a transaction to buy shares based on available money and the cost
         of buying a unit. The method updates the remaining money after the purchase
-        and appends a new Share instance to the list of shares if the transaction
-        is valid and possible.
+        and appends a new lot to the ledger if the transaction is valid and possible.
 
         :param money: The current amount of money available for purchasing shares.
         :type money: float
@@ -119,12 +251,13 @@ class Portfolio:
         money = money - cost_buy
         if money < 0:
             return
-        share = Share(current_prize_per_unit=self.share_prize_per_unit,
-                      purchasing_prize_per_unit=self.share_prize_per_unit.value,
-                      units=money / self.share_prize_per_unit.value,
-                      time_bought=(self.month, self.year))
-        self.shares.append(share)
+        self.lots.append(units=money / self.share_prize_per_unit.value,
+                         purchasing_prize_per_unit=self.share_prize_per_unit.value,
+                         time_bought=(self.month, self.year))
+        if instrumentation.enabled:
+            instrumentation.count("lots_created")
 
+    @timed("sell")
     def sell(self, target_money_sell: float, transaction_costs: float) -> tuple[float, float, float]:
         """
         Calculates and executes the sale of shares to achieve a target return after accounting
@@ -143,33 +276,20 @@ class Portfolio:
         :rtype: tuple[float, float, float]
         """
         # If selling costs more than the target return or no shares, sell nothing
-        if target_money_sell < transaction_costs or not self.shares:
+        if target_money_sell < transaction_costs or not len(self.lots):
             return 0.0, 0.0, 0.0
-        # We collect the returned money from selling in the following variable
-        returned_money = 0.0  # Without tax and costs, has to be subtracted afterward
-        profit = 0.0
-        # Start selling shares, beginning from the first. We can sell fractions
-        while True:
-            # If there are no shares, nothing to sell
-            if not self.shares:
-                break
-            # Get oldest shares
-            oldest_share = self.shares.pop(0)
-            current_value = oldest_share.current_value
-            # If the share has more value than the target sell, only sell a fraction
-            if current_value > target_money_sell:
-                # Only sell a fraction:
-                selling_amount = target_money_sell / oldest_share.current_prize_per_unit.value
-                oldest_share.units -= selling_amount  # Reducer the number of units
-                self.shares = [oldest_share] + self.shares  # Add the share again to the history
-                profit += target_money_sell - selling_amount * oldest_share.purchasing_prize_per_unit
-                returned_money += target_money_sell
-                target_money_sell -= target_money_sell
-                break
-            else:
-                profit += current_value - oldest_share.purchasing_value
-                returned_money += current_value
-                target_money_sell -= current_value
+        if instrumentation.enabled:
+            instrumentation.count("sells")
+        # Sell the shares in the order they were bought. We can sell fractions
+        current_total_value = self.current_total_value
+        if current_total_value <= target_money_sell:
+            # Everything is sold
+            returned_money = current_total_value  # Without tax and costs, has to be subtracted afterward
+            purchasing_value = self.lots.sell_units(self.lots.total_units)
+        else:
+            returned_money = target_money_sell
+            purchasing_value = self.lots.sell_units(target_money_sell / self.share_prize_per_unit.value)
+        profit = returned_money - purchasing_value
         if profit < 0:
             tax = 0.0
             self.yearly_loss_pot += -profit
@@ -187,7 +307,8 @@ class Portfolio:
         Advances the current month by one. If the current month is December, it
         rolls over to January of the next year, and resets the remaining yearly
         tax-free allowance to the initial yearly tax-free allowance. Additionally,
-        updates the current prize per unit for each share using a provided updater.
+        updates the current prize per unit for each share using the precomputed price
+        path or, if there is none, the provided updater.
 
         :return: None
         """
@@ -197,7 +318,11 @@ class Portfolio:
             self.month = 1
             self.year += 1
             self.remaining_yearly_tax_free_allowance = self.yearly_tax_free_allowance
-        self.share_prize_per_unit.update_value(self.updater)
+        self.months_passed += 1
+        if self.price_path is not None:
+            self.share_prize_per_unit.value = float(self.price_path[self.months_passed])
+        else:
+            self.share_prize_per_unit.update_value(self.updater)
 
 
 if __name__ == '__main__':
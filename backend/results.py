@@ -0,0 +1,130 @@
+import hashlib
+from dataclasses import dataclass
+from math import floor
+from typing import Sequence
+
+import numpy as np
+
+from backend.constants import HistoryColumn
+from backend.convergence import ConvergenceReport
+from backend.simulation import RandomSource, get_rng
+from backend.strategy import PrecomputedStrategy
+
+
+class ScoreIndex:
+    def __init__(self, returned_money_totals: np.ndarray, remaining_values: np.ndarray):
+        """
+        Final values of all simulated paths, stored once as vectors to rank the paths.
+
+        The score of a path is ``returned_money_total * weight + remaining_value * (1 - weight)``.
+        Percentiles are found with ``np.argpartition`` in O(paths), without sorting the paths.
+
+        :param returned_money_totals: Paid out money of every path at the end of the simulation.
+        :param remaining_values: Remaining value of every path at the end of the simulation.
+        """
+        self.returned_money_totals = np.asarray(returned_money_totals, dtype="float64")
+        self.remaining_values = np.asarray(remaining_values, dtype="float64")
+
+    @classmethod
+    def from_histories(cls, histories: np.ndarray, columns: Sequence[str]) -> "ScoreIndex":
+        """
+        :param histories: Histories of shape (paths, months + 1, columns).
+        :param columns: Names of the history columns.
+        """
+        columns = list(columns)
+        return cls(returned_money_totals=histories[:, -1, columns.index(HistoryColumn.RETURNED_CUMULATIVE)],
+                   remaining_values=histories[:, -1, columns.index(HistoryColumn.TOTAL_VALUE)])
+
+    def __len__(self) -> int:
+        return len(self.returned_money_totals)
+
+    def scores(self, weight_return_value: float) -> np.ndarray:
+        return self.returned_money_totals * weight_return_value + self.remaining_values * (1 - weight_return_value)
+
+    def percentile_index(self, percentile: float, weight_return_value: float) -> int:
+        """
+        :param percentile: Percentile between 0 and 100.
+        :param weight_return_value: Weight of the paid out money in the score.
+        :return: Index of the path at the given percentile of the scores.
+        :rtype: int
+        """
+        index_percentile = min(floor(percentile / 100 * len(self)), len(self) - 1)
+        scores = self.scores(weight_return_value)
+        return int(np.argpartition(scores, index_percentile)[index_percentile])
+
+    def median_index(self, weight_return_value: float) -> int:
+        return self.percentile_index(50, weight_return_value)
+
+
+@dataclass
+class SimulationResults:
+    """
+    Compact result of a Monte Carlo run: one contiguous array with the histories of all paths
+    and the score index. It holds no strategy or portfolio objects, so it is cheap to pickle
+    and copy (e.g. by ``st.cache_data``). A strategy is only rebuilt for a path that is shown.
+    """
+    columns: list[str]  # Namen der Spalten der Historie
+    histories: np.ndarray  # Historien aller Pfade, Form (Pfade, Monate + 1, Spalten)
+    score_index: ScoreIndex  # Endwerte aller Pfade zur Auswahl von Median und Perzentilen
+    convergence: ConvergenceReport | None = None  # Nur bei adaptiven Simulationen: Abbruchgrund und Konfidenzintervalle
+
+    @classmethod
+    def from_histories(cls, histories: np.ndarray, columns: Sequence[str],
+                       convergence: ConvergenceReport | None = None) -> "SimulationResults":
+        columns = [str(column) for column in columns]
+        return cls(columns=columns,
+                   histories=np.ascontiguousarray(histories),
+                   score_index=ScoreIndex.from_histories(histories, columns),
+                   convergence=convergence)
+
+    def __len__(self) -> int:
+        return len(self.histories)
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Identifies the results by the shape of the histories and the final values of all
+        paths, which is much cheaper than hashing all histories.
+        """
+        digest = hashlib.sha256(repr(self.histories.shape).encode("utf-8"))
+        digest.update(self.score_index.returned_money_totals.tobytes())
+        digest.update(self.score_index.remaining_values.tobytes())
+        return digest.hexdigest()
+
+    def column(self, column: str) -> np.ndarray:
+        """
+        :return: One column of all histories, shape (paths, months + 1).
+        """
+        return self.histories[:, :, self.columns.index(column)]
+
+    @property
+    def mean_history(self) -> np.ndarray:
+        return self.histories.mean(axis=0)
+
+    def quantile_bands(self, column: str, quantiles: Sequence[float]) -> np.ndarray:
+        """
+        Per month quantiles of one column over all paths. The column is copied once into a
+        (months + 1, paths) array, which ``np.quantile`` then partitions in place.
+
+        :param column: Name of the history column.
+        :param quantiles: Quantiles between 0 and 1.
+        :return: The bands, shape (len(quantiles), months + 1).
+        :rtype: np.ndarray
+        """
+        values_per_month = np.ascontiguousarray(self.column(column).T)
+        return np.quantile(values_per_month, quantiles, axis=1, overwrite_input=True)
+
+    def sample_paths(self, column: str, number_of_paths: int, rng: RandomSource = None) -> np.ndarray:
+        """
+        :param column: Name of the history column.
+        :param number_of_paths: Number of drawn paths, at most all paths.
+        :param rng: Generator or seed sequence choosing the paths.
+        :return: One column of randomly chosen histories, in the order of the paths, shape
+            (number_of_paths, months + 1).
+        :rtype: np.ndarray
+        """
+        indices = get_rng(rng).choice(len(self), size=min(number_of_paths, len(self)), replace=False)
+        return self.column(column)[np.sort(indices)]
+
+    def get_strategy(self, index: int) -> PrecomputedStrategy:
+        return PrecomputedStrategy(history_values=self.histories[index], columns=self.columns)
@@ -1,15 +1,200 @@
+import functools
+import os
+import warnings
 from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Sequence
 
+from backend.constants import SamplingScheme
 from backend.utils import convert_yearly_interest_to_monthly
 
 import numpy as np
 
+RandomSource = np.random.Generator | np.random.SeedSequence | int | None
+
+
+def get_rng(rng: RandomSource = None) -> np.random.Generator:
+    """
+    Turns a generator, seed sequence or integer seed into a :class:`numpy.random.Generator`.
+    An existing generator is returned unchanged, ``None`` gives a freshly seeded generator.
+    """
+    return np.random.default_rng(rng)
+
+
+def prices_from_monthly_factors(monthly_factors: np.ndarray, init_price: float = 1.0) -> np.ndarray:
+    """
+    Chains monthly growth factors of shape (paths, months) to a price matrix of shape
+    (paths, months + 1). The product is taken in the same order as repeated scalar updates
+    ``price = price * factor``, so both give identical floats.
+    """
+    n_paths, n_months = monthly_factors.shape
+    prices = np.empty((n_paths, n_months + 1), dtype="float64")
+    prices[:, 0] = init_price
+    prices[:, 1:] = monthly_factors
+    np.cumprod(prices, axis=1, out=prices)
+    return prices
+
+
+def _stream_index(rng: RandomSource) -> int:
+    if not isinstance(rng, np.random.SeedSequence) or not rng.spawn_key:
+        raise ValueError("Antithetic and Sobol sampling need the spawned seed sequences of the simulations, "
+                         "see backend.execution.spawn_seed_sequences")
+    return rng.spawn_key[-1]
+
+
+def _sibling_stream(seed_sequence: np.random.SeedSequence, index: int) -> np.random.SeedSequence:
+    # Stream ``index`` spawned from the same root as ``seed_sequence``
+    return np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key[:-1] + (index,),
+                                  pool_size=seed_sequence.pool_size)
+
+
+def _antithetic_standard_normal(rngs: Sequence[RandomSource], shape: tuple[int, ...]) -> np.ndarray:
+    shocks = np.empty((len(rngs),) + shape, dtype="float64")
+    for path_idx, rng in enumerate(rngs):
+        index = _stream_index(rng)
+        if index % 2 == 0:
+            shocks[path_idx] = get_rng(rng).standard_normal(shape)
+        elif (path_idx > 0 and rngs[path_idx - 1].entropy == rng.entropy
+              and rngs[path_idx - 1].spawn_key == rng.spawn_key[:-1] + (index - 1,)):
+            np.negative(shocks[path_idx - 1], out=shocks[path_idx])
+        else:
+            # The partner is not part of this batch, draw its numbers again
+            shocks[path_idx] = -get_rng(_sibling_stream(rng, index - 1)).standard_normal(shape)
+    return shocks
+
+
+@functools.lru_cache(maxsize=16)
+def _brownian_bridge_schedule(n_steps: int) -> tuple[tuple[int, int, int, float, float, float], ...]:
+    # (point, left, right, weight left, weight right, standard deviation), coarse to fine
+    schedule = []
+    intervals = [(0, n_steps)]
+    while intervals:
+        left, right = intervals.pop(0)
+        if right - left < 2:
+            continue
+        point = (left + right) // 2
+        schedule.append((point, left, right, (right - point) / (right - left), (point - left) / (right - left),
+                         np.sqrt((point - left) * (right - point) / (right - left))))
+        intervals += [(left, point), (point, right)]
+    return tuple(schedule)
+
+
+def brownian_bridge_increments(normals: np.ndarray) -> np.ndarray:
+    """
+    Turns independent standard normal numbers into the increments of a random walk, built by
+    a Brownian bridge along the last axis: the first number sets the end point of the walk,
+    the next ones the midpoints of the remaining intervals, coarse to fine. The increments are
+    again independent standard normal, but the first numbers decide most of the path. Used
+    with quasi-random numbers, whose first dimensions are the most uniform.
+
+    :param normals: Standard normal numbers, shape (..., steps).
+    :return: Increments of the walk, same shape.
+    :rtype: np.ndarray
+    """
+    n_steps = normals.shape[-1]
+    walk = np.zeros(normals.shape[:-1] + (n_steps + 1,), dtype="float64")
+    walk[..., n_steps] = np.sqrt(n_steps) * normals[..., 0]
+    for number, (point, left, right, weight_left, weight_right, std) in enumerate(_brownian_bridge_schedule(n_steps),
+                                                                                  start=1):
+        walk[..., point] = weight_left * walk[..., left] + weight_right * walk[..., right] + std * normals[..., number]
+    return np.diff(walk, axis=-1)
+
+
+def _sobol_standard_normal(rngs: Sequence[RandomSource], n_assets: int, n_months: int) -> np.ndarray:
+    try:
+        from scipy.special import ndtri
+        from scipy.stats import qmc
+    except ImportError as error:
+        raise ImportError("Sobol sampling needs scipy") from error
+    indices = np.array([_stream_index(rng) for rng in rngs])
+    # All streams of a run share the root, which seeds the scrambling
+    root = np.random.SeedSequence(rngs[0].entropy, spawn_key=rngs[0].spawn_key[:-1], pool_size=rngs[0].pool_size)
+    sobol = qmc.Sobol(d=n_assets * n_months, scramble=True, seed=get_rng(root))
+    uniforms = np.empty((len(rngs), n_assets * n_months), dtype="float64")
+    with warnings.catch_warnings():
+        # Chunks are rarely a power of two, the balance of the whole run does not depend on them
+        warnings.simplefilter("ignore", UserWarning)
+        for run in np.split(np.arange(len(indices)), np.flatnonzero(np.diff(indices) != 1) + 1):
+            sobol.reset()
+            if indices[run[0]] > 0:
+                sobol.fast_forward(int(indices[run[0]]))
+            uniforms[run] = sobol.random(len(run))
+    normals = ndtri(np.clip(uniforms, np.finfo("float64").tiny, 1 - np.finfo("float64").epsneg))
+    # Dimension ``step * n_assets + asset``: the first dimensions set the end points of all assets
+    normals = normals.reshape(len(rngs), n_months, n_assets).transpose(0, 2, 1)
+    return brownian_bridge_increments(normals)
+
+
+def standard_normal_per_stream(rngs: Sequence[RandomSource],
+                               n_assets: int,
+                               n_months: int,
+                               sampling: SamplingScheme = SamplingScheme.PSEUDO_RANDOM) -> np.ndarray:
+    """
+    Draws the standard normal shocks of one path per random stream. Row ``i`` only depends on
+    ``rngs[i]``, also for the variance reduction schemes:
+
+    * ``PSEUDO_RANDOM``: independent draws from every stream.
+    * ``ANTITHETIC``: streams ``2k`` and ``2k + 1`` form a pair, the odd stream gets the
+      negated numbers of its partner. The streams must be spawned seed sequences, the partner
+      is derived from the spawn key.
+    * ``SOBOL``: point ``i`` of a scrambled Sobol sequence over all months and assets, mapped
+      through the inverse normal distribution and ordered by a Brownian bridge, see
+      :func:`brownian_bridge_increments`. The scrambling is seeded by the root of the spawned
+      seed sequences. Needs scipy.
+
+    :return: Shocks of shape (len(rngs), n_assets, n_months).
+    :rtype: np.ndarray
+    """
+    if sampling == SamplingScheme.ANTITHETIC:
+        return _antithetic_standard_normal(rngs, (n_assets, n_months))
+    elif sampling == SamplingScheme.SOBOL:
+        return _sobol_standard_normal(rngs, n_assets, n_months)
+    shocks = np.empty((len(rngs), n_assets, n_months), dtype="float64")
+    for path_idx, rng in enumerate(rngs):
+        shocks[path_idx] = get_rng(rng).standard_normal((n_assets, n_months))
+    return shocks
+
 
 class AbstractSimulationModel(ABC):
     @abstractmethod
     def __call__(self, current_price: float) -> float:
         pass
 
+    @abstractmethod
+    def sample_paths(self,
+                     n_paths: int,
+                     n_months: int,
+                     rng: RandomSource = None,
+                     init_price: float = 1.0) -> np.ndarray:
+        """
+        Generates whole price paths with one vectorized draw.
+
+        Column ``k`` holds the price after ``k`` monthly updates, i.e. the value a
+        :class:`backend.portfolio.Portfolio` sees after ``k`` calls of ``next_month``.
+
+        :param n_paths: Number of independent paths.
+        :param n_months: Number of simulated months.
+        :param rng: Generator or seed sequence the random numbers are drawn from.
+        :param init_price: Price at month 0.
+        :return: Price matrix of shape (n_paths, n_months + 1).
+        :rtype: np.ndarray
+        """
+        pass
+
+    def sample_paths_per_stream(self,
+                                rngs: Sequence[RandomSource],
+                                n_months: int,
+                                init_price: float = 1.0) -> np.ndarray:
+        """
+        Generates one path per random stream. Row ``i`` only depends on ``rngs[i]``, so a path
+        is the same no matter how the paths are split into batches.
+
+        :return: Price matrix of shape (len(rngs), n_months + 1).
+        :rtype: np.ndarray
+        """
+        return np.vstack([self.sample_paths(n_paths=1, n_months=n_months, rng=rng, init_price=init_price)
+                          for rng in rngs])
+
 
 class DeterministicSimulationModel(AbstractSimulationModel):
     def __init__(self, yearly_interest_rate: float):
@@ -18,12 +203,208 @@ class DeterministicSimulationModel(AbstractSimulationModel):
     def __call__(self, current_price: float) -> float:
         return current_price * (1 + self.monthly_interest_rate / 100)
 
+    def sample_paths(self,
+                     n_paths: int,
+                     n_months: int,
+                     rng: RandomSource = None,
+                     init_price: float = 1.0) -> np.ndarray:
+        monthly_factors = np.full((n_paths, n_months), 1 + self.monthly_interest_rate / 100)
+        return prices_from_monthly_factors(monthly_factors, init_price=init_price)
+
 
 class SimpleNormalDistributionSimulationModel(AbstractSimulationModel):
-    def __init__(self, average_yearly_interest_rate: float, sigma: float):
+    def __init__(self, average_yearly_interest_rate: float, sigma: float, rng: RandomSource = None,
+                 sampling: SamplingScheme = SamplingScheme.PSEUDO_RANDOM):
         self.average_monthly_interest_rate = convert_yearly_interest_to_monthly(average_yearly_interest_rate)
         self.sigma = sigma
+        self.rng = get_rng(rng)  # Only used for the scalar updates
+        self.sampling = sampling  # Only used for the paths per stream
 
     def __call__(self, current_price: float) -> float:
-        rate = np.random.normal(loc=self.average_monthly_interest_rate, scale=self.sigma)
+        rate = self.rng.normal(loc=self.average_monthly_interest_rate, scale=self.sigma)
         return current_price * (1 + rate / 100)
+
+    def sample_paths(self,
+                     n_paths: int,
+                     n_months: int,
+                     rng: RandomSource = None,
+                     init_price: float = 1.0) -> np.ndarray:
+        rates = get_rng(rng).normal(loc=self.average_monthly_interest_rate, scale=self.sigma,
+                                    size=(n_paths, n_months))
+        return prices_from_monthly_factors(1 + rates / 100, init_price=init_price)
+
+    def sample_paths_per_stream(self,
+                                rngs: Sequence[RandomSource],
+                                n_months: int,
+                                init_price: float = 1.0) -> np.ndarray:
+        """
+        Like :meth:`AbstractSimulationModel.sample_paths_per_stream`, with the shocks drawn by
+        the sampling scheme of the model, see :func:`standard_normal_per_stream`.
+        """
+        if self.sampling == SamplingScheme.PSEUDO_RANDOM:
+            return super().sample_paths_per_stream(rngs=rngs, n_months=n_months, init_price=init_price)
+        shocks = standard_normal_per_stream(rngs, n_assets=1, n_months=n_months, sampling=self.sampling)[:, 0]
+        rates = self.average_monthly_interest_rate + self.sigma * shocks
+        return prices_from_monthly_factors(1 + rates / 100, init_price=init_price)
+
+
+def load_monthly_returns(csv_path: Path | str, column: str | None = None) -> np.ndarray:
+    """
+    Loads historical monthly returns in percent from a CSV file with a header row.
+
+    The CSV is parsed only once: the returns are stored as ``.npy`` next to it and loaded
+    memory-mapped afterward. The ``.npy`` is rebuilt if the CSV is newer.
+
+    :param csv_path: CSV file with one row per month, oldest month first.
+    :param column: Column with the returns. Default is the last column.
+    :return: Read-only, memory-mapped returns in percent, shape (months,).
+    :rtype: np.ndarray
+    """
+    csv_path = Path(csv_path)
+    npy_path = csv_path.with_name(f"{csv_path.stem}{'.' + column if column else ''}.npy")
+    if not npy_path.exists() or npy_path.stat().st_mtime < csv_path.stat().st_mtime:
+        import pandas as pd
+
+        frame = pd.read_csv(csv_path)
+        returns = frame[column if column is not None else frame.columns[-1]].to_numpy(dtype="float64")
+        if len(returns) == 0 or not np.isfinite(returns).all():
+            raise ValueError(f"{csv_path} must contain at least one month and only numeric returns")
+        # Write under a temporary name and rename, so a concurrent reader never sees a partial file
+        temporary_path = npy_path.with_name(f".{npy_path.name}.{os.getpid()}.tmp")
+        with temporary_path.open("wb") as file:
+            np.save(file, returns)
+        os.replace(temporary_path, npy_path)
+    return np.load(npy_path, mmap_mode="r")
+
+
+class HistoricalBootstrapSimulationModel(AbstractSimulationModel):
+    def __init__(self, monthly_returns: np.ndarray, mean_block_length: float, rng: RandomSource = None):
+        """
+        Replays historical monthly returns with the stationary block bootstrap of Politis and
+        Romano: a path is made of blocks of consecutive historical months, which wrap around at
+        the end of the data. Every month a new block starts with probability
+        ``1 / mean_block_length`` at a uniformly drawn month, so the block lengths are
+        geometric. Within a block the order of the months is kept, which preserves short
+        term dependencies like volatility clusters.
+
+        :param monthly_returns: Historical monthly returns in percent, e.g. from
+            :func:`load_monthly_returns`.
+        :param mean_block_length: Mean length of the blocks in months, at least 1.
+        :param rng: Generator or seed sequence, only used for the scalar updates.
+        """
+        if mean_block_length < 1:
+            raise ValueError(f"The mean block length must be at least 1, got {mean_block_length}")
+        self.monthly_factors = 1 + np.asarray(monthly_returns, dtype="float64") / 100
+        self.new_block_probability = 1 / mean_block_length
+        self.rng = get_rng(rng)
+        self._position = None  # Month of the data used in the last scalar update
+
+    def __call__(self, current_price: float) -> float:
+        if self._position is None or self.rng.random() < self.new_block_probability:
+            self._position = int(self.rng.integers(len(self.monthly_factors)))
+        else:
+            self._position = (self._position + 1) % len(self.monthly_factors)
+        return current_price * float(self.monthly_factors[self._position])
+
+    def sample_indices(self, n_paths: int, n_months: int, rng: RandomSource = None) -> np.ndarray:
+        """
+        Draws the months of the data used by every path with two batched draws: whether a new
+        block starts and where, for all paths and months at once. The position in a block
+        follows from the distance to the last block start, found with a running maximum.
+
+        :return: Indices into the historical returns, shape (n_paths, n_months).
+        :rtype: np.ndarray
+        """
+        rng = get_rng(rng)
+        n_data = len(self.monthly_factors)
+        new_block = rng.random((n_paths, n_months)) < self.new_block_probability
+        new_block[:, 0] = True
+        block_starts = rng.integers(n_data, size=(n_paths, n_months))
+        months = np.arange(n_months)
+        last_block_start = np.where(new_block, months, 0)
+        np.maximum.accumulate(last_block_start, axis=1, out=last_block_start)
+        indices = np.take_along_axis(block_starts, last_block_start, axis=1)
+        # In place from here on, the arrays are large for many paths
+        indices += np.subtract(months, last_block_start, out=last_block_start)
+        return np.remainder(indices, n_data, out=indices)
+
+    def sample_paths(self,
+                     n_paths: int,
+                     n_months: int,
+                     rng: RandomSource = None,
+                     init_price: float = 1.0) -> np.ndarray:
+        monthly_factors = self.monthly_factors[self.sample_indices(n_paths=n_paths, n_months=n_months, rng=rng)]
+        return prices_from_monthly_factors(monthly_factors, init_price=init_price)
+
+
+class CorrelatedNormalSimulationModel:
+    def __init__(self,
+                 average_yearly_interest_rates: Sequence[float],
+                 sigmas: Sequence[float],
+                 correlation: np.ndarray,
+                 sampling: SamplingScheme = SamplingScheme.PSEUDO_RANDOM):
+        """
+        Several assets with normally distributed monthly rates like
+        :class:`SimpleNormalDistributionSimulationModel`, drawn together and correlated
+        through the Cholesky factor ``L`` of the correlation matrix: independent standard
+        normal draws ``z`` become ``L @ z``. With the identity matrix every asset gets the
+        same rates as its own :class:`SimpleNormalDistributionSimulationModel` drawing from
+        the same generator one asset after the other.
+
+        :param average_yearly_interest_rates: Average yearly interest rate per asset in percent.
+        :param sigmas: Volatility of the monthly rate per asset in percentage points.
+        :param correlation: Positive definite correlation matrix of the monthly rates, shape
+            (assets, assets).
+        :param sampling: How :meth:`sample_paths_per_stream` draws the independent shocks.
+        """
+        self.average_monthly_interest_rates = np.array(
+            [convert_yearly_interest_to_monthly(rate) for rate in average_yearly_interest_rates], dtype="float64")
+        self.sigmas = np.asarray(sigmas, dtype="float64")
+        self.cholesky_factor = np.linalg.cholesky(np.asarray(correlation, dtype="float64"))
+        self.sampling = sampling
+
+    @property
+    def n_assets(self) -> int:
+        return len(self.sigmas)
+
+    def _prices_from_shocks(self, shocks: np.ndarray, init_prices: Sequence[float] | None) -> np.ndarray:
+        # Same operations as prices_from_monthly_factors, for all assets at once
+        n_assets, n_paths, n_months = shocks.shape
+        correlated_shocks = (self.cholesky_factor @ shocks.reshape(n_assets, -1)).reshape(shocks.shape)
+        rates = self.average_monthly_interest_rates[:, None, None] + self.sigmas[:, None, None] * correlated_shocks
+        prices = np.empty((n_assets, n_paths, n_months + 1), dtype="float64")
+        prices[:, :, 0] = np.ones(n_assets) if init_prices is None else np.asarray(init_prices)[:, None]
+        prices[:, :, 1:] = 1 + rates / 100
+        np.cumprod(prices, axis=2, out=prices)
+        return prices
+
+    def sample_paths(self,
+                     n_paths: int,
+                     n_months: int,
+                     rng: RandomSource = None,
+                     init_prices: Sequence[float] | None = None) -> np.ndarray:
+        """
+        Generates the price paths of all assets with one vectorized draw.
+
+        :param init_prices: Price at month 0 per asset, 1 by default.
+        :return: Price matrices of shape (assets, n_paths, n_months + 1).
+        :rtype: np.ndarray
+        """
+        shocks = get_rng(rng).standard_normal((self.n_assets, n_paths, n_months))
+        return self._prices_from_shocks(shocks, init_prices=init_prices)
+
+    def sample_paths_per_stream(self,
+                                rngs: Sequence[RandomSource],
+                                n_months: int,
+                                init_prices: Sequence[float] | None = None) -> np.ndarray:
+        """
+        Generates one path of every asset per random stream, see
+        :meth:`AbstractSimulationModel.sample_paths_per_stream`. Only the draw is done per
+        stream, the correlation and the prices are computed for all paths at once. The shocks
+        follow the sampling scheme of the model, see :func:`standard_normal_per_stream`.
+
+        :return: Price matrices of shape (assets, len(rngs), n_months + 1).
+        :rtype: np.ndarray
+        """
+        shocks = standard_normal_per_stream(rngs, n_assets=self.n_assets, n_months=n_months, sampling=self.sampling)
+        return self._prices_from_shocks(shocks.transpose(1, 0, 2), init_prices=init_prices)
@@ -1,25 +1,68 @@
-import pandas as pd
+from typing import TYPE_CHECKING
 
+import numpy as np
+
+from backend.batch import SavingPlanBatchSimulation, FloBatchSimulation
+from backend.history import HistoryRecorder
 from backend.portfolio import Portfolio
 from backend.simulation import AbstractSimulationModel, DeterministicSimulationModel, \
-    SimpleNormalDistributionSimulationModel
+    SimpleNormalDistributionSimulationModel, HistoricalBootstrapSimulationModel, CorrelatedNormalSimulationModel, \
+    RandomSource, get_rng, load_monthly_returns
 from backend.utils import convert_yearly_interest_to_monthly
-from backend.constants import Strategy, SimulationModel
+from backend.constants import Strategy, SimulationModel, HistoryColumn, ReferencePrice, Engine
+from backend.indicators import AbstractIndicator, RollingMean, ExponentialMovingAverage, RollingMin, RollingMax
+from backend.instrumentation import timed
 
 from frontend.data_interface import SidebarResults
 from abc import ABC, abstractmethod
 
 from backend.utils import flo_investment_formula
-from frontend.sidebar import sidebar
 
-from collections import deque
+from typing import Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+CUMULATIVE_HISTORY_COLUMNS = (HistoryColumn.PAYED_CUMULATIVE,
+                              HistoryColumn.RETURNED_CUMULATIVE,
+                              HistoryColumn.TAX_CUMULATIVE,
+                              HistoryColumn.COSTS_CUMULATIVE)
+SAVING_PLAN_HISTORY_COLUMNS = (HistoryColumn.TOTAL_VALUE,
+                               HistoryColumn.PAYED_CUMULATIVE,
+                               HistoryColumn.RETURNED_CUMULATIVE,
+                               HistoryColumn.TAX_CUMULATIVE,
+                               HistoryColumn.COSTS_CUMULATIVE)
+FLO_HISTORY_COLUMNS = SAVING_PLAN_HISTORY_COLUMNS + (HistoryColumn.VALUE_RESERVES,
+                                                     HistoryColumn.VALUE_ETFS,
+                                                     HistoryColumn.VALUE_STOCKS)
 
 
 class AbstractStrategy(ABC):
+    history_recorder: HistoryRecorder
+    _history: "pd.DataFrame | None" = None
+
     @abstractmethod
     def simulate(self):
         pass
 
+    def _build_history(self) -> "pd.DataFrame":
+        return self.history_recorder.to_dataframe()
+
+    @property
+    def history(self) -> "pd.DataFrame":
+        """
+        Monthly history of the strategy. The DataFrame is built on first access and cached,
+        pandas is only imported then.
+        """
+        if self._history is None:
+            self._history = self._build_history()
+        return self._history
+
+    @history.setter
+    def history(self, history: "pd.DataFrame"):
+        self._history = history
+
     @property
     def payed_money_total(self) -> float:
         return self.history.iloc[-1]["Eingezahlt (kumulativ)"]
@@ -41,6 +84,26 @@ class AbstractStrategy(ABC):
         return self.history.iloc[-1]["Wert Tagesgeld + ETF"]
 
 
+class PrecomputedStrategy(AbstractStrategy):
+    def __init__(self, history_values: np.ndarray, columns: Sequence[str]):
+        """
+        A single, already simulated path, e.g. from :class:`backend.batch.SavingPlanBatchSimulation`
+        or from stored simulation results. The history is only assembled when it is read.
+
+        :param history_values: The history with accumulated columns, shape (months + 1, columns).
+        :param columns: Names of the history columns.
+        """
+        self.history_values = history_values
+        self.columns = [str(column) for column in columns]
+
+    def simulate(self):
+        pass
+
+    def _build_history(self) -> "pd.DataFrame":
+        import pandas as pd
+        return pd.DataFrame(self.history_values, columns=self.columns, dtype="float64")
+
+
 class StrategyFactory:
     def __init__(self, sidebar_results: SidebarResults):
         self.sidebar_results = sidebar_results
@@ -52,12 +115,203 @@ class StrategyFactory:
         elif self.sidebar_results.simulation_model == SimulationModel.SIMPLE_NORMAL_DISTRIBUTION:
             return SimpleNormalDistributionSimulationModel(
                 average_yearly_interest_rate=self.sidebar_results.simple_normal_distribution_simulation_parameters.average_yearly_interest_rate,
-                sigma=self.sidebar_results.simple_normal_distribution_simulation_parameters.sigma)
+                sigma=self.sidebar_results.simple_normal_distribution_simulation_parameters.sigma,
+                sampling=self.sidebar_results.simple_normal_distribution_simulation_parameters.sampling)
+        elif self.sidebar_results.simulation_model == SimulationModel.HISTORICAL_BOOTSTRAP:
+            historical_bootstrap_simulation_parameters = self.sidebar_results.historical_bootstrap_simulation_parameters
+            return HistoricalBootstrapSimulationModel(
+                monthly_returns=load_monthly_returns(historical_bootstrap_simulation_parameters.returns_file),
+                mean_block_length=historical_bootstrap_simulation_parameters.mean_block_length)
+        else:
+            raise NotImplementedError(f"Unknown simulation model: {self.sidebar_results.simulation_model}")
+
+    def get_history_columns(self) -> tuple[str, ...]:
+        if self.sidebar_results.strategy == Strategy.SAVINGS_PLAN:
+            return SAVING_PLAN_HISTORY_COLUMNS
+        elif self.sidebar_results.strategy == Strategy.FLO:
+            return FLO_HISTORY_COLUMNS
+        else:
+            raise NotImplementedError(f"Strategy {self.sidebar_results.strategy} not implemented")
+
+    def get_batch_simulation(self) -> SavingPlanBatchSimulation | FloBatchSimulation:
+        sidebar_results = self.sidebar_results
+        if sidebar_results.strategy == Strategy.SAVINGS_PLAN:
+            return SavingPlanBatchSimulation(monthly_savings=sidebar_results.monthly_savings,
+                                             initial_savings=sidebar_results.initial_savings,
+                                             reserves=sidebar_results.reserves,
+                                             monthly_savings_reserves=sidebar_results.monthly_savings_reserves,
+                                             yearly_interest_rate_on_reserves=sidebar_results.yearly_interest_rate_on_reserves,
+                                             yearly_tax_free_allowance=sidebar_results.yearly_tax_free_allowance,
+                                             capital_yields_tax_percentage=sidebar_results.capital_yields_tax_percentage,
+                                             duration_simulation=sidebar_results.duration_simulation,
+                                             costs_buy_absolute=sidebar_results.costs_buy_absolute,
+                                             costs_sell_absolute=sidebar_results.costs_sell_absolute,
+                                             duration_accumulation_phase_in_years=sidebar_results.duration_accumulation_phase_in_years,
+                                             extract_all_at_once=sidebar_results.extract_all_at_once,
+                                             monthly_payoff=sidebar_results.monthly_payoff)
+        elif sidebar_results.strategy == Strategy.FLO:
+            return FloBatchSimulation(monthly_savings=sidebar_results.monthly_savings,
+                                      initial_savings=sidebar_results.initial_savings,
+                                      reserves=sidebar_results.reserves,
+                                      monthly_savings_reserves=sidebar_results.monthly_savings_reserves,
+                                      yearly_interest_rate_on_reserves=sidebar_results.yearly_interest_rate_on_reserves,
+                                      yearly_tax_free_allowance=sidebar_results.yearly_tax_free_allowance,
+                                      capital_yields_tax_percentage=sidebar_results.capital_yields_tax_percentage,
+                                      duration_simulation=sidebar_results.duration_simulation,
+                                      costs_buy_absolute=sidebar_results.costs_buy_absolute,
+                                      costs_sell_absolute=sidebar_results.costs_sell_absolute,
+                                      duration_accumulation_phase_in_years=sidebar_results.duration_accumulation_phase_in_years,
+                                      extract_all_at_once=sidebar_results.extract_all_at_once,
+                                      monthly_payoff=sidebar_results.monthly_payoff,
+                                      flo_target_number_of_stocks=sidebar_results.flo_strategy_parameters.target_number_of_stocks,
+                                      flo_duration_months_for_rolling_average_stock_prize=sidebar_results.flo_strategy_parameters.duration_months_for_rolling_average_stock_prize,
+                                      flo_step_size=sidebar_results.flo_strategy_parameters.step_size,
+                                      flo_prize_step_size=sidebar_results.flo_strategy_parameters.prize_step_size,
+                                      flo_reference_price_indicator=self._get_reference_price_indicator())
+        else:
+            raise NotImplementedError(f"No batch simulation for strategy {sidebar_results.strategy}")
+
+    def _get_stock_simulation_model(self) -> AbstractSimulationModel:
+        flo_strategy_parameters = self.sidebar_results.flo_strategy_parameters
+        if self.sidebar_results.simulation_model == SimulationModel.DETERMINISTIC:
+            return DeterministicSimulationModel(yearly_interest_rate=flo_strategy_parameters.average_yearly_interest_rate)
+        elif self.sidebar_results.simulation_model in (SimulationModel.SIMPLE_NORMAL_DISTRIBUTION,
+                                                       SimulationModel.HISTORICAL_BOOTSTRAP):
+            # The history is the one of the index (ETF), the single stock keeps its own return and volatility
+            return SimpleNormalDistributionSimulationModel(
+                average_yearly_interest_rate=flo_strategy_parameters.average_yearly_interest_rate,
+                sigma=flo_strategy_parameters.sigma)
         else:
             raise NotImplementedError(f"Unknown simulation model: {self.sidebar_results.simulation_model}")
 
-    def get_strategy(self) -> AbstractStrategy:
+    def _get_etf_and_stock_simulation_model(self) -> CorrelatedNormalSimulationModel:
+        simple_normal_distribution_simulation_parameters = self.sidebar_results.simple_normal_distribution_simulation_parameters
+        flo_strategy_parameters = self.sidebar_results.flo_strategy_parameters
+        correlation = flo_strategy_parameters.correlation
+        return CorrelatedNormalSimulationModel(
+            average_yearly_interest_rates=(simple_normal_distribution_simulation_parameters.average_yearly_interest_rate,
+                                           flo_strategy_parameters.average_yearly_interest_rate),
+            sigmas=(simple_normal_distribution_simulation_parameters.sigma, flo_strategy_parameters.sigma),
+            correlation=np.array([[1.0, correlation], [correlation, 1.0]]),
+            sampling=simple_normal_distribution_simulation_parameters.sampling)
+
+    def _get_reference_price_indicator(self) -> AbstractIndicator:
+        flo_strategy_parameters = self.sidebar_results.flo_strategy_parameters
+        window = flo_strategy_parameters.duration_months_for_rolling_average_stock_prize
+        if flo_strategy_parameters.reference_price == ReferencePrice.ROLLING_MEAN:
+            return RollingMean(window=window)
+        elif flo_strategy_parameters.reference_price == ReferencePrice.EXPONENTIAL_MOVING_AVERAGE:
+            return ExponentialMovingAverage(span=window)
+        elif flo_strategy_parameters.reference_price == ReferencePrice.ROLLING_MIN:
+            return RollingMin(window=window)
+        elif flo_strategy_parameters.reference_price == ReferencePrice.ROLLING_MAX:
+            return RollingMax(window=window)
+        else:
+            raise NotImplementedError(f"Unknown reference price: {flo_strategy_parameters.reference_price}")
+
+    @timed("price_generation")
+    def sample_price_paths(self, rngs: Sequence[RandomSource]) -> tuple[np.ndarray, ...]:
+        """
+        Draws the price paths of one simulation per random stream. Row ``i`` only depends on
+        ``rngs[i]``. The paths can be reused for other parameters with the same simulation
+        model (common random numbers), see :meth:`simulate_price_paths`.
+
+        :param rngs: Generator or seed sequence for the price paths of each simulation.
+        :return: One price matrix of shape (len(rngs), months + 1) per simulated asset: the
+            ETF for savings plans, the ETF and the stock for Flo. With the normal distribution,
+            ETF and stock of Flo are drawn together with the configured correlation.
+        :rtype: tuple[np.ndarray, ...]
+        """
+        sidebar_results = self.sidebar_results
+        n_months = sidebar_results.duration_simulation * 12
+        etf_simulation_model = self._get_simulation_model()
+        if sidebar_results.strategy == Strategy.SAVINGS_PLAN:
+            return (etf_simulation_model.sample_paths_per_stream(rngs=rngs, n_months=n_months),)
+        elif (sidebar_results.strategy == Strategy.FLO
+              and sidebar_results.simulation_model == SimulationModel.SIMPLE_NORMAL_DISTRIBUTION):
+            etf_prices, stock_prices = self._get_etf_and_stock_simulation_model().sample_paths_per_stream(
+                rngs=rngs, n_months=n_months, init_prices=(1.0, sidebar_results.flo_strategy_parameters.initial_stock_prize))
+            return etf_prices, stock_prices
+        elif sidebar_results.strategy == Strategy.FLO:
+            stock_simulation_model = self._get_stock_simulation_model()
+            etf_prices = np.empty((len(rngs), n_months + 1), dtype="float64")
+            stock_prices = np.empty((len(rngs), n_months + 1), dtype="float64")
+            for path_idx, rng in enumerate(rngs):
+                # ETF first, then stock from the same generator
+                rng = get_rng(rng)
+                etf_prices[path_idx] = etf_simulation_model.sample_paths(n_paths=1, n_months=n_months, rng=rng)[0]
+                stock_prices[path_idx] = stock_simulation_model.sample_paths(
+                    n_paths=1, n_months=n_months, rng=rng,
+                    init_price=sidebar_results.flo_strategy_parameters.initial_stock_prize)[0]
+            return etf_prices, stock_prices
+        else:
+            raise NotImplementedError(f"Strategy {sidebar_results.strategy} not implemented")
+
+    def _get_engine(self) -> Engine:
+        execution_parameters = self.sidebar_results.execution_parameters
+        return execution_parameters.engine if execution_parameters is not None else Engine.NUMPY
+
+    @timed("simulation")
+    def simulate_price_paths(self, price_paths: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Simulates one strategy per row of the given price paths with the vectorized batch
+        simulation or, if selected in the execution parameters and Numba is installed, with
+        the compiled kernels of :mod:`backend.kernels`.
+
+        :param price_paths: Price matrices as returned by :meth:`sample_price_paths`.
+        :return: The histories with shape (paths, months + 1, columns), columns as in
+            :meth:`get_history_columns`.
+        :rtype: np.ndarray
+        """
+        batch_simulation = self.get_batch_simulation()
+        if self._get_engine() == Engine.NUMBA:
+            # Imported here, so Numba is only loaded if it is used
+            from backend import kernels
+            if kernels.NUMBA_AVAILABLE:
+                if self.sidebar_results.strategy == Strategy.SAVINGS_PLAN:
+                    return kernels.simulate_saving_plan(batch_simulation, *price_paths)
+                return kernels.simulate_flo(batch_simulation, *price_paths)
+        history_columns = batch_simulation.simulate(*price_paths)
+        return np.stack([history_columns[column] for column in self.get_history_columns()], axis=-1)
+
+    def simulate_batch(self, rngs: Sequence[RandomSource]) -> np.ndarray:
+        """
+        Simulates one path per random stream, see :meth:`simulate_price_paths`.
+
+        :param rngs: Generator or seed sequence for the price path of each simulation.
+        :return: The histories with shape (paths, months + 1, columns), columns as in
+            :meth:`get_history_columns`.
+        :rtype: np.ndarray
+        """
+        return self.simulate_price_paths(self.sample_price_paths(rngs))
+
+    def get_batch_strategies(self, rngs: Sequence[RandomSource]) -> list[AbstractStrategy]:
+        """
+        Simulates one path per random stream at once with the vectorized batch simulation.
+
+        :param rngs: Generator or seed sequence for the price path of each simulation.
+        :return: One already simulated strategy per path.
+        :rtype: list[AbstractStrategy]
+        """
+        columns = self.get_history_columns()
+        return [PrecomputedStrategy(history_values=history_values, columns=columns) for history_values in
+                self.simulate_batch(rngs)]
+
+    def get_strategy(self, rng: RandomSource = None,
+                     price_paths: Sequence[Sequence[float]] | None = None) -> AbstractStrategy:
+        """
+        Builds the strategy selected in the sidebar. The price paths are drawn up front in one
+        vectorized call from ``rng``, so a fixed seed reproduces the simulation.
+
+        :param rng: Generator or seed sequence for the price paths.
+        :param price_paths: Already drawn price paths of the simulation, one per asset as in
+            :meth:`sample_price_paths`. If given, ``rng`` is not used.
+        :return: The strategy, not yet simulated.
+        :rtype: AbstractStrategy
+        """
         sidebar_results = self.sidebar_results
+        if price_paths is None:
+            price_paths = [prices[0] for prices in self.sample_price_paths([get_rng(rng)])]
         if sidebar_results.strategy == Strategy.SAVINGS_PLAN:
             strategy = SavingPlanInvestmentStrategy(monthly_savings=sidebar_results.monthly_savings,
                                                     initial_savings=sidebar_results.initial_savings,
@@ -72,18 +326,9 @@ class StrategyFactory:
                                                     costs_sell_absolute=sidebar_results.costs_sell_absolute,
                                                     duration_accumulation_phase_in_years=sidebar_results.duration_accumulation_phase_in_years,
                                                     extract_all_at_once=sidebar_results.extract_all_at_once,
-                                                    monthly_payoff=sidebar_results.monthly_payoff)
+                                                    monthly_payoff=sidebar_results.monthly_payoff,
+                                                    price_path=price_paths[0])
         elif sidebar_results.strategy == Strategy.FLO:
-            if sidebar_results.simulation_model == SimulationModel.DETERMINISTIC:
-                stock_simulation_model = DeterministicSimulationModel(
-                    yearly_interest_rate=sidebar_results.flo_strategy_parameters.average_yearly_interest_rate)
-            elif sidebar_results.simulation_model == SimulationModel.SIMPLE_NORMAL_DISTRIBUTION:
-                stock_simulation_model = SimpleNormalDistributionSimulationModel(
-                    average_yearly_interest_rate=sidebar_results.flo_strategy_parameters.average_yearly_interest_rate,
-                    sigma=sidebar_results.flo_strategy_parameters.sigma)
-            else:
-                raise NotImplementedError(f"Unknown simulation model: {self.sidebar_results.simulation_model}")
-
             strategy = FloInvestmentStrategy(monthly_savings=sidebar_results.monthly_savings,
                                              initial_savings=sidebar_results.initial_savings,
                                              reserves=sidebar_results.reserves,
@@ -93,7 +338,7 @@ class StrategyFactory:
                                              capital_yields_tax_percentage=sidebar_results.capital_yields_tax_percentage,
                                              duration_simulation=sidebar_results.duration_simulation,
                                              simulation_model_etf=self._get_simulation_model(),
-                                             simulation_model_stock_flo=stock_simulation_model,
+                                             simulation_model_stock_flo=self._get_stock_simulation_model(),
                                              costs_buy_absolute=sidebar_results.costs_buy_absolute,
                                              costs_sell_absolute=sidebar_results.costs_sell_absolute,
                                              duration_accumulation_phase_in_years=sidebar_results.duration_accumulation_phase_in_years,
@@ -103,7 +348,10 @@ class StrategyFactory:
                                              flo_target_number_of_stocks=sidebar_results.flo_strategy_parameters.target_number_of_stocks,
                                              flo_duration_months_for_rolling_average_stock_prize=sidebar_results.flo_strategy_parameters.duration_months_for_rolling_average_stock_prize,
                                              flo_step_size=sidebar_results.flo_strategy_parameters.step_size,
-                                             flo_prize_step_size=sidebar_results.flo_strategy_parameters.prize_step_size, )
+                                             flo_prize_step_size=sidebar_results.flo_strategy_parameters.prize_step_size,
+                                             price_path_etf=price_paths[0],
+                                             price_path_stock=price_paths[1],
+                                             flo_reference_price_indicator=self._get_reference_price_indicator())
         else:
             raise NotImplementedError(f"Strategy {sidebar_results.strategy} not implemented")
         return strategy
@@ -124,7 +372,8 @@ class SavingPlanInvestmentStrategy(AbstractStrategy):
                  duration_simulation: int,
                  simulation_model: AbstractSimulationModel,
                  costs_buy_absolute: float,
-                 costs_sell_absolute: float
+                 costs_sell_absolute: float,
+                 price_path: Sequence[float] | None = None
                  ):
         # Store input parameters
         self.monthly_savings = monthly_savings
@@ -147,27 +396,22 @@ class SavingPlanInvestmentStrategy(AbstractStrategy):
                                               yearly_tax_free_allowance=yearly_tax_free_allowance,
                                               capital_yields_tax_percentage=capital_yields_tax_percentage,
                                               init_month=1,
-                                              init_year=2024
+                                              init_year=2024,
+                                              price_path=price_path
                                               )
-        self.history = pd.DataFrame({"Wert Tagesgeld + ETF": [self.reserves] + [0] * (self.duration_simulation * 12),
-                                     "Eingezahlt (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Ausgezahlt (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Steuern (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Kosten (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     }, index=range(
-            self.duration_simulation * 12 + 1), dtype="float64")  # Monthly current_value of the total wealth.
+        self.history_recorder = HistoryRecorder(n_months=self.duration_simulation * 12,
+                                                columns=SAVING_PLAN_HISTORY_COLUMNS,
+                                                cumulative_columns=CUMULATIVE_HISTORY_COLUMNS)
+        # Monthly current_value of the total wealth.
+        self.history_recorder.record(0, [self.reserves, 0, 0, 0, 0])
         # Convention: 1: (savings after 1 month + rate)
         # Order of actions in month m: Measure current_value, (extract all at once), add savings/ subtract payoff, add interest rate
 
     def _add_entry_in_history(self, month: int, value: float, payed: float, payoff: float, tax: float, costs: float):
-        last_row = self.history.iloc[month - 1].to_list()
-        last_value, last_payed, last_payoff, last_tax, last_costs = last_row
-        self.history.iloc[month] = [value,
-                                    payed + last_payed,
-                                    payoff + last_payoff,
-                                    tax + last_tax,
-                                    costs + last_costs]
+        self._history = None
+        self.history_recorder.record(month, (value, payed, payoff, tax, costs))
 
+    @timed("simulation")
     def simulate(self):
         for month_idx in range(1, self.duration_simulation * 12 + 1):
             returned_money = 0.0
@@ -236,7 +480,10 @@ class FloInvestmentStrategy(AbstractStrategy):
                  flo_target_number_of_stocks: int,
                  flo_duration_months_for_rolling_average_stock_prize: int,
                  flo_step_size: int,
-                 flo_prize_step_size: int
+                 flo_prize_step_size: int,
+                 price_path_etf: Sequence[float] | None = None,
+                 price_path_stock: Sequence[float] | None = None,
+                 flo_reference_price_indicator: AbstractIndicator | None = None
                  ):
         # Store input parameters
         self.monthly_savings = monthly_savings
@@ -257,6 +504,10 @@ class FloInvestmentStrategy(AbstractStrategy):
         self.flo_duration_months_for_rolling_average_stock_prize = flo_duration_months_for_rolling_average_stock_prize
         self.flo_step_size = flo_step_size
         self.flo_prize_step_size = flo_prize_step_size
+        # Indicator of the stock price the current price is compared to, by default the rolling mean
+        if flo_reference_price_indicator is None:
+            flo_reference_price_indicator = RollingMean(window=flo_duration_months_for_rolling_average_stock_prize)
+        self.flo_reference_price_indicator = flo_reference_price_indicator
 
         # These are the two targets
         self.reserves: float = reserves
@@ -264,24 +515,21 @@ class FloInvestmentStrategy(AbstractStrategy):
                                         yearly_tax_free_allowance=yearly_tax_free_allowance // 2,
                                         capital_yields_tax_percentage=capital_yields_tax_percentage,
                                         init_month=1,
-                                        init_year=2024
+                                        init_year=2024,
+                                        price_path=price_path_etf
                                         )
         self.stock: Portfolio = Portfolio(updater=simulation_model_stock_flo,
                                           yearly_tax_free_allowance=yearly_tax_free_allowance // 2,
                                           capital_yields_tax_percentage=capital_yields_tax_percentage,
                                           init_share_prize_per_unit=self.flo_initial_stock_prize,
                                           init_month=1,
-                                          init_year=2024)
-        self.history = pd.DataFrame({"Wert Tagesgeld + ETF": [self.reserves] + [0] * (self.duration_simulation * 12),
-                                     "Eingezahlt (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Ausgezahlt (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Steuern (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Kosten (kumulativ)": [0] * (self.duration_simulation * 12 + 1),
-                                     "Wert Tagesgeld": [self.reserves] + [0] * (self.duration_simulation * 12),
-                                     "Wert ETFs": [0] * (self.duration_simulation * 12 + 1),
-                                     "Wert Aktien": [0] * (self.duration_simulation * 12 + 1)
-                                     }, index=range(
-            self.duration_simulation * 12 + 1), dtype="float64")  # Monthly current_value of the total wealth.
+                                          init_year=2024,
+                                          price_path=price_path_stock)
+        self.history_recorder = HistoryRecorder(n_months=self.duration_simulation * 12,
+                                                columns=FLO_HISTORY_COLUMNS,
+                                                cumulative_columns=CUMULATIVE_HISTORY_COLUMNS)
+        # Monthly current_value of the total wealth.
+        self.history_recorder.record(0, [self.reserves, 0, 0, 0, 0, self.reserves, 0, 0])
         # Convention: 1: (savings after 1 month + rate)
         # Order of actions in month m: Measure current_value, (extract all at once), add savings/ subtract payoff, add interest rate
 
@@ -289,20 +537,13 @@ class FloInvestmentStrategy(AbstractStrategy):
                               value_reserves: float,
                               value_etfs: float,
                               value_stocks: float):
-        last_row = self.history.iloc[month - 1].to_list()
-        last_value, last_payed, last_payoff, last_tax, last_costs, last_value_reserves, last_value_etfs, last_value_stock = last_row
-        self.history.iloc[month] = [value,
-                                    payed + last_payed,
-                                    payoff + last_payoff,
-                                    tax + last_tax,
-                                    costs + last_costs,
-                                    value_reserves,
-                                    value_etfs,
-                                    value_stocks]
+        self._history = None
+        self.history_recorder.record(month, (value, payed, payoff, tax, costs, value_reserves, value_etfs, value_stocks))
 
+    @timed("simulation")
     def simulate(self):
-        prize_que = deque(maxlen=self.flo_duration_months_for_rolling_average_stock_prize)
-        prize_que.append(self.flo_initial_stock_prize)
+        self.flo_reference_price_indicator.reset()
+        self.flo_reference_price_indicator.update(self.flo_initial_stock_prize)
         for month_idx in range(1, self.duration_simulation * 12 + 1):
             returned_money = 0.0
             tax = 0.0
@@ -332,8 +573,8 @@ class FloInvestmentStrategy(AbstractStrategy):
                 transaction_costs += self.transaction_costs_buy
                 # Aktie
                 current_stock_price = self.stock.share_prize_per_unit.value
-                n_shares_hold = len(self.stock.shares)
-                average_stock_price: float = sum(prize_que) / len(prize_que)
+                n_shares_hold = len(self.stock.lots)
+                average_stock_price: float = self.flo_reference_price_indicator.value
                 how_many_stocks_to_buy = flo_investment_formula(current_stock_price=current_stock_price,
                                                                 n_shares_hold=n_shares_hold,
                                                                 target_number_of_shares=self.flo_target_number_of_stocks,
@@ -372,7 +613,7 @@ class FloInvestmentStrategy(AbstractStrategy):
                     self.reserves -= returned_money
             self.etf.next_month()
             self.stock.next_month()
-            prize_que.append(self.stock.share_prize_per_unit.value)
+            self.flo_reference_price_indicator.update(self.stock.share_prize_per_unit.value)
             self._add_entry_in_history(month=month_idx,
                                        value=self.reserves + self.etf.current_total_value + self.stock.current_total_value,
                                        payed=payed_money,
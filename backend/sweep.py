@@ -0,0 +1,107 @@
+import dataclasses
+import itertools
+from typing import Any, Mapping, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+from backend.constants import HistoryColumn
+from backend.execution import spawn_seed_sequences
+from backend.strategy import StrategyFactory
+from frontend.data_interface import SidebarResults
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SWEEP_QUANTILES = (5, 50, 95)  # Perzentile der Endwerte in der Ergebnistabelle
+
+# Parameters the price paths depend on. Grid points that agree on these share their paths.
+PRICE_PATH_PARAMETERS = ("strategy",
+                         "simulation_model",
+                         "duration_simulation",
+                         "deterministic_simulation_parameters.yearly_interest_rate",
+                         "simple_normal_distribution_simulation_parameters.average_yearly_interest_rate",
+                         "simple_normal_distribution_simulation_parameters.sigma",
+                         "simple_normal_distribution_simulation_parameters.sampling",
+                         "historical_bootstrap_simulation_parameters.returns_file",
+                         "historical_bootstrap_simulation_parameters.mean_block_length",
+                         "flo_strategy_parameters.initial_stock_prize",
+                         "flo_strategy_parameters.average_yearly_interest_rate",
+                         "flo_strategy_parameters.sigma",
+                         "flo_strategy_parameters.correlation")
+
+
+def get_parameter(sidebar_results: SidebarResults, name: str) -> Any:
+    """
+    Reads a parameter by name. Parameters of nested dataclasses are addressed with a dot,
+    e.g. ``"flo_strategy_parameters.step_size"``. Missing nested parameters give ``None``.
+    """
+    value = sidebar_results
+    for attribute in name.split("."):
+        if value is None:
+            return None
+        value = getattr(value, attribute)
+    return value
+
+
+def replace_parameter(sidebar_results: Any, name: str, value: Any) -> Any:
+    """
+    Returns a copy of ``sidebar_results`` with one parameter replaced, see :func:`get_parameter`.
+    """
+    attribute, _, rest = name.partition(".")
+    if rest:
+        value = replace_parameter(getattr(sidebar_results, attribute), rest, value)
+    return dataclasses.replace(sidebar_results, **{attribute: value})
+
+
+def sweep(base_sidebar_results: SidebarResults,
+          axes: Mapping[str, Sequence[Any]],
+          number_of_simulations: int,
+          seed: int | None = None) -> "pd.DataFrame":
+    """
+    Simulates every combination of the parameter values in ``axes`` with common random
+    numbers: all grid points are evaluated on the same price paths, so differences between
+    them are caused by the parameters and not by different random draws. The price paths are
+    only drawn once per distinct simulation model (see ``PRICE_PATH_PARAMETERS``), e.g. once
+    for a grid over savings, payoff and tax.
+
+    :param base_sidebar_results: Parameters shared by all grid points.
+    :param axes: Parameter name (see :func:`get_parameter`) to the values it takes in the grid.
+    :param number_of_simulations: Number of simulated paths per grid point.
+    :param seed: Root seed of the price paths.
+    :return: One row per grid point with the parameter values of the axes and summary
+        statistics of the final values (mean and percentiles of the remaining value and the
+        paid out money, mean of the paid in money, taxes and costs).
+    :rtype: pd.DataFrame
+    """
+    seed_sequences = spawn_seed_sequences(seed, number_of_simulations)
+    price_paths_by_model = {}
+    rows = []
+    for values in itertools.product(*axes.values()):
+        sidebar_results = base_sidebar_results
+        for name, value in zip(axes.keys(), values):
+            sidebar_results = replace_parameter(sidebar_results, name, value)
+        factory = StrategyFactory(sidebar_results=sidebar_results)
+        model_key = tuple(get_parameter(sidebar_results, name) for name in PRICE_PATH_PARAMETERS)
+        if model_key not in price_paths_by_model:
+            price_paths_by_model[model_key] = factory.sample_price_paths(seed_sequences)
+        histories = factory.simulate_price_paths(price_paths_by_model[model_key])
+        rows.append(dict(zip(axes.keys(), values)) | _summarize(histories, factory.get_history_columns()))
+    import pandas as pd
+    return pd.DataFrame(rows)
+
+
+def _summarize(histories: np.ndarray, columns: Sequence[str]) -> dict[str, float]:
+    columns = list(columns)
+    final_values = histories[:, -1, :]
+    summary = {}
+    for key, column in (("remaining_value", HistoryColumn.TOTAL_VALUE),
+                        ("returned_money", HistoryColumn.RETURNED_CUMULATIVE)):
+        values = final_values[:, columns.index(column)]
+        summary[f"{key}_mean"] = values.mean()
+        for percentile, quantile in zip(SWEEP_QUANTILES, np.percentile(values, SWEEP_QUANTILES)):
+            summary[f"{key}_p{percentile}"] = quantile
+    for key, column in (("payed_money", HistoryColumn.PAYED_CUMULATIVE),
+                        ("tax", HistoryColumn.TAX_CUMULATIVE),
+                        ("costs", HistoryColumn.COSTS_CUMULATIVE)):
+        summary[f"{key}_mean"] = final_values[:, columns.index(column)].mean()
+    return summary
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def convert_yearly_interest_to_monthly(rate: float) -> float:
     monthly_rate = rate / 12
     return monthly_rate
@@ -16,7 +19,7 @@ def flo_investment_formula(current_stock_price: float,
     current_stock_price (float): Current stock price (aktueller Kurs).
     n_shares_hold (int): Current number of shares held (current shares).
     target_number_of_shares (int): Base investment in the number of shares at the average price (Langfristigige basisanlagesumme). Default is 120.
-    average_stock_price (float): Average price (Kursmittel). Default is 35.
+    average_stock_price (float): Average price (Kursmittel), or any other reference price, e.g. the value of an indicator from backend.indicators. Default is 35.
     step_size_shares (int): Step size for additional shares (Stufenschritt). Default is 20.
     price_steps (float): Price step (Kursstufen). Default is 4.
 
@@ -37,3 +40,21 @@ def flo_investment_formula(current_stock_price: float,
     else:
         # If there is no step difference, maintain the base investment adjusted for current shares
         return target_number_of_shares - n_shares_hold
+
+
+def flo_investment_formula_vectorized(current_stock_prices: np.ndarray,
+                                      n_shares_hold: np.ndarray,
+                                      target_number_of_shares: int = 120,
+                                      average_stock_prices: np.ndarray | float = 35,
+                                      step_size_shares: int = 20,
+                                      price_steps: int = 4) -> np.ndarray:
+    """
+    :func:`flo_investment_formula` for arrays, e.g. one entry per simulated path. The reference
+    prices can come from the ``batch`` form of any indicator in :mod:`backend.indicators`.
+    ``np.round`` rounds halves to even like the built-in ``round``, so both give the same result.
+
+    :return: The number of shares to buy (positive) or sell (negative) per entry.
+    :rtype: np.ndarray
+    """
+    n = np.clip(np.round((current_stock_prices - average_stock_prices) / price_steps), -3, 3)
+    return target_number_of_shares - n * step_size_shares - n_shares_hold
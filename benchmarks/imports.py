@@ -0,0 +1,71 @@
+"""
+Measures the cold import time of the backend modules, every import in a fresh interpreter.
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports --budget 0.3 --repeats 5
+
+The backend is imported by every worker process, so it must stay light: only NumPy, no
+pandas, Streamlit, Numba or pyarrow. The run fails (exit code 1) if a module loads one of
+``FORBIDDEN_MODULES`` or needs longer than the budget.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_MODULES = ("numpy",  # Lower bound, for comparison
+                   "backend.portfolio",
+                   "backend.simulation",
+                   "backend.batch",
+                   "backend.strategy",
+                   "backend.execution")
+FORBIDDEN_MODULES = ("pandas", "streamlit", "numba", "pyarrow", "frontend.sidebar")
+DEFAULT_BUDGET_S = 0.5  # Allowed import time per module
+DEFAULT_REPEATS = 3
+
+_MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"import_time_s": time.perf_counter() - start,
+                  "forbidden": [name for name in {forbidden!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str, repeats: int = DEFAULT_REPEATS) -> dict:
+    """
+    :return: The fastest of ``repeats`` cold imports of ``module`` and the forbidden modules it loaded.
+    :rtype: dict
+    """
+    results = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", _MEASURE.format(module=module, forbidden=FORBIDDEN_MODULES)],
+                                cwd=Path(__file__).parent.parent, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output))
+    return {"module": module,
+            "import_time_s": min(result["import_time_s"] for result in results),
+            "forbidden": results[0]["forbidden"]}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_S, help="Allowed import time in seconds")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Imports per module, the fastest counts")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in BACKEND_MODULES:
+        result = measure_import(module, repeats=args.repeats)
+        print(f"{module:25s} {result['import_time_s'] * 1000:8.1f} ms", flush=True)
+        if result["forbidden"]:
+            failures.append(f"{module} imports {', '.join(result['forbidden'])}")
+        if result["import_time_s"] > args.budget:
+            failures.append(f"{module}: {result['import_time_s']:.3f} s > {args.budget:.3f} s")
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Benchmarks the simulation engines on the standard scenarios.
+
+    python -m benchmarks.run                      # Measure and compare with the baseline
+    python -m benchmarks.run --save-baseline      # Measure and store as new baseline
+    python -m benchmarks.run --filter flo-normal-40y --engines reference numpy
+
+Every scenario runs in its own process. The run fails (exit code 1) if a scenario is slower
+or needs more memory than in the baseline by more than the tolerance. The timings depend on
+the machine, so no baseline is shipped: without one, the comparison is refused until it is
+created with ``--save-baseline``.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.scenarios import Scenario, available_engines, run_scenario, standard_scenarios
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.25  # Allowed relative regression against the baseline
+CHECKED_METRICS = ("wall_time_s", "peak_rss_mb", "allocated_peak_mb")
+
+
+def _run_isolated(scenario: Scenario, measure_allocations: bool) -> dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_scenario, scenario, measure_allocations).result()
+
+
+def find_regressions(results: list[dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    """
+    :return: One message per metric of a scenario that got worse than ``(1 + tolerance)``
+        times its baseline value. Scenarios missing in the baseline are skipped.
+    :rtype: list[str]
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["scenario"])
+        if reference is None:
+            continue
+        for metric in CHECKED_METRICS:
+            if metric in result and metric in reference and result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{result['scenario']}: {metric} {result[metric]:.4g} "
+                                   f"> {reference[metric]:.4g} (+{tolerance:.0%})")
+    return regressions
+
+
+def _print_speedups(results: list[dict]):
+    by_name = {result["scenario"]: result for result in results}
+    for result in results:
+        name = result["scenario"]
+        if name.endswith("-reference"):
+            continue
+        reference = by_name.get(name.rsplit("-", 1)[0] + "-reference")
+        if reference is not None:
+            print(f"  {name}: speedup {reference['wall_time_s'] / result['wall_time_s']:.1f}x over the reference loop")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="JSON file with the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative regression, e.g. 0.25 for 25 %%")
+    parser.add_argument("--filter", default="", help="Only run scenarios whose name contains this text")
+    parser.add_argument("--engines", nargs="+", choices=available_engines(), default=None)
+    parser.add_argument("--max-paths", type=int, default=None, help="Skip scenarios with more paths")
+    parser.add_argument("--no-allocations", action="store_true", help="Do not measure allocations (faster)")
+    args = parser.parse_args(argv)
+    if not args.save_baseline and not args.baseline.exists():
+        parser.error(f"no baseline at {args.baseline}, create it first with --save-baseline")
+
+    scenarios = [scenario for scenario in standard_scenarios(engines=args.engines)
+                 if args.filter in scenario.name and (args.max_paths is None or scenario.paths <= args.max_paths)]
+    results = []
+    for scenario in scenarios:
+        result = _run_isolated(scenario, measure_allocations=not args.no_allocations)
+        results.append(result)
+        print(f"{result['scenario']:45s} {result['wall_time_s']:9.4f} s {result['paths_per_s']:12.1f} paths/s "
+              f"{result['peak_rss_mb']:8.1f} MB RSS {result.get('allocated_peak_mb', float('nan')):8.1f} MB allocated",
+              flush=True)
+    _print_speedups(results)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baseline.update({result["scenario"]: result for result in results})
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
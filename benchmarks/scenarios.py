@@ -0,0 +1,158 @@
+import dataclasses
+import resource
+import time
+import tracemalloc
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Callable
+
+import numpy as np
+
+from backend.constants import Strategy, SimulationModel, Engine, DEFAULT_CHUNK_SIZE
+from backend.execution import spawn_seed_sequences
+from backend.strategy import StrategyFactory
+from frontend.data_interface import SidebarResults, DeterministicSimulationParameters, \
+    SimpleNormalDistributionSimulationParameters, FloStrategyParameters, ExecutionParameters
+
+SEED = 42
+HORIZONS_IN_YEARS = (10, 40, 100)
+NUMBERS_OF_PATHS = (1, 100, 1000, 10000)
+MAX_PATHS_REFERENCE = 1000  # The reference loop needs several minutes for 10,000 paths
+MIN_MEASURE_SECONDS = 0.5  # Short scenarios are repeated until this much time is measured
+MAX_REPEATS = 5
+
+_STRATEGY_KEYS = {Strategy.SAVINGS_PLAN: "savings_plan", Strategy.FLO: "flo"}
+_SIMULATION_MODEL_KEYS = {SimulationModel.DETERMINISTIC: "deterministic",
+                          SimulationModel.SIMPLE_NORMAL_DISTRIBUTION: "normal"}
+
+
+def _simulate_reference(sidebar_results: SidebarResults, seed_sequences: list[np.random.SeedSequence]) -> np.ndarray:
+    # The scalar strategies with Portfolio objects, one path after the other
+    factory = StrategyFactory(sidebar_results=sidebar_results)
+    final_values = np.empty(len(seed_sequences))
+    for path_idx, seed_sequence in enumerate(seed_sequences):
+        strategy = factory.get_strategy(rng=seed_sequence)
+        strategy.simulate()
+        final_values[path_idx] = strategy.history_recorder.to_numpy()[-1, 0]
+    return final_values
+
+
+def _batch_engine(engine: Engine) -> Callable[[SidebarResults, list[np.random.SeedSequence]], np.ndarray]:
+    def simulate(sidebar_results: SidebarResults, seed_sequences: list[np.random.SeedSequence]) -> np.ndarray:
+        sidebar_results = dataclasses.replace(sidebar_results, execution_parameters=ExecutionParameters(
+            seed=SEED, number_of_workers=1, chunk_size=DEFAULT_CHUNK_SIZE, engine=engine))
+        factory = StrategyFactory(sidebar_results=sidebar_results)
+        final_values = np.empty(len(seed_sequences))
+        # Chunk-wise like the app, so memory does not grow with the number of paths
+        for start in range(0, len(seed_sequences), DEFAULT_CHUNK_SIZE):
+            histories = factory.simulate_batch(rngs=seed_sequences[start:start + DEFAULT_CHUNK_SIZE])
+            final_values[start:start + len(histories)] = histories[:, -1, 0]
+        return final_values
+
+    return simulate
+
+
+# Engines compared by the benchmark. "reference" is the baseline the other engines are measured against.
+ENGINES: dict[str, Callable[[SidebarResults, list[np.random.SeedSequence]], np.ndarray]] = {
+    "reference": _simulate_reference,
+    "numpy": _batch_engine(Engine.NUMPY),
+    "numba": _batch_engine(Engine.NUMBA),
+}
+
+
+def available_engines() -> list[str]:
+    return [engine for engine in ENGINES if engine != "numba" or find_spec("numba") is not None]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    strategy: Strategy
+    simulation_model: SimulationModel
+    years: int
+    paths: int
+    engine: str
+
+    @property
+    def name(self) -> str:
+        return (f"{_STRATEGY_KEYS[self.strategy]}-{_SIMULATION_MODEL_KEYS[self.simulation_model]}-"
+                f"{self.years}y-{self.paths}p-{self.engine}")
+
+    def sidebar_results(self) -> SidebarResults:
+        """
+        The default parameters of the sidebar. Half of the horizon is accumulation phase, so
+        both buys and sells are measured.
+        """
+        return SidebarResults(
+            strategy=self.strategy,
+            monthly_savings=100,
+            initial_savings=0,
+            reserves=0,
+            monthly_savings_reserves=100,
+            yearly_interest_rate_on_reserves=2.0,
+            costs_buy_absolute=1.0,
+            costs_sell_absolute=1.0,
+            duration_accumulation_phase_in_years=self.years // 2,
+            include_inflation=False,
+            simulation_model=self.simulation_model,
+            extract_all_at_once=False,
+            monthly_payoff=100,
+            duration_simulation=self.years,
+            deterministic_simulation_parameters=DeterministicSimulationParameters(yearly_interest_rate=5.0),
+            simple_normal_distribution_simulation_parameters=SimpleNormalDistributionSimulationParameters(
+                average_yearly_interest_rate=5.0, sigma=2.0, number_of_simulations=self.paths),
+            flo_strategy_parameters=FloStrategyParameters(initial_stock_prize=100.0,
+                                                          target_number_of_stocks=120,
+                                                          duration_months_for_rolling_average_stock_prize=4,
+                                                          step_size=20,
+                                                          prize_step_size=4,
+                                                          average_yearly_interest_rate=5.0,
+                                                          sigma=2.0))
+
+
+def standard_scenarios(engines: list[str] | None = None) -> list[Scenario]:
+    """
+    Both strategies and simulation models, every horizon and number of paths, for every
+    engine. The reference loop is only run up to ``MAX_PATHS_REFERENCE`` paths.
+    """
+    engines = available_engines() if engines is None else engines
+    return [Scenario(strategy=strategy, simulation_model=simulation_model, years=years, paths=paths, engine=engine)
+            for strategy in Strategy
+            for simulation_model in _SIMULATION_MODEL_KEYS
+            for years in HORIZONS_IN_YEARS
+            for paths in NUMBERS_OF_PATHS
+            for engine in engines
+            if engine != "reference" or paths <= MAX_PATHS_REFERENCE]
+
+
+def run_scenario(scenario: Scenario, measure_allocations: bool = True) -> dict:
+    """
+    Measures one scenario. Meant to run in a fresh process, so the peak RSS belongs to this
+    scenario only.
+
+    :return: Wall time (best of the repeats), paths per second, peak RSS and, if measured,
+        the peak of the memory traced by ``tracemalloc`` during one extra run.
+    :rtype: dict
+    """
+    simulate = ENGINES[scenario.engine]
+    sidebar_results = scenario.sidebar_results()
+    seed_sequences = spawn_seed_sequences(SEED, scenario.paths)
+    simulate(sidebar_results, seed_sequences[:1])  # Warm-up, e.g. compilation of the Numba kernels
+    wall_times = []
+    while len(wall_times) < MAX_REPEATS and sum(wall_times) < MIN_MEASURE_SECONDS:
+        start = time.perf_counter()
+        final_values = simulate(sidebar_results, seed_sequences)
+        wall_times.append(time.perf_counter() - start)
+    wall_time = min(wall_times)
+    result = {"scenario": scenario.name,
+              "wall_time_s": wall_time,
+              "paths_per_s": scenario.paths / wall_time,
+              "repeats": len(wall_times),
+              "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+              "mean_final_value": float(final_values.mean())}
+    if measure_allocations:
+        tracemalloc.start()
+        simulate(sidebar_results, seed_sequences)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["allocated_peak_mb"] = peak / 1024 ** 2
+    return result
@@ -1,58 +1,310 @@
-from math import floor
+import functools
+import os
+import time
+from pathlib import Path
 
 import numpy as np
-import pandas as pd
 import streamlit as st
 
-from backend.strategy import AbstractStrategy, StrategyFactory
-from frontend.data_interface import SidebarResults
+from backend.constants import DEFAULT_CHUNK_SIZE, ENGINE_VERSION, ExportFormat, SimulationModel, StopReason
+from backend.aggregation import StreamingAggregator
+from backend.cache import DiskResultCache, make_cache_key, canonical_cache_key, canonical_parameters, \
+    cache_statistics
+from backend.instrumentation import instrumentation
+from backend.convergence import ConvergenceCriterion
+from backend.execution import simulate_histories, simulate_streaming, simulate_single, simulate_adaptive
+from backend.export import FILE_SUFFIXES, export_simulations
+from backend.results import SimulationResults
+from backend.strategy import AbstractStrategy, StrategyFactory, PrecomputedStrategy
+from frontend.data_interface import SidebarResults, ExecutionParameters
 
 CACHE_TTL_SECONDS = 60 * 60
+DISK_CACHE_DIRECTORY = Path(os.environ.get("FLOSINVESTMENT_CACHE_DIR",
+                                           Path.home() / ".cache" / "flosinvestment" / "results"))
+DISK_CACHE_MAX_BYTES = int(os.environ.get("FLOSINVESTMENT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
 
+EXPORT_DIRECTORY = Path(os.environ.get("FLOSINVESTMENT_EXPORT_DIR",
+                                       Path.home() / "flosinvestment-exports"))
 
-@st.cache_data(show_spinner=False, ttl=CACHE_TTL_SECONDS)
-def get_simulated_strategies(sidebar_results: SidebarResults) -> list[AbstractStrategy]:
+disk_cache = DiskResultCache(directory=DISK_CACHE_DIRECTORY, max_size_bytes=DISK_CACHE_MAX_BYTES)
+
+
+def cached(function=None, *, resource: bool = False):
+    """
+    ``st.cache_data`` keyed by :func:`backend.cache.canonical_cache_key` of the
+    :class:`SidebarResults` argument instead of all its fields, so changing a parameter the
+    run does not read (e.g. the number of workers) still hits the cache. A
+    :class:`SimulationResults` argument is keyed by its
+    :attr:`~backend.results.SimulationResults.fingerprint`. Lookups and misses
+    are counted in :data:`backend.cache.cache_statistics` under the name of the function.
+    With ``resource=True``, ``st.cache_resource`` is used instead: the result is shared by
+    reference, not pickled and copied on every hit. It must not be modified by the callers.
+    """
+    if function is None:
+        return functools.partial(cached, resource=resource)
+    name = function.__name__
+
+    @functools.wraps(function)
+    def compute(*args, **kwargs):
+        cache_statistics.miss(name)
+        return function(*args, **kwargs)
+
+    cache = st.cache_resource if resource else st.cache_data
+    cached_compute = cache(show_spinner=False, ttl=CACHE_TTL_SECONDS,
+                           hash_funcs={SidebarResults: canonical_cache_key,
+                                       SimulationResults: lambda results: results.fingerprint})(compute)
+
+    @functools.wraps(function)
+    def lookup(*args, **kwargs):
+        cache_statistics.lookup(name)
+        return cached_compute(*args, **kwargs)
+
+    lookup.clear = cached_compute.clear
+    return lookup
+
+
+def get_simulated_strategies(sidebar_results: SidebarResults) -> SimulationResults:
+    """
+    Simulates all paths of the Monte Carlo run based on user-defined parameters, see
+    :func:`backend.execution.simulate_histories`. Only the histories are kept, together with
+    a score index to select median and percentiles. Strategies are rebuilt for the displayed
+    path only.
+    The results are cached for performance reasons, for a fixed seed also on disk.
+
+    :param sidebar_results: User-defined parameters for the simulation process.
+    :type sidebar_results: SidebarResults
+    :return: The histories of all simulations and their score index.
+    :rtype: SimulationResults
+    """
+    if _get_disk_cache_key(sidebar_results) is None:
+        return _get_simulated_strategies_in_memory(sidebar_results)
+    return _get_simulated_strategies_on_disk(sidebar_results)
+
+
+@cached
+def _get_simulated_strategies_in_memory(sidebar_results: SidebarResults) -> SimulationResults:
+    """
+    Results of a run without a fixed seed, kept in memory only.
+    """
+    return _simulate_strategies(sidebar_results)
+
+
+@cached(resource=True)
+def _get_simulated_strategies_on_disk(sidebar_results: SidebarResults) -> SimulationResults:
+    """
+    Results of a run with a fixed seed from the disk cache, simulated and stored first if they
+    are missing. The disk cache survives restarts and is shared between server processes, its
+    key is the canonical key of the parameters, see :func:`_get_disk_cache_key`. Loaded
+    results are memory-mapped and kept with ``st.cache_resource``: ``st.cache_data`` would
+    pickle the mapped arrays and copy them into memory on every hit. Runs stopped by the time
+    budget are not reproducible and are not stored.
+    """
+    cache_key = _get_disk_cache_key(sidebar_results)
+    with instrumentation.timer("disk_cache"):
+        cached_results = disk_cache.get(cache_key)
+    if cached_results is not None:
+        instrumentation.count("disk_cache_hits")
+        return cached_results
+    simulation_results = _simulate_strategies(sidebar_results)
+    convergence = simulation_results.convergence
+    if convergence is None or convergence.stop_reason != StopReason.TIME_BUDGET:
+        with instrumentation.timer("disk_cache"):
+            disk_cache.put(cache_key, simulation_results)
+    return simulation_results
+
+
+def _simulate_strategies(sidebar_results: SidebarResults) -> SimulationResults:
+    """
+    Runs the simulation with a progress bar. With adaptive parameters, the run stops once the
+    statistics of the score have converged, see :func:`backend.execution.simulate_adaptive`,
+    and the results report how many paths were used. If the instrumentation is enabled, the
+    simulation and the assembly of the results are timed as separate phases.
+    """
+    number_of_simulations = get_number_of_simulations(sidebar_results)
+    execution_parameters = _get_execution_parameters(sidebar_results)
+    progressbar = st.progress(0)
+    convergence = None
+    with instrumentation.timer("simulation_total"):
+        if sidebar_results.adaptive_parameters is None:
+            histories = simulate_histories(sidebar_results=sidebar_results,
+                                           number_of_simulations=number_of_simulations,
+                                           seed=execution_parameters.seed,
+                                           number_of_workers=execution_parameters.number_of_workers,
+                                           chunk_size=execution_parameters.chunk_size,
+                                           progress_callback=_progress_updater(progressbar))
+        else:
+            histories, convergence = simulate_adaptive(sidebar_results=sidebar_results,
+                                                       max_number_of_simulations=number_of_simulations,
+                                                       criterion=get_convergence_criterion(sidebar_results),
+                                                       seed=execution_parameters.seed,
+                                                       number_of_workers=execution_parameters.number_of_workers,
+                                                       chunk_size=execution_parameters.chunk_size,
+                                                       progress_callback=_progress_updater(progressbar))
+    progressbar.empty()
+    with instrumentation.timer("results_assembly"):
+        simulation_results = SimulationResults.from_histories(
+            histories=histories, columns=StrategyFactory(sidebar_results=sidebar_results).get_history_columns(),
+            convergence=convergence)
+    return simulation_results
+
+
+@cached
+def get_deterministic_strategy(sidebar_results: SidebarResults) -> AbstractStrategy:
+    """
+    Simulates the single path of the deterministic model. Only the history is kept and cached.
+    """
+    strategy = StrategyFactory(sidebar_results=sidebar_results).get_strategy()
+    strategy.simulate()
+    return PrecomputedStrategy(history_values=strategy.history_recorder.to_numpy(),
+                               columns=strategy.history_recorder.columns)
+
+
+@cached
+def get_aggregated_simulations(sidebar_results: SidebarResults) -> StreamingAggregator:
     """
-    Fetches a list of simulated strategies based on user-defined parameters. Simulates
-    each strategy using parameters provided through the `sidebar_results` object. The
-    simulation process includes updating a progress bar to indicate progress. The
-    returned list contains the simulated strategies.
+    Simulates like :func:`get_simulated_strategies`, but only keeps the statistics of the
+    simulations (mean, variance, quantiles and the final values of every path). The memory
+    does not depend on the number of simulations.
     The results are cached for performance reasons.
 
     :param sidebar_results: User-defined parameters for the simulation process.
     :type sidebar_results: SidebarResults
-    :return: current_stock_price list of simulated strategies derived from the given parameters.
-    :rtype: list[AbstractStrategy]
+    :return: The aggregated simulations.
+    :rtype: StreamingAggregator
     """
-    strategies = [StrategyFactory(sidebar_results=sidebar_results).get_strategy() for _ in
-                  range(sidebar_results.simple_normal_distribution_simulation_parameters.number_of_simulations)]
+    execution_parameters = _get_execution_parameters(sidebar_results)
     progressbar = st.progress(0)
-    for i, strategy in enumerate(strategies):
-        strategy.simulate()
-        progressbar.progress((i + 1) / len(strategies), text=f"Simuliere. Simulation Nummer {i + 1}")
+    aggregator = simulate_streaming(
+        sidebar_results=sidebar_results,
+        number_of_simulations=get_number_of_simulations(sidebar_results),
+        seed=execution_parameters.seed,
+        number_of_workers=execution_parameters.number_of_workers,
+        chunk_size=execution_parameters.chunk_size,
+        progress_callback=_progress_updater(progressbar))
     progressbar.empty()
-    return strategies
+    return aggregator
+
+
+@cached
+def get_single_simulated_strategy(sidebar_results: SidebarResults, index: int) -> AbstractStrategy:
+    """
+    Recomputes simulation number ``index`` of the run described by ``sidebar_results``.
+    """
+    execution_parameters = _get_execution_parameters(sidebar_results)
+    return simulate_single(
+        sidebar_results=sidebar_results,
+        number_of_simulations=get_number_of_simulations(sidebar_results),
+        seed=execution_parameters.seed,
+        index=index)
+
+
+def export_all_simulations(sidebar_results: SidebarResults,
+                           file_format: ExportFormat,
+                           number_of_simulations: int | None = None) -> tuple[Path, int]:
+    """
+    Simulates the run again and writes all paths chunk by chunk to a new file in
+    ``EXPORT_DIRECTORY``, see :func:`backend.export.export_simulations`. Not cached, every
+    call writes a new file.
+    ``number_of_simulations`` defaults to the one of ``sidebar_results``. For an adaptive
+    run, pass the number of paths it used: they are the first paths of the full run.
+
+    :return: The written file and the root seed of the run.
+    :rtype: tuple[Path, int]
+    """
+    execution_parameters = _get_execution_parameters(sidebar_results)
+    EXPORT_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    path = EXPORT_DIRECTORY / f"simulationen-{time.strftime('%Y%m%d-%H%M%S')}{FILE_SUFFIXES[file_format]}"
+    progressbar = st.progress(0)
+    seed = export_simulations(
+        sidebar_results=sidebar_results,
+        path=path,
+        number_of_simulations=number_of_simulations or get_number_of_simulations(sidebar_results),
+        seed=execution_parameters.seed,
+        number_of_workers=execution_parameters.number_of_workers,
+        chunk_size=execution_parameters.chunk_size,
+        file_format=file_format,
+        progress_callback=_progress_updater(progressbar))
+    progressbar.empty()
+    return path, seed
+
+
+def get_number_of_simulations(sidebar_results: SidebarResults) -> int:
+    if sidebar_results.simulation_model == SimulationModel.HISTORICAL_BOOTSTRAP:
+        return sidebar_results.historical_bootstrap_simulation_parameters.number_of_simulations
+    return sidebar_results.simple_normal_distribution_simulation_parameters.number_of_simulations
+
+
+def get_convergence_criterion(sidebar_results: SidebarResults) -> ConvergenceCriterion:
+    adaptive_parameters = sidebar_results.adaptive_parameters
+    return ConvergenceCriterion(relative_precision=adaptive_parameters.relative_precision,
+                                percentile=adaptive_parameters.percentile,
+                                weight_return_value=adaptive_parameters.weight_return_value,
+                                time_budget_seconds=adaptive_parameters.time_budget_seconds)
+
+
+def _get_execution_parameters(sidebar_results: SidebarResults) -> ExecutionParameters:
+    return sidebar_results.execution_parameters or ExecutionParameters(seed=None,
+                                                                       number_of_workers=1,
+                                                                       chunk_size=DEFAULT_CHUNK_SIZE)
+
+
+def _get_disk_cache_key(sidebar_results: SidebarResults) -> str | None:
+    """
+    Key of the simulation results on disk: the canonical parameters of the run, see
+    :func:`backend.cache.canonical_parameters`, and the engine version. Without a fixed seed
+    the results are not reproducible and are not stored.
+    """
+    if _get_execution_parameters(sidebar_results).seed is None:
+        return None
+    return make_cache_key({"parameters": canonical_parameters(sidebar_results),
+                           "engine_version": ENGINE_VERSION})
+
+
+def _progress_updater(progressbar):
+    def update_progress(done: int, total: int):
+        progressbar.progress(done / total, text=f"Simuliere. {done} von {total} Simulationen fertig")
+
+    return update_progress
 
 
 def get_percentile_strategy(percentile: int,
-                            weight_return_value: int,
-                            strategies: list[AbstractStrategy]) -> AbstractStrategy:
-    index_percentile = floor(percentile / 100 * len(strategies))
+                            weight_return_value: float,
+                            simulation_results: SimulationResults) -> AbstractStrategy:
+    index_percentile = simulation_results.score_index.percentile_index(percentile, weight_return_value)
+    return simulation_results.get_strategy(index_percentile)
 
-    sorted_strategies = list(sorted(strategies, key=lambda
-        strategy: strategy.returned_money_total * weight_return_value + strategy.remaining_value * (
-            1 - weight_return_value)))
-    return sorted_strategies[index_percentile]
 
+@cached
+def get_average_strategy(sidebar_results: SidebarResults, simulation_results: SimulationResults) -> AbstractStrategy:
+    """
+    The mean of all histories, computed once per run. The results are identified by their
+    fingerprint, not only by the ``sidebar_results``: runs with equal parameters can differ,
+    e.g. adaptive runs stopped by the time budget or runs without a fixed seed.
+    """
+    return PrecomputedStrategy(history_values=simulation_results.mean_history, columns=simulation_results.columns)
 
-def get_average_strategy(sidebar_results: SidebarResults, strategies: list[AbstractStrategy]) -> AbstractStrategy:
-    histories = [strategy.history for strategy in strategies]
-    history = pd.DataFrame(columns=histories[0].columns,
-                           data=np.mean([h.to_numpy() for h in histories], axis=0))
-    strategy = StrategyFactory(sidebar_results=sidebar_results).get_strategy()
-    strategy.history = history
-    return strategy
+
+@cached
+def get_quantile_bands(sidebar_results: SidebarResults,
+                       simulation_results: SimulationResults,
+                       column: str,
+                       quantiles: tuple[float, ...]) -> np.ndarray:
+    """
+    Per month quantiles of one column, computed once per run, see :func:`get_average_strategy`.
+    """
+    return simulation_results.quantile_bands(column, quantiles)
+
+
+def get_median_strategy(simulation_results: SimulationResults, weight_return_value: float) -> AbstractStrategy:
+    return get_percentile_strategy(50, weight_return_value, simulation_results)
+
+
+def get_percentile_index(percentile: int, weight_return_value: float, aggregator: StreamingAggregator) -> int:
+    """
+    Index of the simulation at the given percentile, ranked like in :func:`get_percentile_strategy`.
+    """
+    return aggregator.score_index.percentile_index(percentile, weight_return_value)
 
 
-def get_median_strategy(strategies: list[AbstractStrategy], weight_return_value: int) -> AbstractStrategy:
-    return get_percentile_strategy(50, weight_return_value, strategies)
+def get_mean_strategy(aggregator: StreamingAggregator) -> AbstractStrategy:
+    return PrecomputedStrategy(history_values=aggregator.mean, columns=aggregator.columns)
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from backend.constants import Strategy, SimulationModel
+from backend.constants import Strategy, SimulationModel, ReferencePrice, Engine, SamplingScheme
 
 
 @dataclass
@@ -13,6 +13,31 @@ class SimpleNormalDistributionSimulationParameters:
     average_yearly_interest_rate: float  # Durchschnittlicher jährlicher Zinssatz
     sigma: float  # Volatilität
     number_of_simulations: int
+    sampling: SamplingScheme = SamplingScheme.PSEUDO_RANDOM  # Varianzreduktion beim Ziehen der Zufallszahlen
+
+
+@dataclass
+class HistoricalBootstrapSimulationParameters:
+    returns_file: str  # CSV mit historischen Monatsrenditen in Prozent
+    mean_block_length: float  # Mittlere Länge der zusammenhängend gezogenen Blöcke in Monaten
+    number_of_simulations: int
+
+
+@dataclass
+class ExecutionParameters:
+    seed: int  # Startwert des Zufallsgenerators
+    number_of_workers: int  # Anzahl paralleler Prozesse
+    chunk_size: int  # Anzahl Simulationen pro Arbeitspaket
+    streaming: bool = False  # Nur Statistiken statt aller Simulationen speichern
+    engine: Engine = Engine.NUMPY  # Rechenkern der Simulation
+
+
+@dataclass
+class AdaptiveParameters:
+    relative_precision: float  # Zielgenauigkeit: halbe Breite der Konfidenzintervalle relativ zum Schätzwert
+    time_budget_seconds: float | None  # Abbruch nach dieser Laufzeit, None für unbegrenzt
+    percentile: float  # Zusätzlich überwachtes Perzentil des Scores
+    weight_return_value: float  # Gewichtung des ausgezahlten Betrags im Score
 
 
 @dataclass
@@ -24,6 +49,8 @@ class FloStrategyParameters:
     prize_step_size: int  # Diskretisierung von Kursschwankungen
     average_yearly_interest_rate: float  # Durchschnittlicher jährlicher Zinssatz
     sigma: float  # Vola
+    reference_price: ReferencePrice = ReferencePrice.ROLLING_MEAN  # Mit welchem Indikator der Referenzpreis gebildet wird
+    correlation: float = 0.0  # Korrelation der Monatsrenditen von ETF und Aktie (nur Normalverteilung)
 
 
 @dataclass
@@ -47,4 +74,7 @@ class SidebarResults:
     duration_simulation: int = 40  # Maximale Dauer der Simulation in Jahren
     deterministic_simulation_parameters: DeterministicSimulationParameters | None = None  # Simulationsspezifische Parameter
     simple_normal_distribution_simulation_parameters: SimpleNormalDistributionSimulationParameters | None = None  # Simulationsspezifische Parameter
+    historical_bootstrap_simulation_parameters: HistoricalBootstrapSimulationParameters | None = None  # Simulationsspezifische Parameter
     flo_strategy_parameters: FloStrategyParameters | None = None
+    execution_parameters: ExecutionParameters | None = None  # Ausführung der Monte-Carlo-Simulation
+    adaptive_parameters: AdaptiveParameters | None = None  # Adaptiver Abbruch, die Anzahl der Simulationen ist dann die Obergrenze
@@ -1,8 +1,59 @@
+import os
+from importlib.util import find_spec
+
 import streamlit as st
 
-from backend.constants import Strategy, SimulationModel
+from backend.constants import Strategy, SimulationModel, ReferencePrice, Engine, SamplingScheme, DEFAULT_CHUNK_SIZE
 from frontend.data_interface import SidebarResults, DeterministicSimulationParameters, \
-    SimpleNormalDistributionSimulationParameters, FloStrategyParameters
+    SimpleNormalDistributionSimulationParameters, HistoricalBootstrapSimulationParameters, FloStrategyParameters, \
+    ExecutionParameters, AdaptiveParameters
+
+
+def adaptive_input() -> AdaptiveParameters | None:
+    adaptive = st.toggle("Adaptiv abbrechen", value=False,
+                         help="Simuliert in Arbeitspaketen und hört auf, sobald Mittelwert, Median und das gewählte "
+                              "Perzentil des Scores genau genug bestimmt sind. Die Anzahl der Simulationen ist dann "
+                              "die Obergrenze.")
+    if not adaptive:
+        return None
+    relative_precision = st.number_input("Zielgenauigkeit (± %)", min_value=0.1, max_value=50.0, value=1.0, step=0.5,
+                                         help="Halbe Breite der 95 %-Konfidenzintervalle relativ zum Schätzwert")
+    time_budget_seconds = st.number_input("Zeitbudget (Sekunden)", min_value=0, value=60, step=10,
+                                          help="0 für unbegrenzt. Mit Zeitbudget ist das Ergebnis nicht reproduzierbar.")
+    percentile = st.number_input("Überwachtes Perzentil (%)", min_value=1, max_value=99, value=5, step=1)
+    weight_return_value = st.slider("Gewichtung Ausgezahlter Betrag im Score", min_value=0.0, max_value=1.0, step=0.1,
+                                    value=0.9)
+    return AdaptiveParameters(relative_precision=relative_precision / 100,
+                              time_budget_seconds=time_budget_seconds or None,
+                              percentile=percentile,
+                              weight_return_value=weight_return_value)
+
+
+def monte_carlo_input() -> tuple[int, ExecutionParameters, AdaptiveParameters | None]:
+    """
+    Inputs shared by all random simulation models.
+
+    :return: The number of simulations, how they are executed and, if enabled, when the
+        simulation stops early.
+    """
+    number_of_simulations = st.number_input("Anzahl der Simulationen", min_value=1, step=100, value=100,
+                                            max_value=10000)
+    adaptive_parameters = adaptive_input()
+    seed = st.number_input("Startwert Zufallsgenerator", min_value=0, step=1, value=42)
+    number_of_workers = st.number_input("Anzahl Prozesse", min_value=1, step=1, value=os.cpu_count() or 1)
+    chunk_size = st.number_input("Simulationen pro Arbeitspaket", min_value=1, step=50,
+                                 value=DEFAULT_CHUNK_SIZE)
+    streaming = st.toggle("Nur Statistiken speichern", value=False, disabled=adaptive_parameters is not None,
+                          help="Spart Speicher: Es werden nur Mittelwerte, Quantile und die Endwerte "
+                               "jeder Simulation behalten. Einzelne Simulationen werden bei Bedarf neu berechnet.")
+    numba_available = find_spec("numba") is not None
+    engine = st.selectbox("Rechenkern", options=Engine, disabled=not numba_available,
+                          help=None if numba_available else "Numba ist nicht installiert.")
+    return number_of_simulations, ExecutionParameters(seed=seed,
+                                                      number_of_workers=number_of_workers,
+                                                      chunk_size=chunk_size,
+                                                      streaming=streaming and adaptive_parameters is None,
+                                                      engine=engine), adaptive_parameters
 
 
 def sidebar() -> SidebarResults:
@@ -23,8 +74,9 @@ def sidebar() -> SidebarResults:
             initial_stock_prize = st.number_input("Initialer Aktienpreis", min_value=0.0001, step=1.0,
                                                   value=100.0)
             target_number_of_stocks = st.number_input("Zielmenge Aktien", min_value=1, value=120, step=10)
+            reference_price = st.selectbox("Referenzpreis", options=ReferencePrice)
             duration_months_for_rolling_average_stock_prize = st.number_input(
-                "Anzahl Monate zur Ermittlung des durchschnittlichen Aktienpreises", min_value=1, step=1, max_value=24,
+                "Anzahl Monate zur Ermittlung des Referenzpreises", min_value=1, step=1, max_value=1200,
                 value=4)
             step_size = st.number_input("'Stufenschritt'", min_value=1, value=20, step=5)
             prize_step_size = st.number_input("'Kursstufen'", min_value=1, value=4, step=1)
@@ -33,13 +85,18 @@ def sidebar() -> SidebarResults:
                                                            max_value=100.0,
                                                            value=5.0, step=1.0)
             sigma = st.number_input("Volatilität", min_value=0.0, value=2.0, step=1.0)
+            correlation = st.number_input("Korrelation ETF/Aktie", min_value=-0.99, max_value=0.99, value=0.0,
+                                          step=0.1, help="Korrelation der monatlichen Renditen von ETF und Aktie. "
+                                                         "Wird nur bei der Normalverteilung berücksichtigt.")
             flo_strategy_parameters = FloStrategyParameters(initial_stock_prize=initial_stock_prize,
                                                             target_number_of_stocks=target_number_of_stocks,
                                                             duration_months_for_rolling_average_stock_prize=duration_months_for_rolling_average_stock_prize,
                                                             prize_step_size=prize_step_size,
                                                             step_size=step_size,
                                                             average_yearly_interest_rate=average_yearly_interest_rate,
-                                                            sigma=sigma)
+                                                            sigma=sigma,
+                                                            reference_price=reference_price,
+                                                            correlation=correlation)
     else:
         flo_strategy_parameters = None
     with st.sidebar.expander("Inflation und Steuern"):
@@ -68,6 +125,9 @@ def sidebar() -> SidebarResults:
             deterministic_simulation_parameters = DeterministicSimulationParameters(
                 yearly_interest_rate=yearly_interest_rate)
             simple_normal_distribution_simulation_parameters = None
+            historical_bootstrap_simulation_parameters = None
+            execution_parameters = None
+            adaptive_parameters = None
         elif simulation_model == SimulationModel.SIMPLE_NORMAL_DISTRIBUTION:
             average_yearly_interest_rate = st.number_input("Durchschnittliche jährlicher Zinssatz Aktie (%)",
                                                            min_value=0.0,
@@ -76,17 +136,42 @@ def sidebar() -> SidebarResults:
                                                            step=1.0,
                                                            key="Flo yearly average interest rate")
             sigma = st.number_input("Volatilität", min_value=0.0, value=2.0, step=1.0, key="Flo sigma")
-            number_of_simulations = st.number_input("Anzahl der Simulationen", min_value=1, step=100, value=100,
-                                                    max_value=10000)
+            scipy_available = find_spec("scipy") is not None
+            sampling = st.selectbox("Stichprobenverfahren",
+                                    options=[scheme for scheme in SamplingScheme
+                                             if scheme != SamplingScheme.SOBOL or scipy_available],
+                                    help="Antithetische Paare und Sobol-Folgen verringern die Streuung der "
+                                         "Ergebnisse, so reichen weniger Simulationen."
+                                         + ("" if scipy_available else " Für Sobol muss scipy installiert sein."))
+            number_of_simulations, execution_parameters, adaptive_parameters = monte_carlo_input()
             deterministic_simulation_parameters = None
             simple_normal_distribution_simulation_parameters = SimpleNormalDistributionSimulationParameters(
                 average_yearly_interest_rate=average_yearly_interest_rate,
                 sigma=sigma,
+                number_of_simulations=number_of_simulations,
+                sampling=sampling)
+            historical_bootstrap_simulation_parameters = None
+        elif simulation_model == SimulationModel.HISTORICAL_BOOTSTRAP:
+            returns_file = st.text_input("Datei mit Monatsrenditen (CSV)",
+                                         value=os.environ.get("FLOSINVESTMENT_RETURNS_FILE", ""),
+                                         help="Eine Zeile pro Monat, älteste zuerst, mit Kopfzeile. Die letzte Spalte "
+                                              "enthält die Rendite des Index in Prozent.")
+            mean_block_length = st.number_input("Mittlere Blocklänge (Monate)", min_value=1.0, value=12.0, step=1.0,
+                                                help="Zusammenhängende historische Monate werden in Blöcken dieser "
+                                                     "mittleren Länge übernommen.")
+            number_of_simulations, execution_parameters, adaptive_parameters = monte_carlo_input()
+            deterministic_simulation_parameters = None
+            simple_normal_distribution_simulation_parameters = None
+            historical_bootstrap_simulation_parameters = HistoricalBootstrapSimulationParameters(
+                returns_file=returns_file,
+                mean_block_length=mean_block_length,
                 number_of_simulations=number_of_simulations)
-
         else:
             deterministic_simulation_parameters = None
             simple_normal_distribution_simulation_parameters = None
+            historical_bootstrap_simulation_parameters = None
+            execution_parameters = None
+            adaptive_parameters = None
 
     # Collect the input parameters
     sidebar_results = SidebarResults(strategy=strategy,
@@ -108,6 +193,9 @@ def sidebar() -> SidebarResults:
                                      simulation_model=simulation_model,
                                      deterministic_simulation_parameters=deterministic_simulation_parameters,
                                      simple_normal_distribution_simulation_parameters=simple_normal_distribution_simulation_parameters,
-                                     flo_strategy_parameters=flo_strategy_parameters
+                                     historical_bootstrap_simulation_parameters=historical_bootstrap_simulation_parameters,
+                                     flo_strategy_parameters=flo_strategy_parameters,
+                                     execution_parameters=execution_parameters,
+                                     adaptive_parameters=adaptive_parameters
                                      )
     return sidebar_results
@@ -1,15 +1,31 @@
+from importlib.util import find_spec
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-from backend.constants import SimulationModel
-from backend.strategy import StrategyFactory
+from backend.aggregation import StreamingAggregator
+from backend.cache import cache_statistics
+from backend.constants import SimulationModel, HistoryColumn, ExportFormat
+from backend.convergence import ConvergenceReport
+from backend.instrumentation import ENABLED_BY_DEFAULT, PerformanceReport, instrumentation, timed
+from backend.results import SimulationResults
+from backend.strategy import AbstractStrategy
 from frontend.computations import get_simulated_strategies, get_percentile_strategy, get_average_strategy, \
-    get_median_strategy
+    get_median_strategy, get_aggregated_simulations, get_single_simulated_strategy, get_percentile_index, \
+    get_mean_strategy, export_all_simulations, get_deterministic_strategy, get_quantile_bands
 from frontend.data_interface import SidebarResults
 from frontend.sidebar import sidebar
 
+FAN_CHART_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+MAX_DOWNLOAD_BYTES = 200 * 1024 ** 2  # Größere Exporte nur als Datei auf dem Server, der Download lädt sie komplett in den Speicher
+MAX_SAMPLE_PATHS = 50  # Obergrenze der einzeln gezeichneten Pfade, hält die Datenmenge im Browser klein
+SAMPLE_PATHS_SEED = 0  # Gleiche Beispielpfade bei jedem Neuladen
+
 
-def tab_overview(tab, strategy: StrategyFactory):
+@timed("rendering")
+def tab_overview(tab, strategy: AbstractStrategy):
     # Plot results
     with tab:
         col1, col2 = st.columns(2)
@@ -23,50 +39,226 @@ def tab_overview(tab, strategy: StrategyFactory):
         st.line_chart(strategy.history, use_container_width=True, x_label="Monate", y_label="Wert (€)")
 
 
-def tab_simulation_results(tab, strategies: list[StrategyFactory]):
+def fan_chart(bands: np.ndarray, mean: np.ndarray, sample_paths: np.ndarray) -> pd.DataFrame:
+    """
+    One column per quantile band of ``FAN_CHART_QUANTILES``, the mean and the sample paths. The
+    size only depends on the number of months and sample paths, not on the number of simulations.
+    """
+    fan = pd.DataFrame({f"P{q * 100:.0f}": band for q, band in zip(FAN_CHART_QUANTILES, bands)})
+    fan["Mittelwert"] = mean
+    for path_idx, path in enumerate(sample_paths):
+        fan[f"Pfad {path_idx + 1}"] = path
+    return fan
+
+
+def sample_paths_selection() -> int:
+    return st.slider("Anzahl Beispielpfade", min_value=0, max_value=MAX_SAMPLE_PATHS, value=5,
+                     help="Zufällig gewählte einzelne Simulationen, zusätzlich zu den Perzentilbändern")
+
+
+@timed("rendering")
+def tab_simulation_results(tab, sidebar_results: SidebarResults, simulation_results: SimulationResults):
+    with tab:
+        view = st.radio("Darstellung", options=["Perzentilbänder", "Alle Pfade"], horizontal=True,
+                        help="Alle Pfade zu zeichnen kann bei vielen Simulationen den Browser lange blockieren.")
+        if view == "Alle Pfade":
+            all_total_value_histories = pd.DataFrame(simulation_results.column(HistoryColumn.TOTAL_VALUE).T)
+            st.line_chart(all_total_value_histories, use_container_width=True)
+            return
+        number_of_sample_paths = sample_paths_selection()
+        total_value = simulation_results.columns.index(HistoryColumn.TOTAL_VALUE)
+        fan = fan_chart(bands=get_quantile_bands(sidebar_results, simulation_results,
+                                                 HistoryColumn.TOTAL_VALUE, FAN_CHART_QUANTILES),
+                        mean=get_average_strategy(sidebar_results, simulation_results).history_values[:, total_value],
+                        sample_paths=simulation_results.sample_paths(HistoryColumn.TOTAL_VALUE,
+                                                                     number_of_paths=number_of_sample_paths,
+                                                                     rng=SAMPLE_PATHS_SEED))
+        st.line_chart(fan, use_container_width=True, x_label="Monate", y_label="Wert (€)")
+        st.caption(f"Perzentile aus {len(simulation_results)} Simulationen")
+
+
+@timed("rendering")
+def tab_quantile_bands(tab, aggregator: StreamingAggregator):
     with tab:
-        all_total_value_histories = pd.DataFrame(
-            {i: strategy.history["Wert Tagesgeld + ETF"] for i, strategy in enumerate(strategies)})
-        st.line_chart(all_total_value_histories, use_container_width=True)
+        number_of_sample_paths = min(sample_paths_selection(), aggregator.sketch.size)
+        column = aggregator.columns.index(HistoryColumn.TOTAL_VALUE)
+        # The quantile sketch is a uniform sample of the paths, so its first entries serve as sample paths
+        fan = fan_chart(bands=aggregator.quantiles(list(FAN_CHART_QUANTILES))[:, :, column],
+                        mean=aggregator.mean[:, column],
+                        sample_paths=aggregator.sketch.sample[:number_of_sample_paths, :, column])
+        st.line_chart(fan, use_container_width=True, x_label="Monate", y_label="Wert (€)")
+        st.caption(f"Quantile aus {aggregator.sketch.size} von {aggregator.count} Simulationen")
 
 
-def tab_data(tab, strategy: StrategyFactory):
+@timed("rendering")
+def tab_data(tab, strategy: AbstractStrategy):
     with tab:
         st.dataframe(strategy.history, use_container_width=True)
 
 
-def deterministic_main_bar(sidebar_results: SidebarResults):
-    strategy = StrategyFactory(sidebar_results=sidebar_results).get_strategy()
-    strategy.simulate()
-    tab1, tab2 = st.tabs(["Übersicht", "Daten"])
+def convergence_section(tab, report: ConvergenceReport):
+    with tab:
+        st.info(f"Adaptive Simulation: {report.number_of_simulations} Simulationen in {report.elapsed_seconds:.1f} s "
+                f"({report.stop_reason})")
+        intervals = {"Mittelwert": report.mean, "Median": report.median, "Perzentil": report.percentile}
+        st.dataframe(pd.DataFrame({"Schätzwert (€)": [interval.estimate for interval in intervals.values()],
+                                   "Untere Grenze (€)": [interval.lower for interval in intervals.values()],
+                                   "Obere Grenze (€)": [interval.upper for interval in intervals.values()],
+                                   "Genauigkeit (± %)": [interval.relative_half_width * 100
+                                                         for interval in intervals.values()]},
+                                  index=list(intervals)), use_container_width=True)
+        st.caption("95 %-Konfidenzintervalle des Scores aus ausgezahltem Betrag und Restwert.")
+
+
+def export_section(tab, sidebar_results: SidebarResults, number_of_simulations: int | None = None):
+    with tab:
+        st.subheader("Export aller Simulationen")
+        if find_spec("pyarrow") is None:
+            st.info("Für den Export muss pyarrow installiert sein.")
+            return
+        file_format = st.selectbox("Format", options=ExportFormat)
+        if not st.button("Exportieren"):
+            return
+        path, seed = export_all_simulations(sidebar_results, file_format, number_of_simulations)
+        st.success(f"Alle Simulationen gespeichert in {path} (Seed {seed})")
+        if path.stat().st_size <= MAX_DOWNLOAD_BYTES:
+            with path.open("rb") as file:
+                st.download_button("Herunterladen", data=file, file_name=path.name)
+
+
+def tab_performance(tab, report: PerformanceReport, cache_report: dict[str, dict[str, int]]):
+    with tab:
+        if cache_report:
+            st.subheader("Caches")
+            st.dataframe(pd.DataFrame.from_dict(cache_report, orient="index").rename(
+                columns={"hits": "Treffer", "misses": "Fehlschläge"}), use_container_width=True)
+            st.caption("Seit dem Start des Servers, für alle Sitzungen.")
+        if not report.timers and not report.counters:
+            st.info("Keine Messwerte für diesen Durchlauf.")
+            return
+        st.subheader("Phasen")
+        st.dataframe(pd.DataFrame({"Sekunden": report.timers, "Aufrufe": report.timer_calls}).sort_values(
+            "Sekunden", ascending=False), use_container_width=True)
+        st.caption("Die Zeiten sind inklusive: eine Phase innerhalb einer anderen (z.B. Kauf innerhalb der "
+                   "Simulation) zählt für beide. Ergebnisse aus dem Cache werden nicht neu simuliert. Änderungen "
+                   "an der Auswahl der Ergebnisse kommen zu den Werten des letzten vollständigen Durchlaufs hinzu.")
+        st.subheader("Zähler")
+        counters = dict(report.counters)
+        if counters.get("sells"):
+            counters["lots_scanned_per_sell"] = counters.get("lots_scanned", 0) / counters["sells"]
+        st.dataframe(pd.Series(counters, name="Wert"), use_container_width=True)
+
+
+def result_tabs(*names: str, performance_report: PerformanceReport | None) -> tuple[list, object | None]:
+    """
+    Creates the tabs of the results and, if the performance is measured, a "Performance" tab
+    after them.
+
+    :param performance_report: Measurements of the current run, ``None`` if not measured.
+    :return: The tabs of ``names`` and the performance tab or ``None``.
+    """
+    if performance_report is None:
+        return st.tabs(list(names)), None
+    *tabs, performance_tab = st.tabs(list(names) + ["Performance"])
+    return tabs, performance_tab
+
+
+def performance_section(performance_tab, performance_report: PerformanceReport | None):
+    if performance_tab is not None:
+        tab_performance(performance_tab, performance_report, cache_statistics.snapshot())
+
+
+def deterministic_main_bar(sidebar_results: SidebarResults, performance_report: PerformanceReport | None):
+    strategy = get_deterministic_strategy(sidebar_results)
+    (tab1, tab2), performance_tab = result_tabs("Übersicht", "Daten", performance_report=performance_report)
     tab_overview(tab1, strategy)
     tab_data(tab2, strategy)
+    performance_section(performance_tab, performance_report)
 
 
-def simple_normal_distribution_main_bar(sidebar_results: SidebarResults):
-    strategies = get_simulated_strategies(sidebar_results)
+def result_selection() -> tuple[str, float, int | None]:
     result_type = st.selectbox("Wähle eine Realisierung", options=["Durchschnitt", "Median", "Percentil"])
     weight_return_value = st.slider("Gewichtung Ausgezahlter Betrag (vs. Restwert Portfolio)", min_value=0.0, max_value=1.0, step=0.1,
                                     value=0.9)
+    percentile = None
     if result_type == "Percentil":
         percentile = st.number_input("Percentil (%)", min_value=0, max_value=100, value=50, step=5)
+    return result_type, weight_return_value, percentile
+
+
+def streaming_main_bar(sidebar_results: SidebarResults, performance_report: PerformanceReport | None):
+    streaming_results_view(sidebar_results, get_aggregated_simulations(sidebar_results), performance_report)
+
+
+@st.fragment
+def streaming_results_view(sidebar_results: SidebarResults, aggregator: StreamingAggregator,
+                           performance_report: PerformanceReport | None):
+    """
+    Like :func:`simulation_results_view`, for the aggregated statistics of a streaming run.
+    """
+    instrumentation.bind(performance_report)
+    result_type, weight_return_value, percentile = result_selection()
+    if result_type == "Durchschnitt":
+        strategy = get_mean_strategy(aggregator)
+    else:
+        if result_type == "Median":
+            percentile = 50
+        index = get_percentile_index(percentile, weight_return_value, aggregator)
+        strategy = get_single_simulated_strategy(sidebar_results, index)
+    (tab1, tab2, tab3), performance_tab = result_tabs("Übersicht", "Simulationsergebnisse", "Daten",
+                                                      performance_report=performance_report)
+    tab_overview(tab1, strategy)
+    tab_quantile_bands(tab2, aggregator)
+    tab_data(tab3, strategy)
+    export_section(tab3, sidebar_results)
+    performance_section(performance_tab, performance_report)
+
+
+def simple_normal_distribution_main_bar(sidebar_results: SidebarResults, performance_report: PerformanceReport | None):
+    if sidebar_results.execution_parameters is not None and sidebar_results.execution_parameters.streaming:
+        streaming_main_bar(sidebar_results, performance_report)
+        return
+    simulation_results_view(sidebar_results, get_simulated_strategies(sidebar_results), performance_report)
+
+
+@st.fragment
+def simulation_results_view(sidebar_results: SidebarResults, simulation_results: SimulationResults,
+                            performance_report: PerformanceReport | None):
+    """
+    Selection of the shown simulation and all result tabs. As a fragment, a change of one of
+    its widgets only reruns this function: the sidebar and the simulation are not touched,
+    mean and quantile bands come from the cache. A fragment rerun runs on a new thread, so the
+    report of the last full run is bound again and the measurements of the rerun add to it.
+    """
+    instrumentation.bind(performance_report)
+    result_type, weight_return_value, percentile = result_selection()
     if result_type == "Durchschnitt":
-        strategy = get_average_strategy(sidebar_results, strategies)
+        strategy = get_average_strategy(sidebar_results, simulation_results)
     elif result_type == "Median":
-        strategy = get_median_strategy(strategies, weight_return_value)
+        strategy = get_median_strategy(simulation_results, weight_return_value)
     elif result_type == "Percentil":
-        strategy = get_percentile_strategy(percentile, weight_return_value, strategies)
-    tab1, tab2, tab3 = st.tabs(["Übersicht", "Simulationsergebnisse", "Daten"])
+        strategy = get_percentile_strategy(percentile, weight_return_value, simulation_results)
+    (tab1, tab2, tab3), performance_tab = result_tabs("Übersicht", "Simulationsergebnisse", "Daten",
+                                                      performance_report=performance_report)
     tab_overview(tab1, strategy)
-    tab_simulation_results(tab2, strategies)
+    if simulation_results.convergence is not None:
+        convergence_section(tab2, simulation_results.convergence)
+    tab_simulation_results(tab2, sidebar_results, simulation_results)
     tab_data(tab3, strategy)
+    export_section(tab3, sidebar_results, len(simulation_results))
+    performance_section(performance_tab, performance_report)
 
 
-def main_bar(sidebar_results: SidebarResults):
+def main_bar(sidebar_results: SidebarResults, performance_report: PerformanceReport | None = None):
     if sidebar_results.simulation_model == SimulationModel.DETERMINISTIC:
-        deterministic_main_bar(sidebar_results)
+        deterministic_main_bar(sidebar_results, performance_report)
     elif sidebar_results.simulation_model == SimulationModel.SIMPLE_NORMAL_DISTRIBUTION:
-        simple_normal_distribution_main_bar(sidebar_results)
+        simple_normal_distribution_main_bar(sidebar_results, performance_report)
+    elif sidebar_results.simulation_model == SimulationModel.HISTORICAL_BOOTSTRAP:
+        if not Path(sidebar_results.historical_bootstrap_simulation_parameters.returns_file).is_file():
+            st.error("Bitte eine CSV-Datei mit historischen Monatsrenditen angeben.")
+            return
+        simple_normal_distribution_main_bar(sidebar_results, performance_report)
     else:
         st.error(f"Das Simulationsmodell {sidebar_results.simulation_model} ist noch nicht implementiert")
 
@@ -74,7 +266,13 @@ def main_bar(sidebar_results: SidebarResults):
 def main():
     st.title("Investment Simulator")
     sidebar_results = sidebar()
-    main_bar(sidebar_results)
+    enabled = st.sidebar.toggle("Performance messen", value=ENABLED_BY_DEFAULT,
+                                help="Misst die Laufzeit der Phasen und zählt Käufe, Verkäufe und "
+                                     "Schreibzugriffe. Die Werte stehen im Tab \"Performance\".")
+    # Neuer Bericht für jeden vollständigen Durchlauf, Fragmente schreiben in den Bericht des letzten
+    performance_report = PerformanceReport() if enabled else None
+    instrumentation.bind(performance_report)
+    main_bar(sidebar_results, performance_report)
 
 
 if __name__ == '__main__':
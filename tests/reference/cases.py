@@ -0,0 +1,60 @@
+"""
+Parameters of the reference runs. Plain data only: the module is shared by the tests and by
+``generate.py``, which imports the scalar strategies of the baseline instead of this tree.
+"""
+
+COMMON_PARAMETERS = dict(monthly_savings=100,
+                         initial_savings=1000,
+                         reserves=5000,
+                         monthly_savings_reserves=100,
+                         yearly_interest_rate_on_reserves=2.0,
+                         yearly_tax_free_allowance=1000,
+                         capital_yields_tax_percentage=25,
+                         duration_accumulation_phase_in_years=10,
+                         extract_all_at_once=False,
+                         monthly_payoff=700,
+                         duration_simulation=25,
+                         costs_buy_absolute=1.0,
+                         costs_sell_absolute=1.0)
+
+# Simulation models of the ETF. Deterministic paths are all equal, so one path is enough.
+SIMULATION_MODELS = {"deterministic": dict(yearly_interest_rate=5.0, n_paths=1, seed=None),
+                     "normal": dict(average_yearly_interest_rate=5.0, sigma=3.0, n_paths=8, seed=42)}
+
+SAVING_PLAN_CASES = {"standard": COMMON_PARAMETERS,
+                     # Bought once, then only sold: lots are consumed until the portfolio is empty
+                     "sell_only": COMMON_PARAMETERS | dict(initial_savings=50000,
+                                                           monthly_savings=0,
+                                                           reserves=0,
+                                                           monthly_savings_reserves=0,
+                                                           duration_accumulation_phase_in_years=1,
+                                                           monthly_payoff=1500),
+                     # Nothing is paid in: buys of zero money only cost, payoffs find nothing to sell
+                     "zero_contribution": COMMON_PARAMETERS | dict(initial_savings=0,
+                                                                   monthly_savings=0,
+                                                                   reserves=0,
+                                                                   monthly_savings_reserves=0),
+                     # The payoff is below the sell costs, so nothing is ever sold
+                     "payoff_below_costs": COMMON_PARAMETERS | dict(monthly_payoff=0.5)}
+
+FLO_CASES = {"rolling_mean_4": COMMON_PARAMETERS | dict(flo_initial_stock_prize=100.0,
+                                                        flo_target_number_of_stocks=120,
+                                                        flo_duration_months_for_rolling_average_stock_prize=4,
+                                                        flo_step_size=20,
+                                                        flo_prize_step_size=4,
+                                                        flo_average_yearly_interest_rate=5.0,
+                                                        flo_sigma=4.0),
+             "high_payoff_window_1": COMMON_PARAMETERS | dict(monthly_payoff=3000,
+                                                              flo_initial_stock_prize=50.0,
+                                                              flo_target_number_of_stocks=60,
+                                                              flo_duration_months_for_rolling_average_stock_prize=1,
+                                                              flo_step_size=10,
+                                                              flo_prize_step_size=2,
+                                                              flo_average_yearly_interest_rate=7.0,
+                                                              flo_sigma=6.0)}
+
+# Ein Los, bei dem ``sold_units + units`` durch Rundung das Ende des Loses erreicht, obwohl
+# ``units`` kleiner als die verbleibenden Anteile ist
+UNITS_IN_LOT = 8.319432152802452
+UNITS_SOLD_FIRST = 7.593608097254042
+UNITS_SOLD_SECOND = 0.7258240555484105
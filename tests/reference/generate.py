@@ -0,0 +1,111 @@
+"""
+Writes the reference histories of the scalar per-lot strategies of the baseline commit
+(61c30e0, before the batch engines). Run it against a checkout of that commit:
+
+    git worktree add /tmp/baseline 61c30e0
+    python tests/reference/generate.py /tmp/baseline
+
+The price paths are drawn with the simulation models of the baseline (``np.random`` with a
+fixed seed), stored next to the histories and replayed into the strategies, so the tests can
+feed exactly the same prices to the current engines.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+OUTPUT_DIRECTORY = Path(__file__).parent
+
+
+class ReplayedPrices:
+    def __init__(self, prices: np.ndarray):
+        # Returns the stored prices one after the other, as updater of a baseline portfolio
+        self.prices = prices
+        self.month = 0
+
+    def __call__(self, current_price: float) -> float:
+        self.month += 1
+        return float(self.prices[self.month])
+
+
+def _draw_prices(model, n_paths: int, n_months: int, init_price: float) -> np.ndarray:
+    prices = np.empty((n_paths, n_months + 1), dtype="float64")
+    for path_idx in range(n_paths):
+        price = init_price
+        prices[path_idx, 0] = price
+        for month_idx in range(1, n_months + 1):
+            price = model(price)
+            prices[path_idx, month_idx] = price
+    return prices
+
+
+def _models(simulation_model: str, parameters: dict, etf_rate: dict) -> tuple:
+    from backend.simulation import DeterministicSimulationModel, SimpleNormalDistributionSimulationModel
+    if simulation_model == "deterministic":
+        return (DeterministicSimulationModel(yearly_interest_rate=etf_rate["yearly_interest_rate"]),
+                DeterministicSimulationModel(yearly_interest_rate=parameters.get("flo_average_yearly_interest_rate", 0)))
+    return (SimpleNormalDistributionSimulationModel(average_yearly_interest_rate=etf_rate["average_yearly_interest_rate"],
+                                                    sigma=etf_rate["sigma"]),
+            SimpleNormalDistributionSimulationModel(
+                average_yearly_interest_rate=parameters.get("flo_average_yearly_interest_rate", 0),
+                sigma=parameters.get("flo_sigma", 0)))
+
+
+def generate_saving_plan(cases: dict, simulation_models: dict) -> dict[str, np.ndarray]:
+    from backend.strategy import SavingPlanInvestmentStrategy
+    arrays = {}
+    for case, parameters in cases.items():
+        n_months = parameters["duration_simulation"] * 12
+        for simulation_model, model_parameters in simulation_models.items():
+            etf_model, _ = _models(simulation_model, parameters, model_parameters)
+            if model_parameters["seed"] is not None:
+                np.random.seed(model_parameters["seed"])
+            etf_prices = _draw_prices(etf_model, model_parameters["n_paths"], n_months, 1.0)
+            histories = []
+            for path_idx in range(model_parameters["n_paths"]):
+                strategy = SavingPlanInvestmentStrategy(simulation_model=ReplayedPrices(etf_prices[path_idx]),
+                                                        **parameters)
+                strategy.simulate()
+                histories.append(strategy.history.to_numpy())
+            arrays[f"{case}/{simulation_model}/etf_prices"] = etf_prices
+            arrays[f"{case}/{simulation_model}/histories"] = np.stack(histories)
+    return arrays
+
+
+def generate_flo(cases: dict, simulation_models: dict) -> dict[str, np.ndarray]:
+    from backend.strategy import FloInvestmentStrategy
+    arrays = {}
+    for case, parameters in cases.items():
+        strategy_parameters = {key: value for key, value in parameters.items()
+                               if key not in ("flo_average_yearly_interest_rate", "flo_sigma")}
+        n_months = parameters["duration_simulation"] * 12
+        for simulation_model, model_parameters in simulation_models.items():
+            etf_model, stock_model = _models(simulation_model, parameters, model_parameters)
+            if model_parameters["seed"] is not None:
+                np.random.seed(model_parameters["seed"])
+            etf_prices = _draw_prices(etf_model, model_parameters["n_paths"], n_months, 1.0)
+            stock_prices = _draw_prices(stock_model, model_parameters["n_paths"], n_months,
+                                        parameters["flo_initial_stock_prize"])
+            histories = []
+            for path_idx in range(model_parameters["n_paths"]):
+                strategy = FloInvestmentStrategy(simulation_model_etf=ReplayedPrices(etf_prices[path_idx]),
+                                                 simulation_model_stock_flo=ReplayedPrices(stock_prices[path_idx]),
+                                                 **strategy_parameters)
+                strategy.simulate()
+                histories.append(strategy.history.to_numpy())
+            arrays[f"{case}/{simulation_model}/etf_prices"] = etf_prices
+            arrays[f"{case}/{simulation_model}/stock_prices"] = stock_prices
+            arrays[f"{case}/{simulation_model}/histories"] = np.stack(histories)
+    return arrays
+
+
+def main(baseline_directory: str):
+    sys.path.insert(0, str(Path(baseline_directory).resolve()))
+    from cases import FLO_CASES, SAVING_PLAN_CASES, SIMULATION_MODELS
+    np.savez_compressed(OUTPUT_DIRECTORY / "saving_plan.npz",
+                        **generate_saving_plan(SAVING_PLAN_CASES, SIMULATION_MODELS))
+    np.savez_compressed(OUTPUT_DIRECTORY / "flo.npz", **generate_flo(FLO_CASES, SIMULATION_MODELS))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
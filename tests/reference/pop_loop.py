@@ -0,0 +1,62 @@
+"""
+The FIFO sale of the baseline ``Portfolio``: a list of lots, the oldest popped one by one until
+the target is reached. Kept here as the reference for the prefix-sum ledger.
+"""
+
+
+class PopLoopPortfolio:
+    def __init__(self, yearly_tax_free_allowance: float, capital_yields_tax_percentage: float, price: float):
+        self.lots: list[list[float]] = []  # [Kaufpreis je Anteil, Anteile], älteste zuerst
+        self.price = price
+        self.yearly_tax_free_allowance = yearly_tax_free_allowance
+        self.remaining_yearly_tax_free_allowance = yearly_tax_free_allowance
+        self.yearly_loss_pot = 0.0
+        self.capital_yields_tax_percentage = capital_yields_tax_percentage
+
+    @property
+    def current_total_value(self) -> float:
+        return sum(self.price * units for _, units in self.lots)
+
+    @property
+    def invested_money(self) -> float:
+        return sum(purchasing_price * units for purchasing_price, units in self.lots)
+
+    def buy(self, money: float, cost_buy: float):
+        money = money - cost_buy
+        if money < 0:
+            return
+        self.lots.append([self.price, money / self.price])
+
+    def sell(self, target_money_sell: float, transaction_costs: float) -> tuple[float, float, float]:
+        if target_money_sell < transaction_costs or not self.lots:
+            return 0.0, 0.0, 0.0
+        returned_money = 0.0
+        profit = 0.0
+        while self.lots:
+            purchasing_price, units = self.lots.pop(0)
+            current_value = self.price * units
+            if current_value > target_money_sell:
+                selling_amount = target_money_sell / self.price
+                self.lots.insert(0, [purchasing_price, units - selling_amount])
+                profit += target_money_sell - selling_amount * purchasing_price
+                returned_money += target_money_sell
+                break
+            profit += current_value - purchasing_price * units
+            returned_money += current_value
+            target_money_sell -= current_value
+        if profit < 0:
+            tax = 0.0
+            self.yearly_loss_pot += -profit
+        else:
+            profit_minus_loss_pot = profit - min(self.yearly_loss_pot, profit)
+            self.yearly_loss_pot -= min(profit, self.yearly_loss_pot)
+            profit_part_in_tax_free_allowance = min(self.remaining_yearly_tax_free_allowance, profit_minus_loss_pot)
+            profit_part_outside_tax_free_allowance = profit_minus_loss_pot - profit_part_in_tax_free_allowance
+            self.remaining_yearly_tax_free_allowance -= profit_part_in_tax_free_allowance
+            tax = profit_part_outside_tax_free_allowance * self.capital_yields_tax_percentage / 100.0
+        return returned_money - transaction_costs - tax, tax, transaction_costs
+
+    def next_month(self, price: float, new_year: bool):
+        if new_year:
+            self.remaining_yearly_tax_free_allowance = self.yearly_tax_free_allowance
+        self.price = price
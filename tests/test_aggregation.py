@@ -0,0 +1,40 @@
+import numpy as np
+
+from backend.aggregation import StreamingAggregator
+from backend.constants import HistoryColumn
+
+COLUMNS = [HistoryColumn.RETURNED_CUMULATIVE, HistoryColumn.TOTAL_VALUE, HistoryColumn.VALUE_RESERVES]
+N_MONTHS = 12
+BATCH_SIZES = (1, 7, 30, 2, 13)  # Ungleich große Pakete, auch ein einzelner Pfad
+
+
+def _histories(n_paths: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.normal(loc=1000.0, scale=250.0, size=(n_paths, N_MONTHS + 1, len(COLUMNS)))
+
+
+def test_mean_and_variance_match_numpy_over_uneven_batches():
+    rng = np.random.default_rng(0)
+    batches = [_histories(n_paths, rng) for n_paths in BATCH_SIZES]
+    aggregator = StreamingAggregator(columns=COLUMNS, n_months=N_MONTHS, rng=1)
+    for histories in batches:
+        aggregator.add(histories)
+
+    all_histories = np.concatenate(batches)
+    assert aggregator.count == len(all_histories)
+    np.testing.assert_allclose(aggregator.mean, np.mean(all_histories, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(aggregator.variance, np.var(all_histories, axis=0, ddof=1), rtol=1e-12)
+
+
+def test_add_after_score_index_keeps_the_index_unchanged():
+    rng = np.random.default_rng(0)
+    first, second = _histories(5, rng), _histories(3, rng)
+    aggregator = StreamingAggregator(columns=COLUMNS, n_months=N_MONTHS, rng=1)
+    aggregator.add(first)
+    score_index = aggregator.score_index
+
+    aggregator.add(second)
+
+    assert len(score_index) == 5
+    np.testing.assert_array_equal(score_index.remaining_values, first[:, -1, 1])
+    np.testing.assert_array_equal(aggregator.score_index.remaining_values,
+                                  np.concatenate([first, second])[:, -1, 1])
@@ -0,0 +1,93 @@
+"""
+The batch engines must reproduce the scalar per-lot strategies of the baseline. The reference
+histories in ``tests/reference`` were written by ``tests/reference/generate.py`` from the
+baseline code, on stored price paths that are fed to the engines here unchanged.
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from backend import kernels
+from backend.constants import Engine, ReferencePrice, SimulationModel, Strategy
+from backend.strategy import StrategyFactory
+from frontend.data_interface import SidebarResults, DeterministicSimulationParameters, ExecutionParameters, \
+    FloStrategyParameters
+from tests.reference.cases import FLO_CASES, SAVING_PLAN_CASES, SIMULATION_MODELS
+
+REFERENCE_DIRECTORY = Path(__file__).parent / "reference"
+RTOL = 1e-9  # Erlaubte relative Abweichung von der Referenz
+ATOL = 1e-6  # Erlaubte absolute Abweichung in Euro, für Werte nahe null
+
+ENGINES = [Engine.NUMPY, pytest.param(Engine.NUMBA, marks=pytest.mark.skipif(not kernels.NUMBA_AVAILABLE,
+                                                                            reason="Numba is not installed"))]
+
+
+def _sidebar_results(strategy: Strategy, parameters: dict, engine: Engine) -> SidebarResults:
+    # The engines only read the financial parameters, the prices come from the reference
+    flo_strategy_parameters = None
+    if strategy == Strategy.FLO:
+        flo_strategy_parameters = FloStrategyParameters(
+            initial_stock_prize=parameters["flo_initial_stock_prize"],
+            target_number_of_stocks=parameters["flo_target_number_of_stocks"],
+            duration_months_for_rolling_average_stock_prize=parameters[
+                "flo_duration_months_for_rolling_average_stock_prize"],
+            step_size=parameters["flo_step_size"],
+            prize_step_size=parameters["flo_prize_step_size"],
+            average_yearly_interest_rate=parameters["flo_average_yearly_interest_rate"],
+            sigma=parameters["flo_sigma"],
+            reference_price=ReferencePrice.ROLLING_MEAN)
+    return SidebarResults(strategy=strategy,
+                          monthly_savings=parameters["monthly_savings"],
+                          initial_savings=parameters["initial_savings"],
+                          reserves=parameters["reserves"],
+                          monthly_savings_reserves=parameters["monthly_savings_reserves"],
+                          yearly_interest_rate_on_reserves=parameters["yearly_interest_rate_on_reserves"],
+                          costs_buy_absolute=parameters["costs_buy_absolute"],
+                          costs_sell_absolute=parameters["costs_sell_absolute"],
+                          duration_accumulation_phase_in_years=parameters["duration_accumulation_phase_in_years"],
+                          include_inflation=False,
+                          simulation_model=SimulationModel.DETERMINISTIC,
+                          extract_all_at_once=parameters["extract_all_at_once"],
+                          monthly_payoff=parameters["monthly_payoff"],
+                          yearly_tax_free_allowance=parameters["yearly_tax_free_allowance"],
+                          capital_yields_tax_percentage=parameters["capital_yields_tax_percentage"],
+                          duration_simulation=parameters["duration_simulation"],
+                          deterministic_simulation_parameters=DeterministicSimulationParameters(
+                              yearly_interest_rate=0.0),
+                          flo_strategy_parameters=flo_strategy_parameters,
+                          execution_parameters=ExecutionParameters(seed=None, number_of_workers=1, chunk_size=1,
+                                                                   engine=engine))
+
+
+@pytest.fixture(scope="module")
+def saving_plan_reference() -> dict[str, np.ndarray]:
+    with np.load(REFERENCE_DIRECTORY / "saving_plan.npz") as reference:
+        return dict(reference)
+
+
+@pytest.fixture(scope="module")
+def flo_reference() -> dict[str, np.ndarray]:
+    with np.load(REFERENCE_DIRECTORY / "flo.npz") as reference:
+        return dict(reference)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("simulation_model", SIMULATION_MODELS)
+@pytest.mark.parametrize("case", FLO_CASES)
+def test_flo_batch_matches_scalar_reference(flo_reference, case, simulation_model, engine):
+    prefix = f"{case}/{simulation_model}"
+    factory = StrategyFactory(sidebar_results=_sidebar_results(Strategy.FLO, FLO_CASES[case], engine))
+    histories = factory.simulate_price_paths((flo_reference[f"{prefix}/etf_prices"],
+                                              flo_reference[f"{prefix}/stock_prices"]))
+    np.testing.assert_allclose(histories, flo_reference[f"{prefix}/histories"], rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("simulation_model", SIMULATION_MODELS)
+@pytest.mark.parametrize("case", SAVING_PLAN_CASES)
+def test_saving_plan_batch_matches_scalar_reference(saving_plan_reference, case, simulation_model, engine):
+    prefix = f"{case}/{simulation_model}"
+    factory = StrategyFactory(sidebar_results=_sidebar_results(Strategy.SAVINGS_PLAN, SAVING_PLAN_CASES[case], engine))
+    histories = factory.simulate_price_paths((saving_plan_reference[f"{prefix}/etf_prices"],))
+    np.testing.assert_allclose(histories, saving_plan_reference[f"{prefix}/histories"], rtol=RTOL, atol=ATOL)
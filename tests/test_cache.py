@@ -0,0 +1,153 @@
+import os
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from backend.cache import DiskResultCache, canonical_cache_key
+from backend.constants import HistoryColumn, SimulationModel, StopReason, Strategy
+from backend.convergence import ConfidenceInterval, ConvergenceReport
+from backend.results import SimulationResults
+from frontend.data_interface import SidebarResults, DeterministicSimulationParameters, ExecutionParameters, \
+    FloStrategyParameters, SimpleNormalDistributionSimulationParameters
+
+COLUMNS = [HistoryColumn.RETURNED_CUMULATIVE, HistoryColumn.TOTAL_VALUE]
+
+
+def _results(seed: int = 0, convergence: ConvergenceReport | None = None) -> SimulationResults:
+    histories = np.random.default_rng(seed).uniform(0, 1000, size=(20, 13, len(COLUMNS)))
+    return SimulationResults.from_histories(histories=histories, columns=COLUMNS, convergence=convergence)
+
+
+def _set_last_use(cache: DiskResultCache, key: str, timestamp: float):
+    os.utime(cache.directory / key, (timestamp, timestamp))
+
+
+def test_put_and_get_round_trip(tmp_path):
+    interval = ConfidenceInterval(estimate=1.0, lower=0.9, upper=1.1)
+    convergence = ConvergenceReport(number_of_simulations=20, elapsed_seconds=0.5, stop_reason=StopReason.PRECISION,
+                                    mean=interval, median=interval, percentile=interval)
+    results = _results(convergence=convergence)
+    cache = DiskResultCache(directory=tmp_path, max_size_bytes=10 ** 9)
+
+    cache.put("key", results)
+    loaded = cache.get("key")
+
+    assert loaded.columns == results.columns
+    np.testing.assert_array_equal(loaded.histories, results.histories)
+    np.testing.assert_array_equal(loaded.score_index.returned_money_totals, results.score_index.returned_money_totals)
+    np.testing.assert_array_equal(loaded.score_index.remaining_values, results.score_index.remaining_values)
+    assert loaded.convergence == convergence
+    assert cache.get("other key") is None
+
+
+def test_get_loads_read_only_memory_maps(tmp_path):
+    cache = DiskResultCache(directory=tmp_path, max_size_bytes=10 ** 9)
+    cache.put("key", _results())
+
+    loaded = cache.get("key")
+
+    assert isinstance(loaded.histories, np.memmap)
+    # Der ScoreIndex hält Sichten auf die gemappten Dateien, keine Kopien
+    for array in (loaded.score_index.returned_money_totals, loaded.score_index.remaining_values):
+        assert isinstance(array.base, np.memmap)
+    for array in (loaded.histories, loaded.score_index.returned_money_totals, loaded.score_index.remaining_values):
+        assert not array.flags.writeable
+    with pytest.raises(ValueError):
+        loaded.histories[0, 0, 0] = 1.0
+
+
+@pytest.mark.parametrize("missing_file", [DiskResultCache._HISTORIES_FILE, DiskResultCache._META_FILE,
+                                          DiskResultCache._REMAINING_VALUES_FILE])
+def test_get_returns_none_for_a_partial_entry(tmp_path, missing_file):
+    cache = DiskResultCache(directory=tmp_path, max_size_bytes=10 ** 9)
+    cache.put("key", _results())
+    (tmp_path / "key" / missing_file).unlink()
+
+    assert cache.get("key") is None
+
+
+def test_evict_deletes_the_least_recently_used_entries(tmp_path):
+    cache = DiskResultCache(directory=tmp_path, max_size_bytes=10 ** 9)
+    cache.put("first", _results(0))
+    entry_size = cache.size_bytes()
+    cache.put("second", _results(1))
+    cache.put("third", _results(2))
+    for timestamp, key in enumerate(["second", "first", "third"], start=1_000_000):
+        _set_last_use(cache, key, timestamp)
+    cache.get("second")  # Zuletzt benutzt
+
+    cache.max_size_bytes = 2 * entry_size
+    cache.evict()
+
+    assert cache.get("first") is None
+    assert cache.get("second") is not None
+    assert cache.get("third") is not None
+    assert cache.size_bytes() <= cache.max_size_bytes
+
+
+def test_put_evicts_when_the_cache_is_full(tmp_path):
+    cache = DiskResultCache(directory=tmp_path, max_size_bytes=10 ** 9)
+    cache.put("first", _results(0))
+    cache.max_size_bytes = cache.size_bytes()
+    _set_last_use(cache, "first", 1_000_000)
+
+    cache.put("second", _results(1))
+
+    assert cache.get("first") is None
+    assert cache.get("second") is not None
+
+
+def _normal_sidebar_results() -> SidebarResults:
+    # Sparplan mit Normalverteilung, die Parameter der anderen Modelle und Strategien sind trotzdem gesetzt
+    return SidebarResults(strategy=Strategy.SAVINGS_PLAN,
+                          monthly_savings=100,
+                          initial_savings=1000,
+                          reserves=0,
+                          monthly_savings_reserves=0,
+                          yearly_interest_rate_on_reserves=2.0,
+                          costs_buy_absolute=1.0,
+                          costs_sell_absolute=1.0,
+                          duration_accumulation_phase_in_years=10,
+                          include_inflation=False,
+                          simulation_model=SimulationModel.SIMPLE_NORMAL_DISTRIBUTION,
+                          extract_all_at_once=False,
+                          monthly_payoff=500,
+                          deterministic_simulation_parameters=DeterministicSimulationParameters(
+                              yearly_interest_rate=5.0),
+                          simple_normal_distribution_simulation_parameters=SimpleNormalDistributionSimulationParameters(
+                              average_yearly_interest_rate=5.0, sigma=3.0, number_of_simulations=100),
+                          flo_strategy_parameters=FloStrategyParameters(
+                              initial_stock_prize=100.0, target_number_of_stocks=100,
+                              duration_months_for_rolling_average_stock_prize=6, step_size=1, prize_step_size=5,
+                              average_yearly_interest_rate=5.0, sigma=3.0),
+                          execution_parameters=ExecutionParameters(seed=42, number_of_workers=4, chunk_size=100))
+
+
+@pytest.mark.parametrize("change", [
+    dict(flo_strategy_parameters=FloStrategyParameters(
+        initial_stock_prize=50.0, target_number_of_stocks=10, duration_months_for_rolling_average_stock_prize=2,
+        step_size=2, prize_step_size=1, average_yearly_interest_rate=9.0, sigma=1.0)),
+    dict(deterministic_simulation_parameters=DeterministicSimulationParameters(yearly_interest_rate=1.0)),
+    dict(include_inflation=True),
+    dict(extract_all_at_once=True),
+    dict(execution_parameters=ExecutionParameters(seed=42, number_of_workers=1, chunk_size=100)),
+    dict(execution_parameters=ExecutionParameters(seed=42, number_of_workers=4, chunk_size=7)),
+    dict(monthly_savings=100.0),
+], ids=["flo", "deterministic", "inflation", "extract_all_at_once", "workers", "chunk_size", "int_vs_float"])
+def test_canonical_cache_key_ignores_parameters_the_run_does_not_read(change):
+    sidebar_results = _normal_sidebar_results()
+
+    assert canonical_cache_key(replace(sidebar_results, **change)) == canonical_cache_key(sidebar_results)
+
+
+@pytest.mark.parametrize("change", [
+    dict(execution_parameters=ExecutionParameters(seed=43, number_of_workers=4, chunk_size=100)),
+    dict(simple_normal_distribution_simulation_parameters=SimpleNormalDistributionSimulationParameters(
+        average_yearly_interest_rate=5.0, sigma=3.0, number_of_simulations=200)),
+    dict(monthly_savings=101),
+], ids=["seed", "number_of_simulations", "monthly_savings"])
+def test_canonical_cache_key_changes_with_parameters_the_run_reads(change):
+    sidebar_results = _normal_sidebar_results()
+
+    assert canonical_cache_key(replace(sidebar_results, **change)) != canonical_cache_key(sidebar_results)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from backend.constants import StopReason, SimulationModel, Strategy
+from backend.convergence import ConvergenceCriterion
+from backend.execution import simulate_adaptive, simulate_histories
+from frontend.data_interface import SidebarResults, SimpleNormalDistributionSimulationParameters, \
+    ExecutionParameters
+
+SEED = 42
+CHUNK_SIZE = 50
+MAX_NUMBER_OF_SIMULATIONS = 1000
+
+
+def _sidebar_results() -> SidebarResults:
+    return SidebarResults(strategy=Strategy.SAVINGS_PLAN,
+                          monthly_savings=100,
+                          initial_savings=1000,
+                          reserves=0,
+                          monthly_savings_reserves=0,
+                          yearly_interest_rate_on_reserves=0.0,
+                          costs_buy_absolute=1.0,
+                          costs_sell_absolute=1.0,
+                          duration_accumulation_phase_in_years=3,
+                          include_inflation=False,
+                          simulation_model=SimulationModel.SIMPLE_NORMAL_DISTRIBUTION,
+                          extract_all_at_once=False,
+                          monthly_payoff=200,
+                          duration_simulation=5,
+                          simple_normal_distribution_simulation_parameters=SimpleNormalDistributionSimulationParameters(
+                              average_yearly_interest_rate=5.0, sigma=10.0,
+                              number_of_simulations=MAX_NUMBER_OF_SIMULATIONS),
+                          execution_parameters=ExecutionParameters(seed=SEED, number_of_workers=1,
+                                                                   chunk_size=CHUNK_SIZE))
+
+
+def _simulate_adaptive(max_number_of_simulations: int, relative_precision: float):
+    return simulate_adaptive(_sidebar_results(), max_number_of_simulations=max_number_of_simulations,
+                             criterion=ConvergenceCriterion(relative_precision=relative_precision),
+                             seed=SEED, number_of_workers=1, chunk_size=CHUNK_SIZE)
+
+
+def test_simulate_adaptive_stops_early_once_converged():
+    histories, report = _simulate_adaptive(MAX_NUMBER_OF_SIMULATIONS, relative_precision=0.1)
+
+    assert report.stop_reason == StopReason.PRECISION
+    assert report.number_of_simulations == len(histories) < MAX_NUMBER_OF_SIMULATIONS
+    assert len(histories) % CHUNK_SIZE == 0
+    # Die ersten Pfade eines Laufs mit fester Anzahl
+    np.testing.assert_array_equal(histories, simulate_histories(
+        _sidebar_results(), number_of_simulations=MAX_NUMBER_OF_SIMULATIONS, seed=SEED, number_of_workers=1,
+        chunk_size=CHUNK_SIZE)[:len(histories)])
+
+
+def test_simulate_adaptive_stops_at_the_maximum_without_convergence():
+    histories, report = _simulate_adaptive(120, relative_precision=1e-9)
+
+    assert report.stop_reason == StopReason.MAXIMUM
+    assert report.number_of_simulations == len(histories) == 120
+
+
+@pytest.mark.parametrize("max_number_of_simulations", [0, -1])
+def test_simulate_adaptive_requires_at_least_one_simulation(max_number_of_simulations):
+    with pytest.raises(ValueError):
+        _simulate_adaptive(max_number_of_simulations, relative_precision=0.1)
@@ -0,0 +1,50 @@
+from dataclasses import replace
+
+import pytest
+
+from backend.constants import ExportFormat
+from backend.export import FILE_SUFFIXES, MONTH_COLUMN, PATH_COLUMN, export_simulations, read_export_metadata
+from backend.strategy import StrategyFactory
+from tests.test_sweep import _normal_sidebar_results
+
+pa = pytest.importorskip("pyarrow")
+
+N_PATHS = 25
+CHUNK_SIZE = 10  # mehrere Chunks, der letzte unvollständig
+
+
+def _read_table(path, file_format: ExportFormat):
+    if file_format == ExportFormat.ARROW:
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).read_all()
+    import pyarrow.parquet as pq
+    return pq.read_table(str(path))
+
+
+@pytest.mark.parametrize("file_format", list(ExportFormat))
+def test_export_reads_back_with_one_row_per_path_and_month(tmp_path, file_format):
+    sidebar_results = replace(_normal_sidebar_results(), duration_simulation=5)
+    path = tmp_path / f"export{FILE_SUFFIXES[file_format]}"
+
+    seed = export_simulations(sidebar_results, path, number_of_simulations=N_PATHS, seed=11,
+                              chunk_size=CHUNK_SIZE, file_format=file_format)
+    table = _read_table(path, file_format)
+
+    n_months = sidebar_results.duration_simulation * 12
+    columns = [str(column) for column in StrategyFactory(sidebar_results=sidebar_results).get_history_columns()]
+    assert table.num_rows == N_PATHS * (n_months + 1)
+    assert table.column_names == [PATH_COLUMN, MONTH_COLUMN] + columns
+    paths = table.column(PATH_COLUMN).to_numpy()
+    months = table.column(MONTH_COLUMN).to_numpy()
+    assert paths.tolist() == [path for path in range(N_PATHS) for _ in range(n_months + 1)]
+    assert months.tolist() == list(range(n_months + 1)) * N_PATHS
+    assert seed == 11
+    assert read_export_metadata(path)["seed"] == seed
+
+
+def test_export_stores_a_drawn_seed(tmp_path):
+    path = tmp_path / "export.parquet"
+
+    seed = export_simulations(_normal_sidebar_results(), path, number_of_simulations=3)
+
+    assert read_export_metadata(path)["seed"] == seed
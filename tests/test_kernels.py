@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from backend import kernels
+from tests.reference.cases import UNITS_IN_LOT, UNITS_SOLD_FIRST, UNITS_SOLD_SECOND
+
+CAPACITY = 4
+PURCHASING_PRICE = 2.0
+
+
+def _ledger(lots: list[float]) -> tuple[np.ndarray, ...]:
+    # Preise, Präfixsummen und Zustand eines Ledgers wie in den Kernels
+    purchasing_prices = np.full(CAPACITY, np.nan)
+    cumulative_units = np.full(CAPACITY, np.nan)
+    cumulative_purchasing_values = np.full(CAPACITY, np.nan)
+    float_state = np.zeros(4)
+    int_state = np.zeros(2, dtype=np.int64)
+    for units in lots:
+        kernels._buy(units * PURCHASING_PRICE, 0.0, PURCHASING_PRICE, purchasing_prices, cumulative_units,
+                     cumulative_purchasing_values, int_state)
+    return purchasing_prices, cumulative_units, cumulative_purchasing_values, float_state, int_state
+
+
+def test_sell_units_exactly_the_cumulative_units_of_the_last_lot():
+    ledger = _ledger([3.0, 5.0])
+    _, cumulative_units, _, float_state, int_state = ledger
+
+    purchasing_value = kernels._sell_units(cumulative_units[int_state[kernels._TAIL] - 1], *ledger)
+
+    assert purchasing_value == pytest.approx(8.0 * PURCHASING_PRICE)
+    assert int_state[kernels._HEAD] == int_state[kernels._TAIL]
+    assert kernels._total_units(cumulative_units, float_state, int_state) == 0.0
+
+
+def test_sell_units_rounding_up_to_the_end_of_the_last_lot_stays_in_the_ledger():
+    ledger = _ledger([UNITS_IN_LOT])
+    _, cumulative_units, _, float_state, int_state = ledger
+    kernels._sell_units(UNITS_SOLD_FIRST, *ledger)
+
+    purchasing_value = kernels._sell_units(UNITS_SOLD_SECOND, *ledger)
+
+    assert purchasing_value == pytest.approx(UNITS_SOLD_SECOND * PURCHASING_PRICE)
+    assert int_state[kernels._HEAD] == 0
+    assert kernels._total_units(cumulative_units, float_state, int_state) == pytest.approx(0.0, abs=1e-12)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from backend.portfolio import LotLedger, Portfolio
+from tests.reference.cases import UNITS_IN_LOT, UNITS_SOLD_FIRST, UNITS_SOLD_SECOND
+from tests.reference.pop_loop import PopLoopPortfolio
+
+
+def test_sell_units_partially_sells_oldest_lots_first():
+    ledger = LotLedger()
+    ledger.append(units=10.0, purchasing_prize_per_unit=1.0, time_bought=(1, 2024))
+    ledger.append(units=10.0, purchasing_prize_per_unit=2.0, time_bought=(2, 2024))
+
+    assert ledger.sell_units(15.0) == pytest.approx(10.0 * 1.0 + 5.0 * 2.0)
+    assert len(ledger) == 1
+    assert ledger.total_units == pytest.approx(5.0)
+    assert ledger.total_purchasing_value == pytest.approx(10.0)
+
+
+def test_sell_units_rounding_up_to_the_end_of_the_last_lot_stays_in_the_ledger():
+    assert UNITS_SOLD_SECOND < UNITS_IN_LOT - UNITS_SOLD_FIRST
+    assert UNITS_SOLD_FIRST + UNITS_SOLD_SECOND >= UNITS_IN_LOT
+    ledger = LotLedger()
+    ledger.append(units=UNITS_IN_LOT, purchasing_prize_per_unit=2.0, time_bought=(1, 2024))
+    ledger.sell_units(UNITS_SOLD_FIRST)
+
+    purchasing_value = ledger.sell_units(UNITS_SOLD_SECOND)
+
+    assert purchasing_value == pytest.approx(UNITS_SOLD_SECOND * 2.0)
+    assert ledger.head == 0
+    assert ledger.total_units == pytest.approx(0.0, abs=1e-12)
+    assert ledger.total_purchasing_value == pytest.approx(0.0, abs=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_portfolio_sell_matches_the_baseline_pop_loop(seed):
+    rng = np.random.default_rng(seed)
+    n_months = 240
+    prices = 100 * np.exp(np.cumsum(np.r_[0.0, rng.normal(0.004, 0.05, n_months)]))
+    portfolio = Portfolio(updater=None, yearly_tax_free_allowance=500, capital_yields_tax_percentage=25,
+                          price_path=prices)
+    reference = PopLoopPortfolio(yearly_tax_free_allowance=500, capital_yields_tax_percentage=25, price=prices[0])
+    for month in range(n_months):
+        action = rng.random()
+        if action < 0.5:
+            money = rng.uniform(0, 300)
+            portfolio.buy(money, cost_buy=1.0)
+            reference.buy(money, cost_buy=1.0)
+        elif action < 0.95:
+            # Teilverkäufe, die ein oder mehrere Lose leeren
+            target = rng.uniform(0, 0.5) * reference.current_total_value
+            np.testing.assert_allclose(portfolio.sell(target, 1.0), reference.sell(target, 1.0), rtol=1e-9, atol=1e-9)
+        else:
+            # Mehr als vorhanden: alles wird verkauft
+            target = 2 * reference.current_total_value + 10
+            np.testing.assert_allclose(portfolio.sell(target, 1.0), reference.sell(target, 1.0), rtol=1e-9, atol=1e-9)
+            assert len(portfolio.lots) == 0
+        assert portfolio.current_total_value == pytest.approx(reference.current_total_value, rel=1e-9, abs=1e-9)
+        assert portfolio.invested_money == pytest.approx(reference.invested_money, rel=1e-9, abs=1e-9)
+        assert portfolio.yearly_loss_pot == pytest.approx(reference.yearly_loss_pot, rel=1e-9, abs=1e-9)
+        assert portfolio.remaining_yearly_tax_free_allowance == pytest.approx(
+            reference.remaining_yearly_tax_free_allowance, rel=1e-9, abs=1e-9)
+        new_year = portfolio.month == 12
+        portfolio.next_month()
+        reference.next_month(prices[month + 1], new_year)
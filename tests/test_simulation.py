@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from backend.constants import SamplingScheme, SimulationModel, Strategy
+from backend.simulation import HistoricalBootstrapSimulationModel, SimpleNormalDistributionSimulationModel, \
+    brownian_bridge_increments, standard_normal_per_stream
+from backend.strategy import StrategyFactory
+from frontend.data_interface import SidebarResults, FloStrategyParameters, SimpleNormalDistributionSimulationParameters
+
+N_ASSETS = 2
+N_MONTHS = 24
+
+
+def _streams(n_paths: int, seed: int = 7) -> list[np.random.SeedSequence]:
+    return np.random.SeedSequence(seed).spawn(n_paths)
+
+
+def _in_chunks(streams: list[np.random.SeedSequence], chunk_size: int, sampling: SamplingScheme) -> np.ndarray:
+    return np.concatenate([standard_normal_per_stream(streams[start:start + chunk_size], N_ASSETS, N_MONTHS, sampling)
+                           for start in range(0, len(streams), chunk_size)])
+
+
+def test_antithetic_odd_streams_negate_their_even_partner():
+    shocks = standard_normal_per_stream(_streams(10), N_ASSETS, N_MONTHS, SamplingScheme.ANTITHETIC)
+
+    np.testing.assert_array_equal(shocks[1::2], -shocks[0::2])
+    assert not np.array_equal(shocks[0], shocks[2])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4])
+def test_antithetic_pairs_do_not_depend_on_the_chunks(chunk_size):
+    # Bei ungeraden Paketgrößen liegt der Partner eines ungeraden Stroms im vorherigen Paket
+    streams = _streams(10)
+    shocks = standard_normal_per_stream(streams, N_ASSETS, N_MONTHS, SamplingScheme.ANTITHETIC)
+
+    np.testing.assert_array_equal(_in_chunks(streams, chunk_size, SamplingScheme.ANTITHETIC), shocks)
+
+
+def test_brownian_bridge_increments_are_independent_standard_normal():
+    normals = np.random.default_rng(0).standard_normal((20000, N_MONTHS))
+
+    increments = brownian_bridge_increments(normals)
+
+    np.testing.assert_allclose(increments.sum(axis=-1), np.sqrt(N_MONTHS) * normals[:, 0], atol=1e-9)
+    np.testing.assert_allclose(increments.mean(axis=0), 0.0, atol=0.05)
+    np.testing.assert_allclose(np.cov(increments, rowvar=False), np.eye(N_MONTHS), atol=0.05)
+
+
+@pytest.mark.parametrize("chunk_size", [5, 16, 64])
+def test_sobol_points_do_not_depend_on_the_chunks(chunk_size):
+    pytest.importorskip("scipy")
+    streams = _streams(64)
+    shocks = standard_normal_per_stream(streams, N_ASSETS, N_MONTHS, SamplingScheme.SOBOL)
+
+    np.testing.assert_array_equal(_in_chunks(streams, chunk_size, SamplingScheme.SOBOL), shocks)
+
+
+def test_sobol_shocks_have_standard_normal_moments():
+    pytest.importorskip("scipy")
+    shocks = standard_normal_per_stream(_streams(4096), N_ASSETS, N_MONTHS, SamplingScheme.SOBOL)
+
+    # Das Ende jedes Pfads kommt aus der ersten, gleichmäßigsten Dimension
+    np.testing.assert_allclose(shocks.sum(axis=-1).mean(axis=0), 0.0, atol=1e-3)
+    np.testing.assert_allclose(shocks.mean(axis=0), 0.0, atol=0.02)
+    for asset in range(N_ASSETS):
+        np.testing.assert_allclose(np.cov(shocks[:, asset], rowvar=False), np.eye(N_MONTHS), atol=0.06)
+    np.testing.assert_allclose(np.corrcoef(shocks[:, 0].ravel(), shocks[:, 1].ravel())[0, 1], 0.0, atol=0.02)
+
+
+def _flo_normal_sidebar_results(correlation: float) -> SidebarResults:
+    return SidebarResults(strategy=Strategy.FLO,
+                          monthly_savings=100,
+                          initial_savings=1000,
+                          reserves=5000,
+                          monthly_savings_reserves=100,
+                          yearly_interest_rate_on_reserves=2.0,
+                          costs_buy_absolute=1.0,
+                          costs_sell_absolute=1.0,
+                          duration_accumulation_phase_in_years=1,
+                          include_inflation=False,
+                          simulation_model=SimulationModel.SIMPLE_NORMAL_DISTRIBUTION,
+                          extract_all_at_once=False,
+                          monthly_payoff=500,
+                          duration_simulation=2,
+                          simple_normal_distribution_simulation_parameters=SimpleNormalDistributionSimulationParameters(
+                              average_yearly_interest_rate=6.0, sigma=4.0, number_of_simulations=2000),
+                          flo_strategy_parameters=FloStrategyParameters(
+                              initial_stock_prize=100.0, target_number_of_stocks=100,
+                              duration_months_for_rolling_average_stock_prize=6, step_size=1, prize_step_size=5,
+                              average_yearly_interest_rate=8.0, sigma=7.0, correlation=correlation))
+
+
+@pytest.mark.parametrize("correlation", [-0.5, 0.0, 0.6, 0.9])
+def test_etf_and_stock_log_returns_have_the_configured_correlation(correlation):
+    factory = StrategyFactory(sidebar_results=_flo_normal_sidebar_results(correlation))
+
+    etf_prices, stock_prices = factory.sample_price_paths(_streams(2000))
+
+    etf_log_returns = np.diff(np.log(etf_prices), axis=1).ravel()
+    stock_log_returns = np.diff(np.log(stock_prices), axis=1).ravel()
+    assert np.corrcoef(etf_log_returns, stock_log_returns)[0, 1] == pytest.approx(correlation, abs=0.02)
+
+
+def test_uncorrelated_etf_and_stock_match_independent_models_drawing_one_after_the_other():
+    sidebar_results = _flo_normal_sidebar_results(0.0)
+    normal_parameters = sidebar_results.simple_normal_distribution_simulation_parameters
+    flo_parameters = sidebar_results.flo_strategy_parameters
+    etf_model = SimpleNormalDistributionSimulationModel(
+        average_yearly_interest_rate=normal_parameters.average_yearly_interest_rate, sigma=normal_parameters.sigma)
+    stock_model = SimpleNormalDistributionSimulationModel(
+        average_yearly_interest_rate=flo_parameters.average_yearly_interest_rate, sigma=flo_parameters.sigma)
+    streams = _streams(20)
+    n_months = sidebar_results.duration_simulation * 12
+
+    etf_prices, stock_prices = StrategyFactory(sidebar_results=sidebar_results).sample_price_paths(streams)
+
+    for path_idx, stream in enumerate(streams):
+        # Wie vor der Korrelation: erst der ETF, dann die Aktie aus demselben Generator
+        rng = np.random.default_rng(stream)
+        np.testing.assert_allclose(etf_prices[path_idx], etf_model.sample_paths(1, n_months, rng=rng)[0], rtol=1e-12)
+        np.testing.assert_allclose(stock_prices[path_idx], stock_model.sample_paths(
+            1, n_months, rng=rng, init_price=flo_parameters.initial_stock_prize)[0], rtol=1e-12)
+
+
+def _bootstrap_model(n_data: int, mean_block_length: float) -> HistoricalBootstrapSimulationModel:
+    return HistoricalBootstrapSimulationModel(monthly_returns=np.linspace(-5, 5, n_data),
+                                              mean_block_length=mean_block_length)
+
+
+@pytest.mark.parametrize("mean_block_length", [1.0, 6.0, 24.0])
+def test_bootstrap_blocks_have_the_configured_mean_length(mean_block_length):
+    n_data = 1000
+    indices = _bootstrap_model(n_data, mean_block_length).sample_indices(n_paths=500, n_months=120, rng=0)
+
+    assert indices.min() >= 0 and indices.max() < n_data
+    # Ein Block endet, wo der nächste Monat nicht der folgende historische Monat ist
+    continues_block = indices[:, 1:] == (indices[:, :-1] + 1) % n_data
+    # Neue Blöcke, die zufällig am folgenden Monat starten, sind mit 1 / n_data selten
+    new_block_rate = 1 - continues_block.mean()
+    assert 1 / new_block_rate == pytest.approx(mean_block_length, rel=0.05)
+
+
+def test_bootstrap_blocks_wrap_around_at_the_end_of_the_data():
+    n_data = 5
+    indices = _bootstrap_model(n_data, mean_block_length=1000.0).sample_indices(n_paths=50, n_months=24, rng=0)
+
+    # Fast nur ein Block je Pfad, der mehrmals vom letzten zum ersten Monat springt
+    steps = (indices[:, 1:] - indices[:, :-1]) % n_data
+    assert (steps == 1).mean() > 0.95
+    assert np.any((indices[:, :-1] == n_data - 1) & (indices[:, 1:] == 0))
+
+
+def test_bootstrap_requires_a_mean_block_length_of_at_least_one():
+    with pytest.raises(ValueError):
+        _bootstrap_model(10, mean_block_length=0.5)
@@ -0,0 +1,64 @@
+import numpy as np
+
+from backend.constants import SimulationModel, Strategy
+from backend.strategy import StrategyFactory
+from backend.sweep import sweep
+from frontend.data_interface import SidebarResults, DeterministicSimulationParameters, ExecutionParameters, \
+    FloStrategyParameters, SimpleNormalDistributionSimulationParameters
+
+
+def _normal_sidebar_results() -> SidebarResults:
+    return SidebarResults(strategy=Strategy.SAVINGS_PLAN,
+                          monthly_savings=100,
+                          initial_savings=1000,
+                          reserves=0,
+                          monthly_savings_reserves=0,
+                          yearly_interest_rate_on_reserves=2.0,
+                          costs_buy_absolute=1.0,
+                          costs_sell_absolute=1.0,
+                          duration_accumulation_phase_in_years=3,
+                          include_inflation=False,
+                          simulation_model=SimulationModel.SIMPLE_NORMAL_DISTRIBUTION,
+                          extract_all_at_once=False,
+                          monthly_payoff=500,
+                          deterministic_simulation_parameters=DeterministicSimulationParameters(
+                              yearly_interest_rate=5.0),
+                          simple_normal_distribution_simulation_parameters=SimpleNormalDistributionSimulationParameters(
+                              average_yearly_interest_rate=5.0, sigma=3.0, number_of_simulations=20),
+                          flo_strategy_parameters=FloStrategyParameters(
+                              initial_stock_prize=100.0, target_number_of_stocks=100,
+                              duration_months_for_rolling_average_stock_prize=6, step_size=1, prize_step_size=5,
+                              average_yearly_interest_rate=5.0, sigma=3.0),
+                          execution_parameters=ExecutionParameters(seed=42, number_of_workers=1, chunk_size=100))
+
+
+def test_grid_points_with_the_same_price_path_parameters_share_their_paths(monkeypatch):
+    sampled = []
+    simulated = []
+    sample_price_paths = StrategyFactory.sample_price_paths
+    simulate_price_paths = StrategyFactory.simulate_price_paths
+
+    def record_sample(factory, rngs):
+        sampled.append(sample_price_paths(factory, rngs))
+        return sampled[-1]
+
+    def record_simulate(factory, price_paths):
+        simulated.append((factory.sidebar_results, price_paths))
+        return simulate_price_paths(factory, price_paths)
+
+    monkeypatch.setattr(StrategyFactory, "sample_price_paths", record_sample)
+    monkeypatch.setattr(StrategyFactory, "simulate_price_paths", record_simulate)
+    # Sparrate und Entnahme ändern die Kurse nicht, Sigma schon: zwei Kursmodelle für sechs Gitterpunkte
+    table = sweep(_normal_sidebar_results(),
+                  axes={"monthly_savings": [100, 200, 300],
+                        "simple_normal_distribution_simulation_parameters.sigma": [3.0, 10.0]},
+                  number_of_simulations=20, seed=3)
+
+    assert len(table) == 6
+    assert len(sampled) == 2
+    paths_by_sigma = {}
+    for sidebar_results, price_paths in simulated:
+        sigma = sidebar_results.simple_normal_distribution_simulation_parameters.sigma
+        assert paths_by_sigma.setdefault(sigma, price_paths) is price_paths
+    assert paths_by_sigma[3.0] is not paths_by_sigma[10.0]
+    assert not np.array_equal(paths_by_sigma[3.0][0], paths_by_sigma[10.0][0])